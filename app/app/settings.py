@@ -36,8 +36,11 @@ ALLOWED_HOSTS.extend(
 
 # Application definition
 
+# Processes that never serve the admin (the job workers, the reaper, the
+# events server) set ADMIN_ENABLED=0 and so never import it.
+ADMIN_ENABLED = bool(int(os.environ.get('ADMIN_ENABLED', 1)))
+
 INSTALLED_APPS = [
-    'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
@@ -50,8 +53,12 @@ INSTALLED_APPS = [
     'rest_framework.authtoken',
     'recipe',
 ]
+if ADMIN_ENABLED:
+    # Admin modules are discovered when the admin URLs are first used.
+    INSTALLED_APPS.insert(0, 'django.contrib.admin.apps.SimpleAdminConfig')
 
 MIDDLEWARE = [
+    'core.middleware.LoadSheddingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -92,9 +99,56 @@ DATABASES = {
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 0)),
     }
 }
 
+# Optional read replicas, e.g. DB_REPLICA_HOSTS=replica1,replica2
+REPLICA_DATABASES = []
+for index, host in enumerate(
+    filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(','))
+):
+    alias = f'replica_{index}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+
+# Opt-in Postgres hash partitioning of recipes by user; 0 disables it.
+RECIPE_PARTITIONS = int(os.environ.get('RECIPE_PARTITIONS', 0))
+PARTITION_BATCH_SIZE = int(os.environ.get('PARTITION_BATCH_SIZE', 10000))
+
+# Seconds a client's reads stay on the primary after it writes.
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 5))
+# Seconds between replica health checks, and the replication lag allowed.
+REPLICA_HEALTH_INTERVAL = int(os.environ.get('REPLICA_HEALTH_INTERVAL', 10))
+REPLICA_MAX_LAG_SECONDS = int(os.environ.get('REPLICA_MAX_LAG_SECONDS', 5))
+
+
+# Throttle buckets live in a cache shared by the uWSGI workers (see
+# --cache2 in scripts/run.sh), which falls back to a local memory cache
+# outside uWSGI. Its small fixed-size items suit only the buckets.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'throttle': {
+        'BACKEND': 'core.cache.UwsgiCache',
+        'LOCATION': 'throttle',
+    },
+}
+
+# Shed API requests once they queue longer than this many seconds; 0 disables.
+LOAD_SHED_QUEUE_THRESHOLD = float(
+    os.environ.get('LOAD_SHED_QUEUE_THRESHOLD', 0)
+)
+LOAD_SHED_PREFIX = '/api/'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -133,11 +187,46 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/3.2/howto/static-files/
 
 STATIC_URL = '/static/static/'
-MEDIA_URL = '/static/media/'
+# Served by core.views.MediaView to the owners of the recipes only.
+MEDIA_URL = '/api/media/'
 
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
+# Internal proxy location MediaView hands checked media requests to with
+# X-Accel-Redirect, so nginx sends the file. Empty, as by default under
+# DEBUG without the proxy, sends files from Django.
+MEDIA_ACCEL_PREFIX = os.environ.get(
+    'MEDIA_ACCEL_PREFIX',
+    '' if DEBUG else '/protected-media/',
+)
+
+# Resized recipe images: the allowed widths and heights, output types and
+# qualities, the directory in MEDIA_ROOT caching variants and its size cap
+# in bytes, and the threads per process encoding them.
+IMAGE_VARIANT_SIZES = [64, 128, 256, 512, 1024, 2048]
+IMAGE_VARIANT_TYPES = ['jpeg', 'png', 'webp']
+IMAGE_VARIANT_QUALITIES = [40, 60, 75, 90]
+IMAGE_VARIANT_DIR = 'variants'
+IMAGE_CACHE_MAX_BYTES = int(
+    os.environ.get('IMAGE_CACHE_MAX_BYTES', 1024 * 1024 * 1024)
+)
+IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 2))
+
+# Estimated share of shingles two recipes must have in common to be
+# reported as near duplicates (see recipe.duplicates).
+DUPLICATE_THRESHOLD = float(os.environ.get('DUPLICATE_THRESHOLD', 0.7))
+
+# Most entries of the shared nutrient catalog returned by one search.
+NUTRIENT_CATALOG_PAGE_SIZE = int(
+    os.environ.get('NUTRIENT_CATALOG_PAGE_SIZE', 50)
+)
+
+# collectstatic writes content-hashed names and gzip/brotli copies, the
+# latter compressed on this many threads, for the proxy to serve as is.
+STATICFILES_STORAGE = 'core.storage.CompressedManifestStaticFilesStorage'
+STATIC_COMPRESS_WORKERS = int(os.environ.get('STATIC_COMPRESS_WORKERS', 4))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -145,8 +234,104 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'core.User'
 
+# JSON backend for the API renderer and parser: 'orjson' or 'stdlib'.
+JSON_BACKEND = os.environ.get('JSON_BACKEND', 'orjson')
+
+# List responses with at least this many items are rendered incrementally.
+JSON_STREAM_THRESHOLD = int(os.environ.get('JSON_STREAM_THRESHOLD', 5000))
+
+# Similar-recipe indexes kept in memory per process, and how many changed
+# recipes an index reloads before it is rebuilt from scratch instead.
+SIMILAR_INDEX_MAX_USERS = int(os.environ.get('SIMILAR_INDEX_MAX_USERS', 32))
+SIMILAR_MAX_REFRESH = int(os.environ.get('SIMILAR_MAX_REFRESH', 1000))
+PANTRY_INDEX_MAX_USERS = int(os.environ.get('PANTRY_INDEX_MAX_USERS', 32))
+
+# Rows the reaper of soft-deleted data removes per transaction, and the
+# seconds it sleeps between passes when looping.
+REAPER_CHUNK_SIZE = int(os.environ.get('REAPER_CHUNK_SIZE', 500))
+REAPER_INTERVAL = int(os.environ.get('REAPER_INTERVAL', 30))
+
+# Seconds tombstones of deleted rows are kept for incremental sync, and the
+# most changes one sync page returns.
+SYNC_TOMBSTONE_RETENTION = int(
+    os.environ.get('SYNC_TOMBSTONE_RETENTION', 30 * 24 * 3600)
+)
+SYNC_PAGE_SIZE = int(os.environ.get('SYNC_PAGE_SIZE', 500))
+
+# Server-sent change events: the stream path served by app.asgi, seconds
+# between keepalive comments, and events held for a slow client before it
+# is told to resync instead. Browsers cannot send the API token with an
+# EventSource request, so they open the stream with a single-use ticket
+# valid for EVENTS_TICKET_TTL seconds.
+EVENTS_PATH = '/api/recipe/events/'
+EVENTS_KEEPALIVE = int(os.environ.get('EVENTS_KEEPALIVE', 15))
+EVENTS_QUEUE_SIZE = int(os.environ.get('EVENTS_QUEUE_SIZE', 100))
+EVENTS_TICKET_TTL = int(os.environ.get('EVENTS_TICKET_TTL', 30))
+
+# Most API calls one /api/batch/ request may carry, and threads running a
+# batch's consecutive reads side by side (1 runs them in turn). Each thread
+# holds its own database connection, kept open per CONN_MAX_AGE.
+BATCH_MAX_REQUESTS = int(os.environ.get('BATCH_MAX_REQUESTS', 20))
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', 4))
+
+# Hot queries run as server-side prepared statements, a comma separated
+# list of names registered with core.prepared (recipe_list, tag_list,
+# ingredient_list, token), and the most statements one connection prepares.
+# Statements last as long as the connection, so set DB_CONN_MAX_AGE too.
+PREPARED_STATEMENTS = [
+    name for name in os.environ.get('PREPARED_STATEMENTS', '').split(',')
+    if name
+]
+PREPARED_MAX_PER_CONNECTION = int(
+    os.environ.get('PREPARED_MAX_PER_CONNECTION', 50)
+)
+
+# Under uWSGI, build the URLconf, the lazily loaded views and these modules
+# in the master before it forks the workers, so they share them.
+WSGI_PRELOAD = bool(int(os.environ.get('WSGI_PRELOAD', 1)))
+PRELOAD_MODULES = [
+    'PIL.Image',
+    'drf_spectacular.openapi',
+]
+
+# Admin changelists count rows exactly only below this planner estimate.
+ADMIN_EXACT_COUNT_LIMIT = int(
+    os.environ.get('ADMIN_EXACT_COUNT_LIMIT', 10000)
+)
+
+# Job queue: attempts before a job fails for good, retry backoff bounds and
+# the seconds before a job whose worker vanished is claimed again. Workers
+# poll an empty queue every JOB_POLL_INTERVAL seconds, and finished jobs
+# are deleted after JOB_RETENTION seconds.
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 5))
+JOB_BACKOFF_BASE = int(os.environ.get('JOB_BACKOFF_BASE', 10))
+JOB_BACKOFF_MAX = int(os.environ.get('JOB_BACKOFF_MAX', 3600))
+JOB_LOCK_TIMEOUT = int(os.environ.get('JOB_LOCK_TIMEOUT', 600))
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 1))
+JOB_RETENTION = int(os.environ.get('JOB_RETENTION', 86400))
+
 REST_FRAMEWORK = {
-    'DEFAULT_SCHEMA_CLASS' : 'drf_spectacular.openapi.AutoSchema'
+    'DEFAULT_SCHEMA_CLASS' : 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_RENDERER_CLASSES' : [
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES' : [
+        'core.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'DEFAULT_THROTTLE_CLASSES' : [
+        'core.throttling.UserTokenBucketThrottle',
+        'core.throttling.EndpointTokenBucketThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES' : {
+        'user' : '1200/min',
+        'recipes' : '600/min',
+        'tags' : '600/min',
+        'ingredients' : '600/min',
+        'upload-image' : '30/min',
+    },
 }
 
 SPECTACULAR_SETTINGS = {
@@ -13,30 +13,43 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.contrib import admin
 from django.urls import path, include
-from django.conf.urls.static import static
 from django.conf import settings
-from drf_spectacular.views import (
-    SpectacularAPIView,
-    SpectacularSwaggerView,
-)
+from core.startup import LazyView, lazy_admin_urls
+from core.views import BatchView, JobMetricsView, MediaView
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
-    path('api/schema/', SpectacularAPIView.as_view(), name='api-schema'),
+    # The schema views are imported on first use, or by the uWSGI
+    # preload, and not by every process loading the URLconf.
+    path(
+        'api/schema/',
+        LazyView('drf_spectacular.views.SpectacularAPIView'),
+        name='api-schema',
+    ),
     path(
         'api/docs/',
-        SpectacularSwaggerView.as_view(url_name='api-schema'),
+        LazyView(
+            'drf_spectacular.views.SpectacularSwaggerView',
+            url_name='api-schema',
+        ),
         name='api-docs',
     ),
     path(
         'api/user/', include('user.urls')
     ),
     path('api/recipe/', include('recipe.urls')),
+    path('api/batch/', BatchView.as_view(), name='batch'),
+    path(
+        'api/jobs/metrics/',
+        JobMetricsView.as_view(),
+        name='job-metrics',
+    ),
+    path(
+        f'{settings.MEDIA_URL.lstrip("/")}<path:path>',
+        MediaView.as_view(),
+        name='media',
+    ),
 ]
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL,
-        document_root=settings.MEDIA_ROOT,
-    )
+if settings.ADMIN_ENABLED:
+    # Likewise the admin's modules, see lazy_admin_urls.
+    urlpatterns.insert(0, path('admin/', lazy_admin_urls()))
@@ -9,8 +9,20 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
+try:
+    import uwsgi
+except ImportError:
+    uwsgi = None
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
 application = get_wsgi_application()
+
+# uWSGI imports this module in its master and forks the workers after.
+if uwsgi is not None and settings.WSGI_PRELOAD:
+    from core.startup import preload
+
+    preload()
@@ -1,13 +1,137 @@
 """Create and customize admin page"""
+import json
 
-from django.contrib import admin
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.auth import get_user_model
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 from core import models
+from core.names import name_key
 
-class UserAdmin(BaseUserAdmin):
+# Live rows of a table, summed over its partitions if it has any.
+RELTUPLES_SQL = """
+    SELECT COALESCE(SUM(GREATEST(reltuples, 0)), 0) FROM pg_class
+    WHERE oid = %s::regclass OR oid IN (
+        SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass
+    )
+"""
+
+
+def estimated_count(queryset):
+    """Return the planner's estimate of a queryset's rows, or None"""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    if not queryset.query.where:
+        table = connection.ops.quote_name(queryset.model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(RELTUPLES_SQL, [table, table])
+            return int(cursor.fetchone()[0])
+    plan = json.loads(queryset.explain(format='json'))[0]
+    return int(plan['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator counting exactly only when the table is small"""
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is None or estimate < settings.ADMIN_EXACT_COUNT_LIMIT:
+            return super().count
+        return estimate
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """Admin for user-owned rows in tables too large to scan
+
+    Counts are estimated past a threshold, owners are loaded with a join
+    and picked by id, and search accepts only terms an index answers: an
+    owner's email, row ids, and text matched within one owner's rows.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_select_related = ['user']
+    raw_id_fields = ['user']
+    # Only shows the search box; get_search_results does the searching.
+    search_fields = ['user__email']
+    # Lookups matching one owner's rows against the searched text, any of
+    # which may match; without any, rows cannot be searched by text.
+    text_search_fields = ()
+
+    def search_text(self, queryset, text):
+        """Filter one owner's rows by the text searched for"""
+        query = Q()
+        for lookup in self.text_search_fields:
+            query |= Q(**{lookup: text})
+        return queryset.filter(query)
+
+    def get_search_results(self, request, queryset, search_term):
+        emails, ids, words = [], [], []
+        for term in search_term.split():
+            if '@' in term:
+                emails.append(term)
+            elif term.isdigit():
+                ids.append(int(term))
+            else:
+                words.append(term)
+
+        if emails:
+            normalize = get_user_model().objects.normalize_email
+            queryset = queryset.filter(
+                user__email__in=[normalize(email) for email in emails],
+            )
+        if ids:
+            queryset = queryset.filter(pk__in=ids)
+        if words:
+            if not self.text_search_fields:
+                self.message_user(
+                    request,
+                    'These rows cannot be searched by text.',
+                    messages.WARNING,
+                )
+                return queryset.none(), False
+            if not emails:
+                self.message_user(
+                    request,
+                    'Include the owner\'s email to search by text.',
+                    messages.WARNING,
+                )
+                return queryset.none(), False
+            queryset = self.search_text(queryset, ' '.join(words))
+        return queryset, False
+
+
+class SoftDeleteAdminMixin:
+    """Delete by flagging rows for the reaper instead of cascading"""
+
+    def get_deleted_objects(self, objs, request):
+        # Listing the whole cascade is what makes deleting heavy rows slow.
+        objs = list(objs)
+        return (
+            [str(obj) for obj in objs],
+            {self.model._meta.verbose_name_plural: len(objs)},
+            set(),
+            [],
+        )
+
+    def delete_model(self, request, obj):
+        obj.soft_delete()
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            obj.soft_delete()
+
+
+class UserAdmin(SoftDeleteAdminMixin, BaseUserAdmin):
     ordering = ['id']
-    list_display = ['email', 'name']
+    list_display = ['email', 'name', 'deleted_at']
     fieldsets = (
         (None, {'fields': ('email', 'password')}),
         (
@@ -25,11 +149,12 @@ class UserAdmin(BaseUserAdmin):
             {
                 'fields': (
                     'last_login',
+                    'deleted_at',
                 )
             }
         ),
     )
-    readonly_fields = ['last_login']
+    readonly_fields = ['last_login', 'deleted_at']
     add_fieldsets = (
         (None, {'classes': ('wide',),'fields': ('email', 'password1', 'password2', 'name',
         'is_active', 'is_staff', 'is_superuser',)}),
@@ -37,7 +162,56 @@ class UserAdmin(BaseUserAdmin):
 
 
 
+class RecipeAdmin(SoftDeleteAdminMixin, ScalableAdmin):
+    """Admin for recipes that are not soft-deleted"""
+    list_display = ['id', 'title', 'user', 'time_minutes', 'price']
+    text_search_fields = ['title__icontains']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).filter(
+            user__deleted_at__isnull=True,
+        )
+
+
+class NamedItemAdmin(ScalableAdmin):
+    """Admin for tags and ingredients"""
+    list_display = ['id', 'name', 'user']
+    text_search_fields = ['normalized_name__startswith']
+
+    def search_text(self, queryset, text):
+        return super().search_text(queryset, name_key(text))
+
+
+class JobAdmin(admin.ModelAdmin):
+    """Admin for inspecting and retrying queued jobs"""
+    list_display = ['id', 'name', 'status', 'attempts', 'run_at',
+                    'finished_at']
+    list_filter = ['status', 'name']
+    search_fields = ['idempotency_key']
+    readonly_fields = ['attempts', 'locked_at', 'locked_by', 'last_error',
+                       'created_at', 'finished_at']
+    actions = ['retry']
+
+    @admin.action(description='Retry selected jobs')
+    def retry(self, request, queryset):
+        queryset.exclude(status=models.Job.RUNNING).update(
+            status=models.Job.QUEUED,
+            attempts=0,
+            run_at=timezone.now(),
+            finished_at=None,
+        )
+
+
+class NutrientProfileAdmin(admin.ModelAdmin):
+    """Admin for the shared nutrient catalog"""
+    list_display = ['name', *models.NUTRIENTS]
+    search_fields = ['name']
+    ordering = ['name']
+
+
 admin.site.register(models.User, UserAdmin)
-admin.site.register(models.Recipe)
-admin.site.register(models.Tag)
-admin.site.register(models.Ingredient)
\ No newline at end of file
+admin.site.register(models.Recipe, RecipeAdmin)
+admin.site.register(models.Tag, NamedItemAdmin)
+admin.site.register(models.Ingredient, NamedItemAdmin)
+admin.site.register(models.Job, JobAdmin)
+admin.site.register(models.NutrientProfile, NutrientProfileAdmin)
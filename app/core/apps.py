@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from core import events, prepared, signals, sync  # noqa: F401
+        # Register the job queue tasks every app defines in tasks.py.
+        autodiscover_modules('tasks')
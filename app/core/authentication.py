@@ -0,0 +1,17 @@
+"""
+Token authentication whose token lookup runs as a prepared statement
+"""
+from rest_framework import authentication
+
+from core.prepared import prepared, register
+
+
+register('token', 'Token and user lookup of every authenticated request')
+
+
+class TokenAuthentication(authentication.TokenAuthentication):
+    """DRF token authentication with the lookup prepared when enabled"""
+
+    def authenticate_credentials(self, key):
+        with prepared('token'):
+            return super().authenticate_credentials(key)
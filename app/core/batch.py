@@ -0,0 +1,195 @@
+"""
+Running several API requests from one batch request.
+
+Each sub-request is resolved against the URLconf and passed straight to
+its view as the already authenticated user, skipping the proxy, the
+middleware and a token lookup per call. Runs of consecutive GETs are
+spread over a small thread pool, while writes run one at a time in
+order. An atomic batch runs everything in order in one transaction and
+rolls it all back when any sub-request fails.
+
+JSON and text bodies are passed on as they are; any other body, such as
+an image, comes back base64 encoded with its content type.
+"""
+import base64
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import close_old_connections, transaction
+from django.urls import Resolver404, resolve
+
+from core.db_router import PIN_COOKIE
+
+
+logger = logging.getLogger(__name__)
+
+METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+
+# Request headers a sub-request does not inherit from the batch request.
+SKIP_META = {
+    'CONTENT_LENGTH',
+    'CONTENT_TYPE',
+    'HTTP_AUTHORIZATION',
+    'HTTP_COOKIE',
+    'PATH_INFO',
+    'QUERY_STRING',
+    'REQUEST_METHOD',
+}
+
+_pool = None
+
+
+class BatchFailed(Exception):
+    """A sub-request of an atomic batch failed"""
+
+
+def _executor():
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(
+            max_workers=settings.BATCH_WORKERS,
+            thread_name_prefix='batch',
+        )
+    return _pool
+
+
+def _sub_request(request, method, path, body, primary=False):
+    """Build a request for one operation as the batch request's user"""
+    url = urlsplit(path)
+    payload = json.dumps(body).encode() if body is not None else b''
+    environ = {
+        key: value for key, value in request.META.items()
+        if key not in SKIP_META and not key.startswith('wsgi.')
+    }
+    environ.update({
+        'REQUEST_METHOD': method,
+        'PATH_INFO': url.path,
+        'QUERY_STRING': url.query,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(payload)),
+        'HTTP_ACCEPT': 'application/json',
+        'wsgi.input': BytesIO(payload),
+        'wsgi.url_scheme': request.scheme,
+    })
+    if primary:
+        # Reads inside a transaction must see its writes.
+        environ['HTTP_COOKIE'] = f'{PIN_COOKIE}=1'
+    sub = WSGIRequest(environ)
+    sub.user = request.user
+    # Picked up by rest_framework.request.Request in place of its
+    # authenticators.
+    sub._force_auth_user = request.user
+    sub._force_auth_token = request.auth
+    return sub
+
+
+def _result(response):
+    """Return {status, body} for a sub-response"""
+    result = {'status': response.status_code, 'body': None}
+    if response.streaming:
+        content = b''.join(response.streaming_content)
+    else:
+        content = response.content
+    if not content:
+        return result
+    content_type = response.get('Content-Type', '')
+    if content_type.startswith('application/json'):
+        result['body'] = json.loads(content)
+    elif content_type.startswith('text/'):
+        result['body'] = content.decode(
+            response.charset or 'utf-8',
+            'replace',
+        )
+    else:
+        result.update({
+            'body': base64.b64encode(content).decode('ascii'),
+            'encoding': 'base64',
+            'content_type': content_type,
+        })
+    return result
+
+
+def _error(status, detail):
+    return {'status': status, 'body': {'detail': detail}}
+
+
+def run_one(request, operation, primary=False):
+    """Run one operation and return {status, body}"""
+    method, path = operation['method'], operation['path']
+    if not path.startswith('/api/') or path.startswith('/api/batch/'):
+        return _error(400, 'Only API paths outside the batch endpoint.')
+    try:
+        match = resolve(urlsplit(path).path)
+    except Resolver404:
+        return _error(404, 'Not found.')
+
+    sub = _sub_request(
+        request, method, path, operation.get('body'), primary,
+    )
+    try:
+        response = match.func(sub, *match.args, **match.kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        if response.has_header('X-Accel-Redirect'):
+            # The file would be sent by the proxy, which a batch skips.
+            return _error(400, 'Files cannot be fetched in a batch.')
+        return _result(response)
+    except Exception:
+        logger.exception('Batch operation %s %s failed', method, path)
+        return _error(500, 'Server error.')
+
+
+def _run_read(request, operation):
+    """Run a GET on a pool thread, like a request of its own"""
+    close_old_connections()
+    try:
+        return run_one(request, operation)
+    finally:
+        close_old_connections()
+
+
+def _groups(operations):
+    """Split operations into runs of reads and single writes"""
+    group = []
+    for operation in operations:
+        if operation['method'] == 'GET':
+            group.append(operation)
+            continue
+        if group:
+            yield group
+            group = []
+        yield [operation]
+    if group:
+        yield group
+
+
+def run_batch(request, operations, atomic=False):
+    """Run operations and return (results in order, rolled back)"""
+    if atomic:
+        results = []
+        try:
+            with transaction.atomic():
+                for operation in operations:
+                    result = run_one(request, operation, primary=True)
+                    results.append(result)
+                    if result['status'] >= 400:
+                        raise BatchFailed
+        except BatchFailed:
+            return results, True
+        return results, False
+
+    results = []
+    for group in _groups(operations):
+        if len(group) > 1 and settings.BATCH_WORKERS > 1:
+            results += _executor().map(
+                lambda operation: _run_read(request, operation),
+                group,
+            )
+        else:
+            results += [run_one(request, operation) for operation in group]
+    return results, False
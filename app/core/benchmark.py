@@ -0,0 +1,125 @@
+"""
+Helpers shared by the benchmark management commands
+"""
+import json
+import time
+import uuid
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+)
+
+
+class Rollback(Exception):
+    """Raised to discard data seeded for a benchmark"""
+
+
+def create_user():
+    """Create and return a throwaway benchmark user"""
+    return get_user_model().objects.create_user(
+        email=f'bench-{uuid.uuid4().hex}@example.com',
+        password='benchpass123',
+    )
+
+
+def seed_recipes(user, count, tags=10, ingredients=20, per_recipe=3):
+    """Bulk create recipes with tags and ingredients for a user"""
+    Tag.objects.bulk_create(
+        Tag(user=user, name=f'Tag {i}') for i in range(tags)
+    )
+    Ingredient.objects.bulk_create(
+        Ingredient(user=user, name=f'Ingredient {i}')
+        for i in range(ingredients)
+    )
+    Recipe.objects.bulk_create(
+        Recipe(
+            user=user,
+            title=f'Recipe {i}',
+            description=f'Sample description {i}',
+            time_minutes=5 + i % 120,
+            price=Decimal(i % 5000) / 100,
+            link=f'http://example.com/recipe-{i}.pdf',
+        )
+        for i in range(count)
+    )
+    # Not every backend returns primary keys from bulk_create.
+    tag_objs = list(Tag.objects.filter(user=user).order_by('id'))
+    ing_objs = list(Ingredient.objects.filter(user=user).order_by('id'))
+    recipes = list(Recipe.objects.filter(user=user).order_by('id'))
+    TagThrough = Recipe.tags.through
+    IngredientThrough = Recipe.ingredients.through
+    TagThrough.objects.bulk_create(
+        TagThrough(recipe_id=r.id, tag_id=tag_objs[(i + j) % tags].id)
+        for i, r in enumerate(recipes)
+        for j in range(min(per_recipe, tags))
+    )
+    IngredientThrough.objects.bulk_create(
+        IngredientThrough(
+            recipe_id=r.id,
+            ingredient_id=ing_objs[(i * 7 + j) % ingredients].id,
+        )
+        for i, r in enumerate(recipes)
+        for j in range(min(per_recipe, ingredients))
+    )
+    return recipes
+
+
+def best_of(func, repeat=3):
+    """Return the fastest of `repeat` runs of func in seconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run_rolled_back(func):
+    """Run func inside a transaction that is always rolled back"""
+    result = None
+    try:
+        with transaction.atomic():
+            result = func()
+            raise Rollback
+    except Rollback:
+        pass
+    return result
+
+
+def explain_plan(queryset, analyze=False):
+    """Return the Postgres JSON plan of a queryset"""
+    return json.loads(
+        queryset.explain(format='json', analyze=analyze)
+    )[0]
+
+
+def plan_nodes(plan):
+    """Yield every node of a Postgres JSON plan"""
+    stack = [plan['Plan']]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(node.get('Plans', []))
+
+
+def plan_relations(plan):
+    """Return the set of tables and partitions scanned by a plan"""
+    return {
+        node['Relation Name']
+        for node in plan_nodes(plan)
+        if 'Relation Name' in node
+    }
+
+
+def fallback_nodes(plan):
+    """Return the sequential scans and explicit sorts of a plan"""
+    return [
+        node for node in plan_nodes(plan)
+        if node['Node Type'] in ('Seq Scan', 'Sort', 'Incremental Sort')
+    ]
@@ -0,0 +1,124 @@
+"""
+Django cache backend on the uWSGI shared-memory cache
+"""
+import pickle
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+from django.core.cache.backends.locmem import LocMemCache
+
+try:
+    import uwsgi
+except ImportError:
+    uwsgi = None
+
+
+_local_lock = threading.RLock()
+
+
+class UwsgiCache(BaseCache):
+    """
+    Cache shared by every uWSGI worker through a `--cache2` store.
+
+    Outside uWSGI (runserver, tests, management commands) it falls back to
+    a process-local LocMemCache, which is what Django would use anyway.
+    """
+
+    def __init__(self, name, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._name = name or 'default'
+        self._lock_num = options.get('LOCK', 0)
+        self._shared = uwsgi is not None
+        if not self._shared:
+            self._local = LocMemCache(f'uwsgi-fallback-{self._name}', params)
+
+    @contextmanager
+    def lock(self):
+        """Hold a lock shared by every worker for read-modify-write"""
+        if not self._shared:
+            with _local_lock:
+                yield
+            return
+        uwsgi.lock(self._lock_num)
+        try:
+            yield
+        finally:
+            uwsgi.unlock(self._lock_num)
+
+    def _load(self, key):
+        raw = uwsgi.cache_get(key, self._name)
+        if raw is None:
+            return None
+        expires, value = pickle.loads(raw)
+        if expires is not None and expires <= time.time():
+            uwsgi.cache_del(key, self._name)
+            return None
+        return expires, value
+
+    def _store(self, key, value, timeout):
+        expires = self.get_backend_timeout(timeout)
+        ttl = 0 if expires is None else max(int(expires - time.time()), 1)
+        raw = pickle.dumps((expires, value), pickle.HIGHEST_PROTOCOL)
+        return bool(uwsgi.cache_update(key, raw, ttl, self._name))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        if not self._shared:
+            return self._local.add(key, value, timeout, version)
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self.lock():
+            if self._load(key) is not None:
+                return False
+            return self._store(key, value, timeout)
+
+    def get(self, key, default=None, version=None):
+        if not self._shared:
+            return self._local.get(key, default, version)
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        payload = self._load(key)
+        return default if payload is None else payload[1]
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        if not self._shared:
+            return self._local.set(key, value, timeout, version)
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._store(key, value, timeout)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        if not self._shared:
+            return self._local.touch(key, timeout, version)
+        key = self.make_key(key, version=version)
+        with self.lock():
+            payload = self._load(key)
+            if payload is None:
+                return False
+            return self._store(key, payload[1], timeout)
+
+    def delete(self, key, version=None):
+        if not self._shared:
+            return self._local.delete(key, version)
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return bool(uwsgi.cache_del(key, self._name))
+
+    def clear(self):
+        if not self._shared:
+            return self._local.clear()
+        uwsgi.cache_clear(self._name)
+
+
+@contextmanager
+def cache_lock(cache):
+    """Lock a cache for an atomic read-modify-write, where supported"""
+    lock = getattr(cache, 'lock', None)
+    if lock is None:
+        with _local_lock:
+            yield
+    else:
+        with lock():
+            yield
@@ -0,0 +1,184 @@
+"""
+Per-user dashboard summaries maintained incrementally.
+
+A user's summary row is built on first read or by `rebuild_dashboards`.
+From then on the signal handlers in core.signals adjust it in place,
+inside the transaction making the change. DashboardUsage holds a row per
+tag and ingredient in use, with its name and how many recipes use it,
+so "most used" lists are read from one index. Writes that bypass signals,
+such as bulk_create or queryset updates, need a rebuild afterwards.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+    UserDashboard,
+    DashboardUsage,
+)
+from core.parallel import for_each_user
+
+
+TOP_ITEMS = 5
+
+COUNT_FIELDS = {
+    Recipe: 'recipe_count',
+    Tag: 'tag_count',
+    Ingredient: 'ingredient_count',
+}
+USAGE_KINDS = {
+    Tag: 'tag',
+    Ingredient: 'ingredient',
+}
+
+
+def _usage(model, user_id, using):
+    """Return usage rows for the tags or ingredients a user has in use"""
+    rows = model.objects.using(using).filter(
+        user_id=user_id,
+    ).annotate(
+        uses=Count('recipe'),
+    ).filter(uses__gt=0).values_list('id', 'name', 'uses')
+    return [
+        DashboardUsage(
+            user_id=user_id,
+            kind=USAGE_KINDS[model],
+            item_id=pk,
+            name=name,
+            uses=uses,
+        )
+        for pk, name, uses in rows
+    ]
+
+
+def build_dashboard(user_id, using='default'):
+    """Recompute and store the dashboard of one user
+
+    The row is locked before counting, so builds and count changes of the
+    same user take turns.
+    """
+    with transaction.atomic(using=using):
+        UserDashboard.objects.using(using).get_or_create(user_id=user_id)
+        dashboard = _locked(user_id, using)
+        for model, field in COUNT_FIELDS.items():
+            setattr(dashboard, field, model.objects.using(using).filter(
+                user_id=user_id,
+            ).count())
+        dashboard.save(using=using)
+        DashboardUsage.objects.using(using).filter(user_id=user_id).delete()
+        DashboardUsage.objects.using(using).bulk_create([
+            row
+            for model in USAGE_KINDS
+            for row in _usage(model, user_id, using)
+        ])
+    return dashboard
+
+
+def get_dashboard(user_id, using='default'):
+    """Return a user's dashboard, building it on first use"""
+    dashboard = UserDashboard.objects.using(using).filter(
+        user_id=user_id,
+    ).first()
+    return dashboard or build_dashboard(user_id, using)
+
+
+def rebuild_dashboards(user_ids, workers=4, chunk_size=100,
+                       using='default', log=None):
+    """Rebuild dashboards for many users across worker threads"""
+    return len(for_each_user(
+        lambda user_id: build_dashboard(user_id, using),
+        user_ids,
+        workers=workers,
+        chunk_size=chunk_size,
+        using=using,
+        log=log,
+    ))
+
+
+def adjust_count(model, user_id, delta, using='default'):
+    """Add delta to the recipe, tag or ingredient count of a user"""
+    field = COUNT_FIELDS[model]
+    UserDashboard.objects.using(using).filter(user_id=user_id).update(
+        **{field: F(field) + delta}
+    )
+
+
+def _locked(user_id, using):
+    """Return a user's dashboard locked for update, or None"""
+    return UserDashboard.objects.using(using).select_for_update().filter(
+        user_id=user_id,
+    ).first()
+
+
+def _items(model, user_id, using):
+    """Return the usage rows of a user's tags or ingredients"""
+    return DashboardUsage.objects.using(using).filter(
+        user_id=user_id,
+        kind=USAGE_KINDS[model],
+    )
+
+
+def adjust_usage(model, user_id, deltas, using='default'):
+    """Apply `{id: delta}` changes to how many recipes use each item
+
+    Each item's row is updated in place, so changes to different items
+    of one user do not wait for each other.
+    """
+    if not UserDashboard.objects.using(using).filter(
+        user_id=user_id,
+    ).exists():
+        return
+    items = _items(model, user_id, using)
+    by_delta = defaultdict(list)
+    for pk, delta in deltas.items():
+        by_delta[delta].append(pk)
+    added = [pk for pk, delta in deltas.items() if delta > 0]
+    removed = [pk for pk, delta in deltas.items() if delta < 0]
+    with transaction.atomic(using=using):
+        if added:
+            # Items not in use yet get a row counting from zero.
+            DashboardUsage.objects.using(using).bulk_create([
+                DashboardUsage(
+                    user_id=user_id,
+                    kind=USAGE_KINDS[model],
+                    item_id=pk,
+                    name=name,
+                )
+                for pk, name in model.objects.using(using).filter(
+                    pk__in=added,
+                ).values_list('id', 'name')
+            ], ignore_conflicts=True)
+        for delta, pks in by_delta.items():
+            items.filter(item_id__in=pks).update(uses=F('uses') + delta)
+        if removed:
+            items.filter(item_id__in=removed, uses=0).delete()
+
+
+def rename_item(model, item, using='default'):
+    """Refresh the stored name of a renamed tag or ingredient"""
+    if not item.name_changed():
+        return
+    _items(model, item.user_id, using).filter(
+        item_id=item.pk,
+    ).exclude(name=item.name).update(name=item.name)
+
+
+def remove_item(model, item, using='default'):
+    """Drop a deleted tag or ingredient from its owner's dashboard"""
+    _items(model, item.user_id, using).filter(item_id=item.pk).delete()
+    adjust_count(model, item.user_id, -1, using)
+
+
+def top_items(model, user_id, limit=TOP_ITEMS, using='default'):
+    """Return a user's most used tags or ingredients"""
+    rows = _items(model, user_id, using).order_by(
+        '-uses', 'name', 'item_id',
+    ).values_list('item_id', 'name', 'uses')[:limit]
+    return [
+        {'id': pk, 'name': name, 'count': uses}
+        for pk, name, uses in rows
+    ]
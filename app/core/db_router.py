@@ -0,0 +1,184 @@
+"""
+Database router sending safe-method viewset reads to read replicas
+"""
+import itertools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+from rest_framework.permissions import SAFE_METHODS
+
+
+PIN_COOKIE = 'db_primary_pin'
+
+_read_alias = ContextVar('read_alias', default=None)
+_health = {}
+_counter = itertools.count()
+
+REPLICA_LAG_SQL = """
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+
+class ReplicaRouter:
+    """Route reads to the replica selected for the current request"""
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.REPLICA_DATABASES
+
+
+@contextmanager
+def use_replica(alias):
+    """Send ORM reads in this block to the given database alias"""
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def check_replica(alias):
+    """Return True if the replica answers and is not lagging too far"""
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor != 'postgresql':
+                cursor.execute('SELECT 1')
+                return True
+            cursor.execute(REPLICA_LAG_SQL)
+            lag = cursor.fetchone()[0]
+    except DatabaseError:
+        connection.close()
+        return False
+    return lag is None or lag <= settings.REPLICA_MAX_LAG_SECONDS
+
+
+def is_healthy(alias):
+    """Return the cached health of a replica, re-checking when stale"""
+    healthy, checked_at = _health.get(alias, (None, 0))
+    now = time.monotonic()
+    if healthy is None or now - checked_at >= settings.REPLICA_HEALTH_INTERVAL:
+        healthy = check_replica(alias)
+        _health[alias] = (healthy, now)
+    return healthy
+
+
+def mark_unhealthy(alias):
+    """Fail over from a replica until its next health check"""
+    _health[alias] = (False, time.monotonic())
+
+
+def get_replica():
+    """Return a healthy replica alias, or None to fail over to primary"""
+    replicas = settings.REPLICA_DATABASES
+    if not replicas:
+        return None
+    start = next(_counter)
+    for offset in range(len(replicas)):
+        alias = replicas[(start + offset) % len(replicas)]
+        if is_healthy(alias):
+            return alias
+    return None
+
+
+READ_ONLY_STATEMENTS = (
+    'SELECT', 'SAVEPOINT', 'RELEASE', 'ROLLBACK', 'SET', 'SHOW', 'EXPLAIN',
+)
+
+
+def _is_write(sql):
+    return not sql.lstrip().upper().startswith(READ_ONLY_STATEMENTS)
+
+
+def _pin_key(user):
+    return f'replica-pin:{user.pk}'
+
+
+def is_pinned(request):
+    """Return True if the request must read its own recent writes"""
+    if PIN_COOKIE in request.COOKIES:
+        return True
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return bool(cache.get(_pin_key(user)))
+    return False
+
+
+def pin_to_primary(request, response):
+    """Keep reads for this client on the primary for a short window"""
+    seconds = settings.REPLICA_PIN_SECONDS
+    response.set_cookie(PIN_COOKIE, '1', max_age=seconds, httponly=True)
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        cache.set(_pin_key(user), True, seconds)
+
+
+class ReplicaReadMixin:
+    """Viewset mixin reading from replicas with read-your-writes pinning"""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self._replica_token = None
+        self._replica_alias = None
+        self._primary_writes = None
+        if request.method in SAFE_METHODS and not is_pinned(request):
+            self._replica_alias = get_replica()
+            if self._replica_alias is not None:
+                self._replica_token = _read_alias.set(self._replica_alias)
+                self._primary_writes = []
+                connections['default'].execute_wrappers.append(
+                    self._note_write,
+                )
+
+    def _note_write(self, execute, sql, params, many, context):
+        if _is_write(sql):
+            self._primary_writes.append(sql)
+        return execute(sql, params, many, context)
+
+    def _release_replica(self):
+        token = getattr(self, '_replica_token', None)
+        if token is not None:
+            _read_alias.reset(token)
+            self._replica_token = None
+            connections['default'].execute_wrappers.remove(self._note_write)
+
+    def handle_exception(self, exc):
+        alias = getattr(self, '_replica_alias', None)
+        if alias is not None and isinstance(exc, DatabaseError):
+            mark_unhealthy(alias)
+            retry = not self._primary_writes
+            self._replica_alias = None
+            self._release_replica()
+            if retry:
+                # Nothing was written, so the read can run again in full.
+                handler = getattr(
+                    self,
+                    self.request.method.lower(),
+                    self.http_method_not_allowed,
+                )
+                try:
+                    return handler(self.request, *self.args, **self.kwargs)
+                except Exception as retry_exc:
+                    exc = retry_exc
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        self._release_replica()
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            pin_to_primary(request, response)
+        return super().finalize_response(request, response, *args, **kwargs)
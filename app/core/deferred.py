@@ -0,0 +1,71 @@
+"""
+Per-user work collected during a transaction and done once it commits.
+
+Receivers add items, such as recipe ids to reindex or events to
+announce, and the batch is flushed by one `on_commit` callback, so a
+transaction touching many rows does the work once. Each savepoint gets
+its own batch, registered from within it: when the savepoint or the
+whole transaction rolls back, Django drops the callback and the batch
+with it, so nothing that never committed is flushed. Outside a
+transaction items are flushed right away.
+"""
+import threading
+from collections import defaultdict
+
+from django.db import transaction
+
+
+class _Batch:
+    """Items added within one savepoint, flushed by its callback"""
+
+    def __init__(self, owner, sids, using):
+        self.owner = owner
+        self.sids = sids
+        self.using = using
+        self.items = defaultdict(owner.container)
+        self.flushed = False
+
+    def __call__(self):
+        self.flushed = True
+        self.owner.flush(dict(self.items), self.using)
+
+
+class CommitBatch:
+    """Items grouped by user, passed to flush once their changes commit
+
+    flush is called with {user id: items} and the database alias. Items
+    are merged with `update`, so container may be a set or a dict.
+    """
+
+    def __init__(self, flush, container=set):
+        self.flush = flush
+        self.container = container
+        self._local = threading.local()
+
+    def _batch(self, connection):
+        """Return the pending batch of the current savepoint, or None"""
+        batches = self._local.__dict__.setdefault(connection.alias, [])
+        registered = {id(func) for _, func in connection.run_on_commit}
+        # Batches that ran, or whose callback a rollback dropped, are done.
+        batches[:] = [
+            batch for batch in batches
+            if not batch.flushed and id(batch) in registered
+        ]
+        sids = tuple(connection.savepoint_ids)
+        for batch in batches:
+            if batch.sids == sids:
+                return batch
+        return None
+
+    def add(self, user_id, items, using='default'):
+        """Queue a user's items to be flushed once the transaction commits"""
+        connection = transaction.get_connection(using)
+        if not connection.in_atomic_block:
+            self.flush({user_id: self.container(items)}, using)
+            return
+        batch = self._batch(connection)
+        if batch is None:
+            batch = _Batch(self, tuple(connection.savepoint_ids), using)
+            transaction.on_commit(batch, using=using)
+            self._local.__dict__[using].append(batch)
+        batch.items[user_id].update(items)
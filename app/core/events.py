@@ -0,0 +1,406 @@
+"""
+Server-sent events announcing changes to a user's recipes, tags and
+ingredients, so clients sync when something changed instead of polling.
+
+Signal handlers publish a small event for every saved or deleted row. On
+Postgres a transaction's events are collected and sent once it commits,
+with one NOTIFY per user carrying all of that user's events, whichever
+process made the change. The writing process cannot see which users
+have streams open in the ASGI processes, so batching is what keeps bulk
+changes cheap. Each ASGI process keeps one LISTEN connection in a thread
+and fans events out through an in-process hub to its open streams, each
+of which is a bounded queue and an idle coroutine. Without Postgres, a
+local broker stands in for NOTIFY and delivers events within the process
+after commit.
+
+A stream whose queue overflows, or that may have missed events while the
+listener reconnected, is sent a `resync` event instead.
+
+Streams are opened with the API token in the Authorization header, or by
+browsers, whose EventSource cannot send headers, with a short-lived
+single-use ticket from `issue_ticket` in the query string.
+"""
+import asyncio
+import json
+import logging
+import secrets
+import select
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from core.deferred import CommitBatch
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+    RecipeTag,
+    RecipeIngredient,
+    StreamTicket,
+)
+
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'recipe_events'
+KINDS = {
+    Recipe: 'recipe',
+    Tag: 'tag',
+    Ingredient: 'ingredient',
+}
+RESYNC = {'type': 'resync'}
+# Postgres refuses NOTIFY payloads from 8000 bytes.
+MAX_PAYLOAD = 7999
+
+
+class Hub:
+    """Fan-out of events to the open streams of each user
+
+    Only used from the event loop thread; other threads hand events over
+    with `loop.call_soon_threadsafe`.
+    """
+
+    def __init__(self, loop, queue_size=None):
+        self.loop = loop
+        self.queue_size = queue_size or settings.EVENTS_QUEUE_SIZE
+        self.subscribers = defaultdict(set)
+
+    def subscribe(self, user_id):
+        queue = asyncio.Queue(self.queue_size)
+        self.subscribers[user_id].add(queue)
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        queues = self.subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[user_id]
+
+    def _put(self, queue, event):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # The client fell behind; one resync replaces what it missed.
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(RESYNC)
+
+    def publish(self, user_id, event):
+        for queue in self.subscribers.get(user_id, ()):
+            self._put(queue, event)
+
+    def broadcast(self, event):
+        for queues in self.subscribers.values():
+            for queue in queues:
+                self._put(queue, event)
+
+
+class LocalBroker:
+    """In-process stand-in for NOTIFY, for development and tests"""
+
+    def __init__(self):
+        self.loop = None
+        self.hub = None
+
+    def start(self, loop, hub):
+        self.loop, self.hub = loop, hub
+
+    def deliver(self, user_id, event):
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.hub.publish, user_id, event)
+
+    def publish(self, user_id, event, using='default'):
+        transaction.on_commit(
+            lambda: self.deliver(user_id, event),
+            using=using,
+        )
+
+
+def notifications(pending):
+    """Return the NOTIFY payloads announcing each user's pending events
+
+    A user's events too many for one payload become a resync.
+    """
+    payloads = []
+    for user_id, batch in pending.items():
+        payload = json.dumps({'user': user_id, 'events': list(batch.values())})
+        if len(payload.encode()) > MAX_PAYLOAD:
+            payload = json.dumps({'user': user_id, 'events': None})
+        payloads.append(payload)
+    return payloads
+
+
+class PostgresBroker(LocalBroker):
+    """Events sent with NOTIFY and received by one LISTEN per process"""
+
+    def __init__(self):
+        super().__init__()
+        self.pending = CommitBatch(self.flush, container=dict)
+
+    def publish(self, user_id, event, using='default'):
+        # A row changed twice in the transaction is announced once.
+        self.pending.add(user_id, {(event['type'], event['id']): event}, using)
+
+    def flush(self, pending, using):
+        payloads = notifications(pending)
+        if payloads:
+            with connections[using].cursor() as cursor:
+                cursor.execute(
+                    'SELECT pg_notify(%s, payload) '
+                    'FROM unnest(%s::text[]) AS payload',
+                    [CHANNEL, payloads],
+                )
+
+    def start(self, loop, hub):
+        if self.loop is None:
+            threading.Thread(target=self.listen, daemon=True).start()
+        super().start(loop, hub)
+
+    def listen(self):
+        """Receive notifications forever, reconnecting after failures"""
+        connected_before = False
+        while True:
+            wrapper = connections['default']
+            try:
+                conn = wrapper.get_new_connection(
+                    wrapper.get_connection_params(),
+                )
+                conn.autocommit = True
+                conn.cursor().execute(f'LISTEN {CHANNEL}')
+                if connected_before:
+                    self.loop.call_soon_threadsafe(
+                        self.hub.broadcast, RESYNC,
+                    )
+                connected_before = True
+                while True:
+                    if select.select([conn], [], [], 5) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        message = json.loads(conn.notifies.pop(0).payload)
+                        if message['events'] is None:
+                            self.deliver(message['user'], RESYNC)
+                        for event in message['events'] or ():
+                            self.deliver(message['user'], event)
+            except Exception:
+                logger.exception('Event listener failed, reconnecting')
+                time.sleep(1)
+
+
+hub = None
+_broker = None
+
+
+def get_broker():
+    """Return the broker suiting the default database"""
+    global _broker
+    if _broker is None:
+        if connections['default'].vendor == 'postgresql':
+            _broker = PostgresBroker()
+        else:
+            _broker = LocalBroker()
+    return _broker
+
+
+def get_hub():
+    """Return this process's hub, connecting it to the broker"""
+    global hub
+    loop = asyncio.get_running_loop()
+    if hub is None or hub.loop is not loop:
+        hub = Hub(loop)
+        get_broker().start(loop, hub)
+    return hub
+
+
+def publish(user_id, kind, pk, action, using='default'):
+    get_broker().publish(
+        user_id,
+        {'type': kind, 'id': pk, 'action': action},
+        using,
+    )
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def item_saved(sender, instance, using, raw=False, **kwargs):
+    """Announce a saved or soft-deleted row"""
+    if not raw:
+        deleted = getattr(instance, 'deleted_at', None) is not None
+        publish(
+            instance.user_id,
+            KINDS[sender],
+            instance.pk,
+            'deleted' if deleted else 'saved',
+            using,
+        )
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def item_deleted(sender, instance, using, **kwargs):
+    """Announce a deleted row, unless its soft delete was announced"""
+    if getattr(instance, 'deleted_at', None) is None:
+        publish(instance.user_id, KINDS[sender], instance.pk, 'deleted',
+                using)
+
+
+@receiver(m2m_changed, sender=RecipeTag)
+@receiver(m2m_changed, sender=RecipeIngredient)
+def relations_changed(sender, instance, action, reverse, pk_set, using,
+                      **kwargs):
+    """Announce recipes whose tags or ingredients changed"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        recipe_ids = [instance.pk]
+    else:
+        recipe_ids = pk_set or ()
+    for pk in recipe_ids:
+        publish(instance.user_id, 'recipe', pk, 'saved', using)
+
+
+def issue_ticket(user):
+    """Return a new stream ticket for the user and when it expires"""
+    now = timezone.now()
+    StreamTicket.objects.filter(expires_at__lte=now).delete()
+    return StreamTicket.objects.create(
+        key=secrets.token_urlsafe(32),
+        user=user,
+        expires_at=now + timedelta(seconds=settings.EVENTS_TICKET_TTL),
+    )
+
+
+def _token(scope):
+    """Return the API token of a request from its header"""
+    for name, value in scope.get('headers', ()):
+        if name == b'authorization':
+            keyword, _, key = value.decode('latin1').partition(' ')
+            if keyword == 'Token':
+                return key.strip()
+    return None
+
+
+def _ticket(scope):
+    """Return the stream ticket of a request from its query"""
+    query = parse_qs(scope.get('query_string', b'').decode('latin1'))
+    return query.get('ticket', [None])[0]
+
+
+@sync_to_async
+def _authenticate(key):
+    """Return the id of the active user owning a token, or None"""
+    close_old_connections()
+    try:
+        return Token.objects.filter(
+            key=key,
+            user__is_active=True,
+        ).values_list('user_id', flat=True).first()
+    finally:
+        close_old_connections()
+
+
+@sync_to_async
+def _redeem(key):
+    """Use up a stream ticket and return its active user's id, or None"""
+    close_old_connections()
+    try:
+        tickets = StreamTicket.objects.filter(key=key)
+        user_id = tickets.filter(
+            expires_at__gt=timezone.now(),
+            user__is_active=True,
+        ).values_list('user_id', flat=True).first()
+        # Of concurrent uses of one ticket, only the one deleting it wins.
+        if user_id is None or not tickets.delete()[0]:
+            return None
+        return user_id
+    finally:
+        close_old_connections()
+
+
+def _message(event):
+    name = 'resync' if event is RESYNC else 'change'
+    data = json.dumps({} if event is RESYNC else event)
+    return f'event: {name}\ndata: {data}\n\n'.encode()
+
+
+async def _disconnected(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def _respond(send, status, body):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json')],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def stream(scope, receive, send):
+    """ASGI app streaming the authenticated user's change events"""
+    if scope['method'] != 'GET':
+        await _respond(send, 405, b'{"detail": "Method not allowed."}')
+        return
+    key, ticket = _token(scope), _ticket(scope)
+    if key:
+        user_id = await _authenticate(key)
+    else:
+        user_id = await _redeem(ticket) if ticket else None
+    if user_id is None:
+        await _respond(send, 401, b'{"detail": "Invalid token."}')
+        return
+
+    events = get_hub()
+    queue = events.subscribe(user_id)
+    disconnect = asyncio.ensure_future(_disconnected(receive))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await send({
+            'type': 'http.response.body',
+            'body': b'retry: 5000\n\n',
+            'more_body': True,
+        })
+        while True:
+            get = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait(
+                {get, disconnect},
+                timeout=settings.EVENTS_KEEPALIVE,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if get in done:
+                body = _message(get.result())
+            else:
+                get.cancel()
+                if disconnect in done:
+                    break
+                body = b': keepalive\n\n'
+            await send({
+                'type': 'http.response.body',
+                'body': body,
+                'more_body': True,
+            })
+    finally:
+        disconnect.cancel()
+        events.unsubscribe(user_id, queue)
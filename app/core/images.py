@@ -0,0 +1,225 @@
+"""
+Resized variants of uploaded images, made on demand and kept on disk.
+
+Variants live under IMAGE_VARIANT_DIR in MEDIA_ROOT, named after a hash
+of the source image and the variant's parameters, so the proxy can send
+them like any other protected media. The directory is capped at
+IMAGE_CACHE_MAX_BYTES: a variant's modification time is bumped whenever
+it is used, and once the cap is passed the least recently used variants
+are deleted down to 80% of it.
+
+Encoding runs on a small thread pool per process (Pillow releases the GIL
+while it resizes and encodes). Requests for a variant that is being made
+wait for it rather than encoding it again: within a process they share
+one future, and across processes a striped file lock lets only one of
+them encode.
+"""
+import fcntl
+import hashlib
+import io
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from django.conf import settings
+
+
+CONTENT_TYPES = {
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+    'webp': 'image/webp',
+}
+LOCK_STRIPES = 64
+LOW_WATER = 0.8
+
+_pool = None
+_cache = None
+
+
+def _executor():
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_WORKERS,
+            thread_name_prefix='image',
+        )
+    return _pool
+
+
+def render(source, width=None, height=None, fmt='jpeg', quality=75):
+    """Return the bytes of an image file resized to fit width x height
+
+    Images are never enlarged and keep their aspect ratio.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        image.thumbnail(
+            (width or image.width, height or image.height),
+            Image.LANCZOS,
+        )
+        if fmt == 'jpeg' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        options = {'optimize': True}
+        if fmt != 'png':
+            options['quality'] = quality
+        out = io.BytesIO()
+        image.save(out, format=fmt.upper(), **options)
+    return out.getvalue()
+
+
+class VariantCache:
+    """Directory of files capped in size, evicting least recently used"""
+
+    def __init__(self, root, max_bytes, rescan_interval=60):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.rescan_interval = rescan_interval
+        self.size = None
+        self.scanned_at = 0
+        self.lock = threading.Lock()
+        self.pending = {}
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def get(self, name):
+        """Return the path of a cached file, marking it used, or None"""
+        path = self.path(name)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def get_or_create(self, name, make):
+        """Return the path of a cached file, writing make() on a miss"""
+        path = self.get(name)
+        if path is not None:
+            return path
+
+        with self.lock:
+            future = self.pending.get(name)
+            owner = future is None
+            if owner:
+                future = self.pending[name] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            path = self._create(name, make)
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(path)
+            return path
+        finally:
+            with self.lock:
+                del self.pending[name]
+
+    def _lock_path(self, name):
+        stripe = int(hashlib.md5(name.encode()).hexdigest(), 16)
+        return os.path.join(self.root, '.locks', str(stripe % LOCK_STRIPES))
+
+    def _create(self, name, make):
+        path = self.path(name)
+        lock_path = self._lock_path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+        with open(lock_path, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if os.path.exists(path):
+                # Another process made it while this one waited.
+                return path
+            data = make()
+            temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(temporary, 'wb') as out:
+                out.write(data)
+            os.replace(temporary, path)
+        self._added(len(data))
+        return path
+
+    def _added(self, size):
+        with self.lock:
+            stale = time.monotonic() - self.scanned_at > self.rescan_interval
+            if self.size is None or stale:
+                self.size = self._scan()
+            else:
+                self.size += size
+            if self.size > self.max_bytes:
+                self.size = self.evict()
+
+    def _files(self):
+        if not os.path.isdir(self.root):
+            return
+        for shard in os.scandir(self.root):
+            if not shard.is_dir() or shard.name == '.locks':
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                yield stat.st_mtime, stat.st_size, entry.path
+
+    def _scan(self):
+        self.scanned_at = time.monotonic()
+        return sum(size for _, size, _ in self._files())
+
+    def evict(self):
+        """Delete least recently used files down to the low-water mark
+
+        Returns the size left.
+        """
+        files = sorted(self._files())
+        total = sum(size for _, size, _ in files)
+        target = self.max_bytes * LOW_WATER
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self.scanned_at = time.monotonic()
+        return total
+
+
+def get_cache():
+    """Return this process's variant cache for the current settings"""
+    global _cache
+    root = os.path.join(settings.MEDIA_ROOT, settings.IMAGE_VARIANT_DIR)
+    if (_cache is None or _cache.root != root
+            or _cache.max_bytes != settings.IMAGE_CACHE_MAX_BYTES):
+        _cache = VariantCache(root, settings.IMAGE_CACHE_MAX_BYTES)
+    return _cache
+
+
+def variant_name(source, width, height, fmt, quality):
+    """Return a variant's file name within the cache"""
+    key = f'{source}|{width}|{height}|{fmt}|{quality}'
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return os.path.join(digest[:2], f'{digest}.{fmt}')
+
+
+def variant(image, width=None, height=None, fmt='jpeg', quality=75):
+    """Return the media path of a resized variant of an image field file
+
+    The variant is made on the thread pool when it is not cached yet.
+    """
+    name = variant_name(image.name, width, height, fmt, quality)
+
+    def make():
+        def encode():
+            with image.storage.open(image.name, 'rb') as source:
+                return render(source, width, height, fmt, quality)
+        return _executor().submit(encode).result()
+
+    get_cache().get_or_create(name, make)
+    return os.path.join(settings.IMAGE_VARIANT_DIR, name)
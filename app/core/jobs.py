@@ -0,0 +1,236 @@
+"""
+Durable queue of deferred work kept in the database.
+
+Views enqueue a job naming a registered task and its JSON payload, inside
+the transaction making the change, so the job exists exactly when the
+change does. Workers started by `run_workers` claim ready jobs with
+SELECT ... FOR UPDATE SKIP LOCKED, so any number of them share the queue
+without waiting on each other. A failing job is retried with capped
+exponential backoff until it runs out of attempts, and a job whose worker
+died is claimed again once its lock times out, the lost run counting as
+an attempt. Jobs given an idempotency key are enqueued at most once while
+the finished job is kept.
+"""
+import logging
+import random
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+from core.models import Job
+
+
+logger = logging.getLogger(__name__)
+
+_tasks = {}
+
+
+def task(name):
+    """Register a function as the task run for jobs of this name"""
+    def register(func):
+        _tasks[name] = func
+        return func
+    return register
+
+
+def enqueue(name, payload=None, key=None, delay=0, max_attempts=None,
+            using='default'):
+    """Queue a job for a registered task and return it"""
+    if name not in _tasks:
+        raise ValueError(f'Unknown task {name!r}')
+    fields = {
+        'name': name,
+        'payload': payload or {},
+        'run_at': timezone.now() + timedelta(seconds=delay),
+        'max_attempts': max_attempts or settings.JOB_MAX_ATTEMPTS,
+    }
+    jobs = Job.objects.using(using)
+    if key is None:
+        return jobs.create(**fields)
+    try:
+        with transaction.atomic(using=using):
+            return jobs.create(idempotency_key=key, **fields)
+    except IntegrityError:
+        return jobs.get(idempotency_key=key)
+
+
+def backoff(attempts):
+    """Return the seconds to wait before retrying after a failed attempt"""
+    delay = min(
+        settings.JOB_BACKOFF_MAX,
+        settings.JOB_BACKOFF_BASE * 2 ** (attempts - 1),
+    )
+    return delay * random.uniform(0.5, 1)
+
+
+def claim(worker, limit=1, using='default'):
+    """Lock up to limit ready jobs for a worker and return them"""
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.JOB_LOCK_TIMEOUT)
+    features = connections[using].features
+    with transaction.atomic(using=using):
+        jobs = list(
+            Job.objects.using(using).select_for_update(
+                skip_locked=features.has_select_for_update_skip_locked,
+            ).filter(
+                Q(status=Job.QUEUED, run_at__lte=now) |
+                Q(status=Job.RUNNING, locked_at__lt=stale)
+            ).order_by('run_at', 'id')[:limit]
+        )
+        # A stale job's lost run counted as an attempt when it was
+        # claimed; one out of attempts fails instead of running again.
+        exhausted = [
+            job for job in jobs
+            if job.status == Job.RUNNING and job.attempts >= job.max_attempts
+        ]
+        if exhausted:
+            Job.objects.using(using).filter(
+                id__in=[job.id for job in exhausted],
+            ).update(
+                status=Job.FAILED,
+                finished_at=now,
+                last_error='Worker lock timed out',
+            )
+            jobs = [job for job in jobs if job not in exhausted]
+        if jobs:
+            Job.objects.using(using).filter(
+                id__in=[job.id for job in jobs],
+            ).update(
+                status=Job.RUNNING,
+                attempts=F('attempts') + 1,
+                locked_at=now,
+                locked_by=worker,
+            )
+    for job in jobs:
+        job.status = Job.RUNNING
+        job.attempts += 1
+        job.locked_at = now
+        job.locked_by = worker
+    return jobs
+
+
+def run_job(job, using='default'):
+    """Run a claimed job and record the outcome; return True on success"""
+    ours = Job.objects.using(using).filter(id=job.id, locked_by=job.locked_by)
+    try:
+        func = _tasks.get(job.name)
+        if func is None:
+            raise LookupError(f'Unknown task {job.name!r}')
+        func(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning('Job %s failed (attempt %d)', job, job.attempts)
+        if job.attempts < job.max_attempts:
+            ours.update(
+                status=Job.QUEUED,
+                run_at=timezone.now() + timedelta(
+                    seconds=backoff(job.attempts),
+                ),
+                locked_at=None,
+                locked_by='',
+                last_error=error,
+            )
+        else:
+            ours.update(
+                status=Job.FAILED,
+                finished_at=timezone.now(),
+                last_error=error,
+            )
+        return False
+    ours.update(status=Job.DONE, finished_at=timezone.now(), last_error='')
+    return True
+
+
+def work(worker, limit=1, using='default'):
+    """Claim and run one batch of jobs; return how many were run"""
+    jobs = claim(worker, limit, using)
+    for job in jobs:
+        run_job(job, using)
+    return len(jobs)
+
+
+def run_until_empty(worker='inline', limit=10, using='default'):
+    """Run ready jobs until none are left; return how many were run"""
+    total = 0
+    while True:
+        done = work(worker, limit, using)
+        if not done:
+            return total
+        total += done
+
+
+def prune(retention=None, chunk_size=1000, using='default'):
+    """Delete finished jobs older than retention seconds; return how many"""
+    retention = settings.JOB_RETENTION if retention is None else retention
+    cutoff = timezone.now() - timedelta(seconds=retention)
+    jobs = Job.objects.using(using).filter(
+        status=Job.DONE,
+        finished_at__lt=cutoff,
+    )
+    deleted = 0
+    while True:
+        ids = list(jobs.values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return deleted
+        deleted += Job.objects.using(using).filter(id__in=ids).delete()[0]
+
+
+def queue_depth(using='default'):
+    """Return counts of jobs by status and the wait of the oldest ready"""
+    now = timezone.now()
+    jobs = Job.objects.using(using)
+    counts = dict(
+        jobs.order_by().values('status').annotate(
+            total=Count('id'),
+        ).values_list('status', 'total')
+    )
+    ready = jobs.filter(status=Job.QUEUED, run_at__lte=now)
+    oldest = ready.aggregate(oldest=Min('run_at'))['oldest']
+    return {
+        **{status: counts.get(status, 0) for status, _ in Job.STATUS_CHOICES},
+        'ready': ready.count(),
+        'ready_by_task': dict(
+            ready.order_by().values('name').annotate(
+                total=Count('id'),
+            ).values_list('name', 'total')
+        ),
+        'lag_seconds': (now - oldest).total_seconds() if oldest else 0.0,
+    }
+
+
+class Worker:
+    """Loop claiming and running jobs until told to stop"""
+
+    def __init__(self, name, batch_size=1, poll_interval=None,
+                 using='default'):
+        self.name = name
+        self.batch_size = batch_size
+        self.poll_interval = (
+            settings.JOB_POLL_INTERVAL if poll_interval is None
+            else poll_interval
+        )
+        self.using = using
+        self.stopping = False
+
+    def stop(self, *args):
+        """Finish the current batch, then exit"""
+        self.stopping = True
+
+    def run(self, burst=False):
+        """Work until stopped, or until the queue is empty in burst mode"""
+        done = 0
+        while not self.stopping:
+            ran = work(self.name, self.batch_size, self.using)
+            done += ran
+            if ran:
+                continue
+            if burst:
+                break
+            time.sleep(self.poll_interval)
+        connections[self.using].close()
+        return done
@@ -0,0 +1,73 @@
+"""
+Django command to compare the stock and fast JSON renderer/parser
+"""
+import io
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core import benchmark
+from core.parsers import FastJSONParser
+from core.renderers import FastJSONRenderer
+
+
+def recipe_payload(count):
+    """Return a list shaped like the RecipeDetailSerializer output"""
+    return [
+        {
+            'id': i,
+            'title': f'Recipe {i}',
+            'time_minutes': 5 + i % 120,
+            'price': f'{i % 5000 / 100:.2f}',
+            'link': f'http://example.com/recipe-{i}.pdf',
+            'tags': [
+                {'id': i % 10 + j, 'name': f'Tag {i % 10 + j}'}
+                for j in range(3)
+            ],
+            'ingredients': [
+                {'id': i % 20 + j, 'name': f'Ingredient {i % 20 + j}'}
+                for j in range(5)
+            ],
+            'description': 'Sample description ' * 5,
+        }
+        for i in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    """Benchmark JSON rendering and parsing of recipe payloads"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='100,1000,10000',
+            help='Comma separated list of recipe counts',
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        for size in [int(s) for s in options['sizes'].split(',')]:
+            data = recipe_payload(size)
+            body = JSONRenderer().render(data)
+
+            results = [
+                ('render stdlib', lambda: JSONRenderer().render(data)),
+                ('render fast', lambda: FastJSONRenderer().render(data)),
+                ('parse stdlib',
+                 lambda: JSONParser().parse(io.BytesIO(body))),
+                ('parse fast',
+                 lambda: FastJSONParser().parse(io.BytesIO(body))),
+            ]
+            with override_settings(JSON_BACKEND='orjson'):
+                timings = [
+                    (name, benchmark.best_of(func, repeat))
+                    for name, func in results
+                ]
+            line = ', '.join(
+                f'{name} {seconds * 1000:7.2f} ms'
+                for name, seconds in timings
+            )
+            self.stdout.write(f'{size:>6} recipes: {line}')
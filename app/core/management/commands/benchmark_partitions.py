@@ -0,0 +1,66 @@
+"""
+Django command to show per-user recipe queries only touch one partition
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core import benchmark, partitioning
+from core.models import Recipe
+
+
+class Command(BaseCommand):
+    """Benchmark per-user recipe queries on partitioned tables"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--recipes', type=int, default=2000)
+        parser.add_argument('--partitions', type=int, default=8)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Partitioning requires PostgreSQL')
+        benchmark.run_rolled_back(lambda: self._run(**options))
+
+    def _queries(self, user):
+        recipes = Recipe.objects.filter(user=user)
+        tag_ids = list(
+            user.tag_set.values_list('id', flat=True)[:2]
+        )
+        return [
+            ('recipe list', recipes.order_by('-id')),
+            ('tag filter', recipes.filter(tags__id__in=tag_ids).distinct()),
+            ('assigned tags', user.tag_set.filter(recipe__isnull=False)),
+        ]
+
+    def _report(self, label, users):
+        for name, _ in self._queries(users[0]):
+            touched = set()
+            total = 0.0
+            for user in users:
+                queryset = dict(self._queries(user))[name]
+                plan = benchmark.explain_plan(queryset, analyze=True)
+                relations = benchmark.plan_relations(plan)
+                touched.add(len(relations))
+                total += plan['Planning Time'] + plan['Execution Time']
+            self.stdout.write(
+                f'{label:>12} {name:<14} relations/query {sorted(touched)}, '
+                f'avg {total / len(users):7.2f} ms'
+            )
+
+    def _run(self, users, recipes, partitions, **options):
+        seeded = []
+        for _ in range(users):
+            user = benchmark.create_user()
+            benchmark.seed_recipes(user, recipes // users)
+            seeded.append(user)
+
+        if not partitioning.is_partitioned(connection):
+            connection.cursor().execute('ANALYZE')
+            self._report('single heap', seeded)
+            partitioning.partition_tables(
+                connection,
+                partitions,
+                log=lambda message: None,
+            )
+        connection.cursor().execute('ANALYZE')
+        self._report('partitioned', seeded)
@@ -0,0 +1,81 @@
+"""
+Django command to measure the planning time saved by prepared statements
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from rest_framework.authtoken.models import Token
+
+from core import benchmark
+from core.models import Recipe, Tag
+from core.prepared import execute_statement, positional
+
+
+# Postgres switches a prepared statement to a cached generic plan after
+# five executions with custom plans.
+WARMUP = 6
+
+
+class Command(BaseCommand):
+    """Compare hot queries planned every time with prepared ones"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=500)
+        parser.add_argument('--runs', type=int, default=500)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Prepared statements require PostgreSQL')
+        benchmark.run_rolled_back(lambda: self._run(**options))
+
+    def _queries(self, user, token):
+        recipes = Recipe.objects.filter(user=user).order_by('-id').distinct()
+        tags = Tag.objects.filter(user=user).order_by('-name').distinct()
+        return [
+            ('recipe list', recipes.values(
+                'id', 'title', 'time_minutes', 'price', 'link',
+            )),
+            ('tag list', tags.values('id', 'name')),
+            ('token', Token.objects.select_related('user').filter(
+                key=token.key,
+            )),
+        ]
+
+    def _planning_time(self, cursor, sql, params):
+        cursor.execute(f'EXPLAIN (ANALYZE, FORMAT JSON) {sql}', params)
+        return cursor.fetchone()[0][0]['Planning Time']
+
+    def _run(self, recipes, runs, **options):
+        user = benchmark.create_user()
+        benchmark.seed_recipes(user, recipes)
+        token = Token.objects.create(user=user)
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+            for index, (label, queryset) in enumerate(
+                self._queries(user, token)
+            ):
+                sql, params = queryset.query.sql_with_params()
+                name = f'benchmark_{index}'
+                cursor.execute(f'PREPARE {name} AS {positional(sql)}')
+                execute = execute_statement(name, params)
+                for _ in range(WARMUP):
+                    cursor.execute(execute, params)
+
+                planned = self._planning_time(cursor, sql, params)
+                prepared = self._planning_time(cursor, execute, params)
+                plain_time = benchmark.best_of(
+                    lambda: [cursor.execute(sql, params)
+                             for _ in range(runs)],
+                )
+                prepared_time = benchmark.best_of(
+                    lambda: [cursor.execute(execute, params)
+                             for _ in range(runs)],
+                )
+                cursor.execute(f'DEALLOCATE {name}')
+                self.stdout.write(
+                    f'{label:<12} planning {planned:6.3f} ms -> '
+                    f'{prepared:6.3f} ms, {runs} runs '
+                    f'{plain_time * 1000:8.1f} ms -> '
+                    f'{prepared_time * 1000:8.1f} ms'
+                )
@@ -0,0 +1,46 @@
+"""
+Django command to compare the ModelSerializer and fast list paths
+"""
+from django.core.management.base import BaseCommand
+
+from core import benchmark
+from core.models import Recipe
+from recipe import fast_serializers
+from recipe.serializers import RecipeSerializer
+
+
+class Command(BaseCommand):
+    """Benchmark recipe list serialization at several sizes"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='100,1000,10000',
+            help='Comma separated list of recipe counts',
+        )
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        benchmark.run_rolled_back(
+            lambda: self._run(sizes, options['repeat'])
+        )
+
+    def _run(self, sizes, repeat):
+        for size in sizes:
+            user = benchmark.create_user()
+            benchmark.seed_recipes(user, size)
+            queryset = Recipe.objects.filter(user=user).order_by('-id')
+
+            slow = benchmark.best_of(
+                lambda: RecipeSerializer(queryset, many=True).data,
+                repeat,
+            )
+            fast = benchmark.best_of(
+                lambda: fast_serializers.serialize_recipes(queryset),
+                repeat,
+            )
+            self.stdout.write(
+                f'{size:>6} recipes: serializer {slow * 1000:8.1f} ms, '
+                f'fast {fast * 1000:8.1f} ms, speedup {slow / fast:5.1f}x'
+            )
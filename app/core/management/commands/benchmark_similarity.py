@@ -0,0 +1,92 @@
+"""
+Django command to benchmark the similar-recipe index
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import benchmark
+from core.models import Recipe
+from recipe.similarity import SimilarityIndex
+
+
+def naive_similar(recipe_items, recipe_id, k):
+    """Score every other recipe with Python sets, as a baseline"""
+    query = recipe_items[recipe_id]
+    scores = []
+    for other_id, items in recipe_items.items():
+        if other_id != recipe_id:
+            inter = len(query & items)
+            if inter:
+                scores.append((inter / len(query | items), other_id))
+    scores.sort(key=lambda item: (-item[0], item[1]))
+    return scores[:k]
+
+
+class Command(BaseCommand):
+    """Benchmark index build, top-k queries and incremental updates"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='1000,10000,100000',
+            help='Comma separated list of recipe counts',
+        )
+        parser.add_argument('--tags', type=int, default=50)
+        parser.add_argument('--ingredients', type=int, default=500)
+        parser.add_argument('--per-recipe', type=int, default=6)
+        parser.add_argument('--queries', type=int, default=20)
+        parser.add_argument('--k', type=int, default=10)
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        benchmark.run_rolled_back(lambda: self._run(sizes, options))
+
+    def _run(self, sizes, options):
+        k = options['k']
+        for size in sizes:
+            user = benchmark.create_user()
+            recipes = benchmark.seed_recipes(
+                user,
+                size,
+                tags=options['tags'],
+                ingredients=options['ingredients'],
+                per_recipe=options['per_recipe'],
+            )
+            sample = [
+                recipe.id
+                for recipe in recipes[::max(1, size // options['queries'])]
+            ]
+
+            start = time.perf_counter()
+            index = SimilarityIndex.from_database(user.id)
+            build = time.perf_counter() - start
+
+            indexed = benchmark.best_of(
+                lambda: [index.similar(pk, k) for pk in sample],
+                3,
+            ) / len(sample)
+
+            recipe_items = {
+                int(pk): index.items_of(int(pk)) for pk in index.recipe_ids
+            }
+            naive = benchmark.best_of(
+                lambda: [naive_similar(recipe_items, pk, k) for pk in sample],
+                1,
+            ) / len(sample)
+
+            changed = Recipe.objects.filter(user=user).order_by('id')[:100]
+            changed_ids = [recipe.id for recipe in changed]
+            update = benchmark.best_of(
+                lambda: index.updated(changed_ids, [
+                    (pk, 1) for pk in changed_ids
+                ]),
+                1,
+            )
+
+            self.stdout.write(
+                f'{size:>7} recipes: build {build * 1000:8.1f} ms, '
+                f'top-{k} {indexed * 1000:7.2f} ms, '
+                f'naive {naive * 1000:8.2f} ms, '
+                f'100 updates {update * 1000:6.2f} ms'
+            )
@@ -0,0 +1,54 @@
+"""
+Django command to recompute the signatures used to find duplicate recipes
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from recipe.duplicates import duplicate_pairs, index_all
+
+
+class Command(BaseCommand):
+    """Index recipes for near-duplicate detection in parallel"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'users',
+            nargs='*',
+            type=int,
+            help='Only index recipes of these user ids',
+        )
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--chunk-size', type=int, default=100)
+        parser.add_argument(
+            '--report',
+            type=float,
+            metavar='THRESHOLD',
+            help='Afterwards list the pairs at least this similar',
+        )
+
+    def handle(self, *args, **options):
+        user_ids = get_user_model().objects.order_by('id').values_list(
+            'id',
+            flat=True,
+        )
+        if options['users']:
+            user_ids = user_ids.filter(id__in=options['users'])
+
+        done = index_all(
+            user_ids,
+            workers=options['workers'],
+            chunk_size=options['chunk_size'],
+            log=self.stdout.write,
+        )
+        self.stdout.write(self.style.SUCCESS(f'Indexed {done} recipes'))
+
+        if options['report'] is not None:
+            for user_id in user_ids:
+                for recipe_id, duplicate_id, score in duplicate_pairs(
+                    user_id,
+                    options['report'],
+                ):
+                    self.stdout.write(
+                        f'user {user_id}: {recipe_id} ~ {duplicate_id} '
+                        f'({score:.2f})'
+                    )
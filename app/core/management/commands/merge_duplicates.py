@@ -0,0 +1,43 @@
+"""
+Django command to merge duplicate tags and ingredients
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from core.models import Tag, Ingredient
+from recipe.merging import merge_all
+
+
+MODELS = {'tags': [Tag], 'ingredients': [Ingredient], 'all': [Tag, Ingredient]}
+
+
+class Command(BaseCommand):
+    """Merge items whose names normalize the same, in parallel by user"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'users',
+            nargs='*',
+            type=int,
+            help='Only merge for these user ids',
+        )
+        parser.add_argument('--models', choices=MODELS, default='all')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        user_ids = get_user_model().objects.order_by('id').values_list(
+            'id',
+            flat=True,
+        )
+        if options['users']:
+            user_ids = user_ids.filter(id__in=options['users'])
+
+        merged = merge_all(
+            user_ids,
+            models=MODELS[options['models']],
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            log=self.stdout.write,
+        )
+        self.stdout.write(self.style.SUCCESS(f'Merged {merged} duplicates'))
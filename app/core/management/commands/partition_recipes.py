@@ -0,0 +1,52 @@
+"""
+Django command to hash partition recipe tables by user online
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core import partitioning
+
+
+class Command(BaseCommand):
+    """Partition or unpartition the recipe and m2m tables"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--partitions',
+            type=int,
+            default=settings.RECIPE_PARTITIONS or 16,
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.PARTITION_BATCH_SIZE,
+        )
+        parser.add_argument(
+            '--undo',
+            action='store_true',
+            help='Turn partitioned tables back into single tables',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Partitioning requires PostgreSQL')
+
+        if options['undo']:
+            done = partitioning.unpartition_tables(
+                connection,
+                options['batch_size'],
+                self.stdout.write,
+            )
+        else:
+            done = partitioning.partition_tables(
+                connection,
+                options['partitions'],
+                options['batch_size'],
+                self.stdout.write,
+            )
+
+        if done:
+            self.stdout.write(self.style.SUCCESS('Recipe tables rebuilt'))
+        else:
+            self.stdout.write('Nothing to do')
@@ -0,0 +1,60 @@
+"""
+Django command to break down the import time of starting the app
+"""
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.startup import parse_import_times
+
+
+SCRIPT = """
+import sys
+from importlib import import_module
+
+import django
+
+django.setup()
+for module in sys.argv[1:]:
+    import_module(module)
+"""
+
+
+class Command(BaseCommand):
+    """Import the app in a fresh interpreter under -X importtime"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'modules',
+            nargs='*',
+            help='Modules to import after setup (default: the URLconf)',
+        )
+        parser.add_argument('--limit', type=int, default=20)
+
+    def handle(self, *args, modules, limit, **options):
+        modules = modules or [settings.ROOT_URLCONF]
+        env = dict(os.environ)
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', SCRIPT, *modules],
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+        )
+        if result.returncode:
+            raise CommandError(result.stderr.strip().splitlines()[-1])
+
+        total, packages = parse_import_times(result.stderr)
+        self.stdout.write(
+            f'Imported in {total / 1000:.1f} ms: '
+            f'django.setup() and {", ".join(modules)}'
+        )
+        ranked = sorted(packages.items(), key=lambda item: -item[1])
+        for package, own in ranked[:limit]:
+            self.stdout.write(
+                f'{own / 1000:8.1f} ms {own * 100 / total:5.1f}%  {package}'
+            )
@@ -0,0 +1,60 @@
+"""
+Django command to remove soft-deleted users and recipes in chunks
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import reaper, sync
+
+
+class Command(BaseCommand):
+    """Reap soft-deleted data and old sync tombstones once, or keep reaping"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=settings.REAPER_CHUNK_SIZE,
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running, sleeping between passes',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=settings.REAPER_INTERVAL,
+        )
+        parser.add_argument(
+            '--status',
+            action='store_true',
+            help='Only report what is waiting to be reaped',
+        )
+
+    def handle(self, *args, **options):
+        if options['status']:
+            waiting = reaper.pending()
+            self.stdout.write(
+                f"{waiting['users']} users and {waiting['recipes']} recipes "
+                f"waiting to be reaped"
+            )
+            return
+
+        while True:
+            users, recipes = reaper.reap(
+                options['chunk_size'],
+                log=self.stdout.write,
+            )
+            if users or recipes:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Reaped {users} users and {recipes} recipes'
+                ))
+            compacted = sync.compact_tombstones()
+            if compacted:
+                self.stdout.write(f'Compacted {compacted} tombstones')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
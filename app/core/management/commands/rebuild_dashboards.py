@@ -0,0 +1,37 @@
+"""
+Django command to recompute user dashboards from scratch
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from core.dashboard import rebuild_dashboards
+
+
+class Command(BaseCommand):
+    """Rebuild per-user dashboard summaries in parallel"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'users',
+            nargs='*',
+            type=int,
+            help='Only rebuild these user ids',
+        )
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--chunk-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        user_ids = get_user_model().objects.order_by('id').values_list(
+            'id',
+            flat=True,
+        )
+        if options['users']:
+            user_ids = user_ids.filter(id__in=options['users'])
+
+        done = rebuild_dashboards(
+            user_ids,
+            workers=options['workers'],
+            chunk_size=options['chunk_size'],
+            log=self.stdout.write,
+        )
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {done} dashboards'))
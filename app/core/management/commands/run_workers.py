@@ -0,0 +1,123 @@
+"""
+Django command to run job queue workers in a pool of processes
+"""
+import multiprocessing
+import os
+import signal
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core import jobs
+
+
+def _work(options):
+    """Entry point of one worker process"""
+    worker = jobs.Worker(
+        f'{socket.gethostname()}:{os.getpid()}',
+        batch_size=options['batch_size'],
+        poll_interval=options['poll_interval'],
+    )
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    return worker.run(burst=options['burst'])
+
+
+class Command(BaseCommand):
+    """Run jobs from the queue until stopped"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=2,
+            help='Worker processes to run; 1 works in this process',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1,
+            help='Jobs each worker claims at a time',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=settings.JOB_POLL_INTERVAL,
+        )
+        parser.add_argument(
+            '--burst',
+            action='store_true',
+            help='Exit once the queue is empty',
+        )
+        parser.add_argument(
+            '--stats-interval',
+            type=int,
+            default=60,
+            help='Seconds between queue depth reports and pruning',
+        )
+        parser.add_argument(
+            '--stats',
+            action='store_true',
+            help='Only report the queue depth',
+        )
+
+    def report(self):
+        depth = jobs.queue_depth()
+        self.stdout.write(
+            f"queued {depth['queued']} (ready {depth['ready']}, "
+            f"lag {depth['lag_seconds']:.1f}s), running {depth['running']}, "
+            f"done {depth['done']}, failed {depth['failed']}"
+        )
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.report()
+            return
+
+        if options['processes'] <= 1:
+            done = _work(options)
+            self.stdout.write(self.style.SUCCESS(f'Ran {done} jobs'))
+            return
+
+        # Children must not share the parent's database connections.
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        stopping = []
+
+        def start():
+            process = context.Process(target=_work, args=(options,))
+            process.start()
+            return process
+
+        def stop(*args):
+            stopping.append(True)
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        pool = [start() for _ in range(options['processes'])]
+        last_report = 0
+        while not stopping and any(p.is_alive() for p in pool):
+            if not options['burst']:
+                for i, process in enumerate(pool):
+                    if not process.is_alive():
+                        self.stderr.write(
+                            f'Worker {process.pid} exited with '
+                            f'{process.exitcode}, restarting'
+                        )
+                        connections.close_all()
+                        pool[i] = start()
+            if time.monotonic() - last_report >= options['stats_interval']:
+                jobs.prune()
+                self.report()
+                connections.close_all()
+                last_report = time.monotonic()
+            time.sleep(1)
+
+        for process in pool:
+            if process.is_alive():
+                process.terminate()
+        for process in pool:
+            process.join()
@@ -0,0 +1,66 @@
+"""
+Middleware for the API
+"""
+import math
+import random
+import time
+
+from django.conf import settings
+from django.http import JsonResponse
+
+
+class LoadSheddingMiddleware:
+    """
+    Reject API requests early with 503 while the request queue backs up.
+
+    nginx stamps each request with `X-Request-Start: t=<seconds>`. The
+    time between that stamp and a worker picking the request up is the
+    queue latency, tracked as a moving average per worker. Above
+    LOAD_SHED_QUEUE_THRESHOLD seconds the worker starts shedding a share of
+    requests that grows with the overload, and stops again once the
+    average drops below half the threshold.
+    """
+    smoothing = 0.2
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.latency = 0.0
+        self.shedding = False
+
+    def queue_latency(self, request):
+        """Return seconds the request waited before reaching Django"""
+        header = request.META.get('HTTP_X_REQUEST_START', '')
+        try:
+            started = float(header[2:] if header.startswith('t=') else header)
+        except ValueError:
+            return None
+        return max(time.time() - started, 0.0)
+
+    def should_shed(self, queued, threshold):
+        """Update the load estimate and decide whether to shed"""
+        self.latency += self.smoothing * (queued - self.latency)
+        if self.shedding and self.latency < threshold / 2:
+            self.shedding = False
+        elif not self.shedding and self.latency > threshold:
+            self.shedding = True
+
+        if not self.shedding:
+            return False
+        if queued > threshold:
+            return True
+        return random.random() < min(1.0, self.latency / threshold - 0.5)
+
+    def __call__(self, request):
+        threshold = settings.LOAD_SHED_QUEUE_THRESHOLD
+        if threshold and request.path.startswith(settings.LOAD_SHED_PREFIX):
+            queued = self.queue_latency(request)
+            if queued is not None and self.should_shed(queued, threshold):
+                response = JsonResponse(
+                    {'detail': 'Service temporarily overloaded.'},
+                    status=503,
+                )
+                response['Retry-After'] = str(
+                    max(1, math.ceil(self.latency * 2))
+                )
+                return response
+        return self.get_response(request)
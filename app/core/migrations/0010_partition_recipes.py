@@ -0,0 +1,36 @@
+# Generated by Django 3.2.25 on 2026-10-19 09:40
+
+from django.conf import settings
+from django.db import migrations
+
+from core.migrations import _partitioning_0010 as partitioning
+
+
+def partition(apps, schema_editor):
+    """Partition the recipe tables by user when RECIPE_PARTITIONS is set"""
+    if settings.RECIPE_PARTITIONS:
+        partitioning.partition_tables(
+            schema_editor.connection,
+            settings.RECIPE_PARTITIONS,
+            settings.PARTITION_BATCH_SIZE,
+        )
+
+
+def unpartition(apps, schema_editor):
+    """Turn partitioned recipe tables back into single tables"""
+    partitioning.unpartition_tables(
+        schema_editor.connection,
+        settings.PARTITION_BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('core', '0009_recipe_through_models'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition, unpartition),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.25 on 2026-10-19 09:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_recipe_range_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserDashboard',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='dashboard', serialize=False, to='core.user')),
+                ('recipe_count', models.PositiveIntegerField(default=0)),
+                ('tag_count', models.PositiveIntegerField(default=0)),
+                ('ingredient_count', models.PositiveIntegerField(default=0)),
+                ('tag_usage', models.JSONField(default=dict)),
+                ('ingredient_usage', models.JSONField(default=dict)),
+            ],
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 3.2.25 on 2026-10-19 10:02
+
+import unicodedata
+
+from django.db import migrations, models, transaction
+
+
+BATCH_SIZE = 5000
+
+
+# Copies of core.names as this migration was written, so the backfill
+# stays the same whatever later becomes of those functions.
+def clean_name(name):
+    """Return a name in NFKC form with whitespace collapsed"""
+    return ' '.join(unicodedata.normalize('NFKC', name).split())
+
+
+def name_key(name):
+    """Return the key under which names count as duplicates"""
+    return unicodedata.normalize('NFKC', clean_name(name).casefold())
+
+
+def normalize_names(apps, schema_editor):
+    """Fill in normalized names of existing rows in short batches"""
+    db = schema_editor.connection.alias
+    for name in ('Tag', 'Ingredient'):
+        model = apps.get_model('core', name)
+        last_id = 0
+        while True:
+            with transaction.atomic(using=db):
+                batch = list(
+                    model.objects.using(db).filter(
+                        id__gt=last_id,
+                    ).order_by('id')[:BATCH_SIZE]
+                )
+                if not batch:
+                    break
+                for item in batch:
+                    item.name = clean_name(item.name)
+                    item.normalized_name = name_key(item.name)
+                model.objects.using(db).bulk_update(
+                    batch,
+                    ['name', 'normalized_name'],
+                )
+            last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('core', '0012_userdashboard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='normalized_name',
+            field=models.CharField(default='', editable=False, max_length=255),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='normalized_name',
+            field=models.CharField(default='', editable=False, max_length=255),
+            preserve_default=False,
+        ),
+        migrations.RunPython(normalize_names, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'normalized_name'], name='core_tag_user_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', 'normalized_name'], name='core_ingredient_user_name_idx'),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 3.2.25 on 2026-10-19 09:57
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_sync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NutrientProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('energy_kcal', models.FloatField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                ('protein_g', models.FloatField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                ('fat_g', models.FloatField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                ('saturated_fat_g', models.FloatField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                ('carbohydrate_g', models.FloatField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                ('sugar_g', models.FloatField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                ('fiber_g', models.FloatField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                ('salt_g', models.FloatField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                ('name', models.CharField(max_length=255, unique=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='RecipeNutrition',
+            fields=[
+                ('energy_kcal', models.FloatField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                ('protein_g', models.FloatField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                ('fat_g', models.FloatField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                ('saturated_fat_g', models.FloatField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                ('carbohydrate_g', models.FloatField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                ('sugar_g', models.FloatField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                ('fiber_g', models.FloatField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                ('salt_g', models.FloatField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                ('recipe', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='nutrition', serialize=False, to='core.recipe')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='IngredientNutrition',
+            fields=[
+                ('energy_kcal', models.FloatField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                ('protein_g', models.FloatField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                ('fat_g', models.FloatField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                ('saturated_fat_g', models.FloatField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                ('carbohydrate_g', models.FloatField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                ('sugar_g', models.FloatField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                ('fiber_g', models.FloatField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                ('salt_g', models.FloatField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                ('ingredient', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='nutrition', serialize=False, to='core.ingredient')),
+                ('profile', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.nutrientprofile')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='ingredientnutrition',
+            index=models.Index(fields=['user', 'ingredient'], name='core_ingnutrition_user_idx'),
+        ),
+    ]
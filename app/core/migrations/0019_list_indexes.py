@@ -0,0 +1,36 @@
+# Generated by Django 3.2.25 on 2026-10-19 10:04
+
+from django.db import migrations, models
+
+from core.migrations._indexes_0019 import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('core', '0018_signatures'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='ingredient',
+            index=models.Index(fields=['user', '-name'], include=('id',), name='core_ingredient_user_list_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['user', '-id'], include=('title', 'time_minutes', 'price', 'link'), name='core_recipe_user_list_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='recipeingredient',
+            index=models.Index(fields=['ingredient', 'recipe'], include=('user',), name='core_recipeing_ingredient_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='recipetag',
+            index=models.Index(fields=['tag', 'recipe'], include=('user',), name='core_recipetag_tag_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='tag',
+            index=models.Index(fields=['user', '-name'], include=('id',), name='core_tag_user_list_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.2.25 on 2026-10-19 10:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_stream_tickets'),
+    ]
+
+    operations = [
+        # The recipe keys are those core.partitioning created, composite
+        # once the tables are partitioned, so the database is left as is.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='recipeingredient',
+                    name='recipe',
+                    field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='core.recipe'),
+                ),
+                migrations.AlterField(
+                    model_name='recipetag',
+                    name='recipe',
+                    field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='core.recipe'),
+                ),
+            ],
+        ),
+    ]
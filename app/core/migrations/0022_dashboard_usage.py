@@ -0,0 +1,83 @@
+# Generated by Django 3.2.25 on 2026-10-19 10:45
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+FIELDS = {'tag': 'tag_usage', 'ingredient': 'ingredient_usage'}
+
+
+def copy_usage(apps, schema_editor):
+    """Turn each dashboard's usage maps into one row per item"""
+    db = schema_editor.connection.alias
+    UserDashboard = apps.get_model('core', 'UserDashboard')
+    DashboardUsage = apps.get_model('core', 'DashboardUsage')
+    for dashboard in UserDashboard.objects.using(db).iterator():
+        DashboardUsage.objects.using(db).bulk_create([
+            DashboardUsage(
+                user_id=dashboard.user_id,
+                kind=kind,
+                item_id=int(pk),
+                name=name or '',
+                uses=uses,
+            )
+            for kind, field in FIELDS.items()
+            for pk, (name, uses) in getattr(dashboard, field).items()
+        ])
+
+
+def copy_usage_back(apps, schema_editor):
+    """Gather each user's usage rows back into the dashboard's maps"""
+    db = schema_editor.connection.alias
+    UserDashboard = apps.get_model('core', 'UserDashboard')
+    DashboardUsage = apps.get_model('core', 'DashboardUsage')
+    for dashboard in UserDashboard.objects.using(db).iterator():
+        rows = DashboardUsage.objects.using(db).filter(
+            user_id=dashboard.user_id,
+        ).values_list('kind', 'item_id', 'name', 'uses')
+        for kind, field in FIELDS.items():
+            setattr(dashboard, field, {
+                str(pk): [name, uses]
+                for row_kind, pk, name, uses in rows
+                if row_kind == kind
+            })
+        dashboard.save(using=db)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_recipe_relation_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20)),
+                ('item_id', models.BigIntegerField()),
+                ('name', models.CharField(max_length=255)),
+                ('uses', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='dashboardusage',
+            index=models.Index(fields=['user', 'kind', '-uses'], name='core_dashusage_top_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='dashboardusage',
+            unique_together={('user', 'kind', 'item_id')},
+        ),
+        migrations.RunPython(copy_usage, copy_usage_back),
+        migrations.RemoveField(
+            model_name='userdashboard',
+            name='ingredient_usage',
+        ),
+        migrations.RemoveField(
+            model_name='userdashboard',
+            name='tag_usage',
+        ),
+    ]
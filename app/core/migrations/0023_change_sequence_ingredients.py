@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-19 10:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_dashboard_usage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='changesequence',
+            name='ingredients_seq',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
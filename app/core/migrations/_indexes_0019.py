@@ -0,0 +1,130 @@
+"""
+Copy of core.indexes as migration 0019_list_indexes runs it.
+
+Like _partitioning_0010, this module is never changed, so the migration
+keeps doing what it did when it was written; core.indexes is free to
+evolve for later migrations.
+"""
+from django.db import migrations
+
+
+def is_partitioned(connection, table):
+    """Return True if the table is a partitioned Postgres table"""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)',
+            [table],
+        )
+        row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def _partitions(cursor, table):
+    cursor.execute(
+        'SELECT c.relname FROM pg_inherits i '
+        'JOIN pg_class c ON c.oid = i.inhrelid '
+        'WHERE i.inhparent = %s::regclass ORDER BY c.relname',
+        [table],
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _drop_invalid(cursor, quote, name):
+    cursor.execute(
+        'SELECT NOT x.indisvalid FROM pg_index x '
+        'WHERE x.indexrelid = to_regclass(%s)',
+        [name],
+    )
+    row = cursor.fetchone()
+    if row is not None and row[0]:
+        cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {quote(name)}')
+
+
+def create_index(schema_editor, model, index):
+    """Build an index without blocking writes where the database can"""
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        schema_editor.add_index(model, index)
+        return
+    if connection.in_atomic_block:
+        raise RuntimeError(
+            'Concurrent index builds must run in a migration with '
+            'atomic = False.'
+        )
+
+    quote = schema_editor.quote_name
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if not is_partitioned(connection, table):
+            _drop_invalid(cursor, quote, index.name)
+            schema_editor.add_index(model, index, concurrently=True)
+            return
+
+        parent = index.create_sql(model, schema_editor)
+        parent.template = parent.template.replace(
+            'CREATE INDEX %(name)s ON ',
+            'CREATE INDEX IF NOT EXISTS %(name)s ON ONLY ',
+            1,
+        )
+        cursor.execute(str(parent))
+        for partition in _partitions(cursor, table):
+            name = f'{partition}_{index.name}'
+            _drop_invalid(cursor, quote, name)
+            child = index.create_sql(model, schema_editor, concurrently=True)
+            child.rename_table_references(table, partition)
+            child.parts['name'] = quote(name)
+            child.template = child.template.replace(
+                'CONCURRENTLY %(name)s',
+                'CONCURRENTLY IF NOT EXISTS %(name)s',
+                1,
+            )
+            cursor.execute(str(child))
+            cursor.execute(
+                'SELECT 1 FROM pg_inherits '
+                'WHERE inhrelid = %s::regclass AND inhparent = %s::regclass',
+                [name, index.name],
+            )
+            if cursor.fetchone() is None:
+                cursor.execute(
+                    f'ALTER INDEX {quote(index.name)} '
+                    f'ATTACH PARTITION {quote(name)}'
+                )
+
+
+def drop_index(schema_editor, model, index):
+    """Drop an index, without blocking writes where the database can"""
+    connection = schema_editor.connection
+    concurrently = (
+        connection.vendor == 'postgresql'
+        and not is_partitioned(connection, model._meta.db_table)
+    )
+    if concurrently:
+        schema_editor.remove_index(model, index, concurrently=True)
+    else:
+        # Dropping a partitioned index drops the partitions' with it.
+        schema_editor.remove_index(model, index)
+
+
+class AddIndexConcurrently(migrations.AddIndex):
+    """Add an index without blocking writes to the table"""
+    atomic = False
+
+    def describe(self):
+        return (
+            f'Concurrently create index {self.index.name} on model '
+            f'{self.model_name}'
+        )
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            create_index(schema_editor, model, self.index)
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            drop_index(schema_editor, model, self.index)
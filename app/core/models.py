@@ -1,14 +1,18 @@
 import os
 import uuid
 
-from django.db import models
+from django.core.validators import MinValueValidator
+from django.db import models, router, transaction
 from django.conf import settings
+from django.utils import timezone
 from django.contrib.auth.models import (
     AbstractBaseUser,
     PermissionsMixin,
     BaseUserManager,
 )
 
+from core.names import clean_name, name_key
+
 def recipe_image_file_path(instance, filename):
     """Generate filepath for new recipe image"""
     ext = os.path.splitext(filename)[1]
@@ -43,36 +47,162 @@ class User(AbstractBaseUser, PermissionsMixin):
     name = models.CharField(max_length=255)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    deleted_at = models.DateTimeField(null=True, blank=True)
 
     objects = UserManager()
     USERNAME_FIELD = 'email'
 
+    def soft_delete(self):
+        """Lock the user out now and leave removing the data to the reaper"""
+        if self.deleted_at is None:
+            self.is_active = False
+            self.deleted_at = timezone.now()
+            self.save(update_fields=['is_active', 'deleted_at'])
+
+
+class NamedItemQuerySet(models.QuerySet):
+    """QuerySet normalizing names of bulk created tags and ingredients"""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.normalize_name()
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def matching(self, name):
+        """Filter to items whose name is a duplicate of name"""
+        return self.filter(normalized_name=name_key(name))
+
+    def get_or_create_by_name(self, user, name):
+        """Return the user's oldest item matching name, creating it if none"""
+        item = self.filter(user=user).matching(name).order_by('id').first()
+        if item is not None:
+            return item, False
+        return self.create(user=user, name=name), True
+
+
+class NormalizedNameMixin:
+    """Keep `name` tidy and `normalized_name` in step with it"""
+    _stored_name = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_name = instance.__dict__.get('name')
+        return instance
 
-class Tag(models.Model):
+    def name_changed(self):
+        """Return False if the name is known to match the stored one"""
+        return self._stored_name is None or self.name != self._stored_name
+
+    def normalize_name(self):
+        self.name = clean_name(self.name)
+        self.normalized_name = name_key(self.name)
+
+    def save(self, *args, **kwargs):
+        self.normalize_name()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'normalized_name'}
+        super().save(*args, **kwargs)
+        if update_fields is None or 'name' in update_fields:
+            self._stored_name = self.name
+
+
+class SyncedMixin:
+    """Write `sync_seq`, which core.sync sets before every save"""
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'sync_seq'}
+        using = kwargs.get('using') or router.db_for_write(
+            type(self),
+            instance=self,
+        )
+        # The user's change sequence stays locked from numbering this
+        # change until the row carrying the number commits, so changes
+        # commit in the order they are numbered.
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+
+
+class Tag(SyncedMixin, NormalizedNameMixin, models.Model):
     """Tag model"""
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete = models.CASCADE,
     )
     name = models.CharField(max_length=255)
+    normalized_name = models.CharField(max_length=255, editable=False)
+    sync_seq = models.BigIntegerField(default=0, editable=False)
+
+    objects = NamedItemQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'normalized_name'],
+                name='core_tag_user_name_idx',
+            ),
+            models.Index(
+                fields=['user', 'sync_seq'],
+                name='core_tag_user_sync_idx',
+            ),
+            # Covers the list endpoint, which sorts by name descending.
+            models.Index(
+                fields=['user', '-name'],
+                include=['id'],
+                name='core_tag_user_list_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
 
-class Ingredient(models.Model):
+class Ingredient(SyncedMixin, NormalizedNameMixin, models.Model):
     """Ingredient object"""
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
     name = models.CharField(max_length=255)
+    normalized_name = models.CharField(max_length=255, editable=False)
+    sync_seq = models.BigIntegerField(default=0, editable=False)
+
+    objects = NamedItemQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'normalized_name'],
+                name='core_ingredient_user_name_idx',
+            ),
+            models.Index(
+                fields=['user', 'sync_seq'],
+                name='core_ingredient_user_sync_idx',
+            ),
+            # Covers the list endpoint, which sorts by name descending.
+            models.Index(
+                fields=['user', '-name'],
+                include=['id'],
+                name='core_ingredient_user_list_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
 
-class Recipe(models.Model):
+class LiveRecipeManager(models.Manager):
+    """Manager hiding soft-deleted recipes"""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
+class Recipe(SyncedMixin, models.Model):
     """Recipe object"""
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -83,12 +213,404 @@ class Recipe(models.Model):
     time_minutes = models.IntegerField()
     price = models.DecimalField(max_digits=5, decimal_places=2)
     link = models.CharField(max_length=255, blank=True)
-    tags = models.ManyToManyField('Tag')
-    ingredients = models.ManyToManyField('Ingredient')
+    tags = models.ManyToManyField('Tag', through='RecipeTag')
+    ingredients = models.ManyToManyField(
+        'Ingredient',
+        through='RecipeIngredient',
+    )
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+    sync_seq = models.BigIntegerField(default=0, editable=False)
+
+    objects = LiveRecipeManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'price'],
+                name='core_recipe_user_price_idx',
+            ),
+            models.Index(
+                fields=['user', 'time_minutes'],
+                name='core_recipe_user_time_idx',
+            ),
+            models.Index(
+                fields=['deleted_at'],
+                name='core_recipe_deleted_idx',
+                condition=models.Q(deleted_at__isnull=False),
+            ),
+            models.Index(
+                fields=['user', 'sync_seq'],
+                name='core_recipe_user_sync_idx',
+            ),
+            # Covers the rows of the live recipe list, newest first.
+            models.Index(
+                fields=['user', '-id'],
+                include=['title', 'time_minutes', 'price', 'link'],
+                condition=models.Q(deleted_at__isnull=True),
+                name='core_recipe_user_list_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.title
 
+    def soft_delete(self):
+        """Hide the recipe now and leave removing it to the reaper"""
+        if self.deleted_at is not None:
+            return
+        with transaction.atomic():
+            self.tags.clear()
+            self.ingredients.clear()
+            self.deleted_at = timezone.now()
+            self.save(update_fields=['deleted_at'])
+
+
+class RecipeRelationQuerySet(models.QuerySet):
+    """QuerySet filling in the owning user for recipe m2m rows"""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        missing = {obj.recipe_id for obj in objs if obj.user_id is None}
+        if missing:
+            db = self._db or router.db_for_write(self.model)
+            owners = dict(
+                Recipe.objects.using(db).filter(
+                    id__in=missing,
+                ).values_list('id', 'user_id')
+            )
+            for obj in objs:
+                if obj.user_id is None:
+                    obj.user_id = owners.get(obj.recipe_id)
+        return super().bulk_create(objs, *args, **kwargs)
+
+
+class RecipeTag(models.Model):
+    """Tag assigned to a recipe, stored with the recipe owner"""
+    id = models.AutoField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    # Partitioning replaces the key to the recipe with a composite one
+    # (see core.partitioning), so Django does not manage it.
+    recipe = models.ForeignKey(
+        'Recipe',
+        on_delete=models.CASCADE,
+        db_constraint=False,
+    )
+    tag = models.ForeignKey('Tag', on_delete=models.CASCADE)
+
+    objects = RecipeRelationQuerySet.as_manager()
+
+    class Meta:
+        db_table = 'core_recipe_tags'
+        unique_together = [['recipe', 'tag']]
+        indexes = [
+            # Recipes with a tag, for filtering by tags.
+            models.Index(
+                fields=['tag', 'recipe'],
+                include=['user'],
+                name='core_recipetag_tag_idx',
+            ),
+        ]
+
+
+class RecipeIngredient(models.Model):
+    """Ingredient assigned to a recipe, stored with the recipe owner"""
+    id = models.AutoField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    # Partitioning replaces the key to the recipe with a composite one
+    # (see core.partitioning), so Django does not manage it.
+    recipe = models.ForeignKey(
+        'Recipe',
+        on_delete=models.CASCADE,
+        db_constraint=False,
+    )
+    ingredient = models.ForeignKey('Ingredient', on_delete=models.CASCADE)
+
+    objects = RecipeRelationQuerySet.as_manager()
+
+    class Meta:
+        db_table = 'core_recipe_ingredients'
+        unique_together = [['recipe', 'ingredient']]
+        indexes = [
+            # Recipes with an ingredient, for filtering by ingredients.
+            models.Index(
+                fields=['ingredient', 'recipe'],
+                include=['user'],
+                name='core_recipeing_ingredient_idx',
+            ),
+        ]
+
+
+class UserDashboard(models.Model):
+    """Summary of a user's recipes, kept up to date by core.dashboard"""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='dashboard',
+    )
+    recipe_count = models.PositiveIntegerField(default=0)
+    tag_count = models.PositiveIntegerField(default=0)
+    ingredient_count = models.PositiveIntegerField(default=0)
+
+
+class DashboardUsage(models.Model):
+    """How many of a user's recipes use one tag or ingredient"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    kind = models.CharField(max_length=20)
+    item_id = models.BigIntegerField()
+    name = models.CharField(max_length=255)
+    uses = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = [['user', 'kind', 'item_id']]
+        indexes = [
+            # Covers the most used lists of the dashboard.
+            models.Index(
+                fields=['user', 'kind', '-uses'],
+                name='core_dashusage_top_idx',
+            ),
+        ]
+
+
+class Job(models.Model):
+    """Deferred unit of work run by the `run_workers` command"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=QUEUED,
+    )
+    idempotency_key = models.CharField(
+        max_length=255,
+        null=True,
+        blank=True,
+        unique=True,
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['status', 'run_at'],
+                name='core_job_status_run_at_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk} ({self.status})'
+
+
+class ChangeSequence(models.Model):
+    """Counter numbering a user's changes for incremental sync"""
+    # Signals may write sync rows while a user's data is being cascade
+    # deleted, so these rows do not hold the user row in place; the reaper
+    # removes them with the user.
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        primary_key=True,
+        related_name='change_sequence',
+    )
+    last_seq = models.BigIntegerField(default=0)
+    # Tombstones up to here were compacted away; older cursors must resync.
+    horizon = models.BigIntegerField(default=0)
+    # Moves on whenever the ingredients of the user's recipes change.
+    ingredients_seq = models.BigIntegerField(default=0)
+
+
+class Tombstone(models.Model):
+    """Record of a deleted recipe, tag or ingredient for incremental sync"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+    )
+    kind = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    seq = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'seq'],
+                name='core_tombstone_user_seq_idx',
+            ),
+            models.Index(
+                fields=['deleted_at'],
+                name='core_tombstone_deleted_idx',
+            ),
+        ]
+
+
+class StreamTicket(models.Model):
+    """Single-use key opening an event stream in place of the API token"""
+    key = models.CharField(max_length=64, primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['expires_at'],
+                name='core_streamticket_expires_idx',
+            ),
+        ]
+
+
+NUTRIENTS = (
+    'energy_kcal',
+    'protein_g',
+    'fat_g',
+    'saturated_fat_g',
+    'carbohydrate_g',
+    'sugar_g',
+    'fiber_g',
+    'salt_g',
+)
+
+
+def nutrient_field():
+    return models.FloatField(default=0, validators=[MinValueValidator(0)])
+
+
+class NutrientFields(models.Model):
+    """Amount of each nutrient, in the unit its name ends with"""
+    energy_kcal = nutrient_field()
+    protein_g = nutrient_field()
+    fat_g = nutrient_field()
+    saturated_fat_g = nutrient_field()
+    carbohydrate_g = nutrient_field()
+    sugar_g = nutrient_field()
+    fiber_g = nutrient_field()
+    salt_g = nutrient_field()
+
+    class Meta:
+        abstract = True
+
+
+class NutrientProfile(NutrientFields):
+    """Shared catalog entry ingredients can copy their nutrients from"""
+    name = models.CharField(max_length=255, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
+class IngredientNutrition(NutrientFields):
+    """Nutrients of an ingredient, as much as one recipe uses"""
+    ingredient = models.OneToOneField(
+        Ingredient,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='nutrition',
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    # Catalog entry the values were copied from, kept in step with it.
+    profile = models.ForeignKey(
+        NutrientProfile,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'ingredient'],
+                name='core_ingnutrition_user_idx',
+            ),
+        ]
+
+
+class RecipeNutrition(NutrientFields):
+    """Nutrient totals of a recipe, kept up to date by recipe.nutrition"""
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        primary_key=True,
+        related_name='nutrition',
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class RecipeSignature(models.Model):
+    """MinHash signature of a recipe's text, kept by recipe.duplicates"""
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        primary_key=True,
+        related_name='signature',
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    minhash = models.BinaryField()
+
+
+class SignatureBand(models.Model):
+    """LSH bucket one band of a recipe's signature hashes into"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        related_name='+',
+    )
+    band = models.PositiveSmallIntegerField()
+    bucket = models.BigIntegerField()
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'band', 'bucket'],
+                name='core_sigband_bucket_idx',
+            ),
+        ]
@@ -0,0 +1,14 @@
+"""
+Normalization of user entered tag and ingredient names
+"""
+import unicodedata
+
+
+def clean_name(name):
+    """Return a name in NFKC form with whitespace collapsed"""
+    return ' '.join(unicodedata.normalize('NFKC', name).split())
+
+
+def name_key(name):
+    """Return the key under which names count as duplicates"""
+    return unicodedata.normalize('NFKC', clean_name(name).casefold())
@@ -0,0 +1,47 @@
+"""
+Running per-user maintenance jobs across worker threads
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections
+
+
+def _run_chunk(func, user_ids, using):
+    """Run func for some users on this thread's own connection"""
+    try:
+        return [func(user_id) for user_id in user_ids]
+    finally:
+        connections[using].close()
+
+
+def for_each_user(func, user_ids, workers=4, chunk_size=100,
+                  using='default', log=None):
+    """
+    Call func(user_id) for every user and return the results in order.
+
+    Users are handed out in chunks to a pool of threads, each with its own
+    database connection, so the work runs in parallel on the database.
+    """
+    user_ids = list(user_ids)
+    chunks = [
+        user_ids[start:start + chunk_size]
+        for start in range(0, len(user_ids), chunk_size)
+    ]
+    if workers <= 1:
+        results = ([func(user_id) for user_id in chunk] for chunk in chunks)
+        pool = None
+    else:
+        pool = ThreadPoolExecutor(max_workers=workers)
+        results = pool.map(lambda chunk: _run_chunk(func, chunk, using),
+                           chunks)
+
+    done = []
+    try:
+        for chunk_results in results:
+            done += chunk_results
+            if log:
+                log(f'processed {len(done)}/{len(user_ids)} users')
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return done
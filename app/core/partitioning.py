@@ -0,0 +1,258 @@
+"""
+Online Postgres hash partitioning of recipes and their m2m rows by user.
+
+Each table is rebuilt next to the live one and filled in short batches
+while a trigger records rows changed in the meantime. A final brief lock
+replays those changes and swaps the tables. The primary keys of the
+partitioned tables are (id, user_id), since Postgres requires unique
+constraints to include the partition key; Django keeps treating `id` as
+the primary key, which stays unique through the shared sequence.
+
+Because the recipe primary key is composite once partitioned, other
+tables must reference recipes without database-level foreign keys.
+"""
+from django.db import transaction
+
+
+RECIPE_TABLE = 'core_recipe'
+THROUGH_TABLES = {
+    'core_recipe_tags': ('tag_id', 'core_tag'),
+    'core_recipe_ingredients': ('ingredient_id', 'core_ingredient'),
+}
+USER_TABLE = 'core_user'
+
+LOG_FUNCTION_SQL = """
+    CREATE OR REPLACE FUNCTION core_partition_log() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            EXECUTE format('INSERT INTO %I (row_id) VALUES ($1)', TG_ARGV[0])
+            USING OLD.id;
+        ELSE
+            EXECUTE format('INSERT INTO %I (row_id) VALUES ($1)', TG_ARGV[0])
+            USING NEW.id;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+"""
+
+
+def is_partitioned(connection, table=RECIPE_TABLE):
+    """Return True if the table is a partitioned Postgres table"""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)',
+            [table],
+        )
+        row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def _create_table(cursor, table, partitions):
+    """Create the empty replacement table with keys and indexes"""
+    new = f'{table}_new'
+    if partitions:
+        cursor.execute(
+            f'CREATE TABLE {new} (LIKE {table} INCLUDING DEFAULTS) '
+            f'PARTITION BY HASH (user_id)'
+        )
+        for remainder in range(partitions):
+            cursor.execute(
+                f'CREATE TABLE {table}_p{remainder} PARTITION OF {new} '
+                f'FOR VALUES WITH (MODULUS {partitions}, '
+                f'REMAINDER {remainder})'
+            )
+        key = '(id, user_id)'
+    else:
+        cursor.execute(
+            f'CREATE TABLE {new} (LIKE {table} INCLUDING DEFAULTS)'
+        )
+        key = '(id)'
+
+    cursor.execute(f'ALTER TABLE {new} ADD PRIMARY KEY {key}')
+    cursor.execute(
+        f'ALTER TABLE {new} ADD FOREIGN KEY (user_id) '
+        f'REFERENCES {USER_TABLE} (id) DEFERRABLE INITIALLY DEFERRED'
+    )
+    if table in THROUGH_TABLES:
+        column, _ = THROUGH_TABLES[table]
+        unique = f'recipe_id, {column}, user_id' if partitions else \
+            f'recipe_id, {column}'
+        cursor.execute(f'ALTER TABLE {new} ADD UNIQUE ({unique})')
+
+
+def _copy_indexes(cursor, table):
+    """Recreate the non-unique indexes of a table on its replacement"""
+    cursor.execute(
+        'SELECT i.relname, pg_get_indexdef(i.oid) FROM pg_index x '
+        'JOIN pg_class i ON i.oid = x.indexrelid '
+        'WHERE x.indrelid = %s::regclass AND NOT x.indisunique',
+        [table],
+    )
+    names = []
+    for name, definition in cursor.fetchall():
+        method = definition[definition.index(' USING '):]
+        cursor.execute(f'CREATE INDEX {name}_new ON {table}_new{method}')
+        names.append(name)
+    return names
+
+
+def _start_capture(cursor, table):
+    """Record ids of rows written while the copy runs"""
+    log = f'{table}_changes'
+    cursor.execute(LOG_FUNCTION_SQL)
+    cursor.execute(
+        f'CREATE TABLE {log} (seq bigserial PRIMARY KEY, row_id bigint)'
+    )
+    cursor.execute(
+        f'CREATE TRIGGER {table}_partition_log '
+        f'AFTER INSERT OR UPDATE OR DELETE ON {table} '
+        f"FOR EACH ROW EXECUTE FUNCTION core_partition_log('{log}')"
+    )
+
+
+def _copy_batches(connection, table, batch_size, log):
+    """Copy every row present when capture started in short batches"""
+    new = f'{table}_new'
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT max(id) FROM {table}')
+        last_id = cursor.fetchone()[0] or 0
+    for start in range(0, last_id, batch_size):
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'INSERT INTO {new} SELECT * FROM {table} '
+                    f'WHERE id > %s AND id <= %s',
+                    [start, start + batch_size],
+                )
+        log(f'{table}: copied up to id {min(start + batch_size, last_id)}')
+
+
+def _replay_changes(cursor, table):
+    """Re-copy the rows changed since capture started"""
+    new = f'{table}_new'
+    cursor.execute(
+        f'WITH moved AS (DELETE FROM {table}_changes RETURNING row_id) '
+        f'SELECT DISTINCT row_id FROM moved'
+    )
+    ids = [row[0] for row in cursor.fetchall()]
+    if ids:
+        cursor.execute(f'DELETE FROM {new} WHERE id = ANY(%s)', [ids])
+        cursor.execute(
+            f'INSERT INTO {new} SELECT * FROM {table} WHERE id = ANY(%s)',
+            [ids],
+        )
+    return len(ids)
+
+
+def _swap(cursor, table):
+    """Point the sequence at the new table and swap the names"""
+    new = f'{table}_new'
+    cursor.execute(f'DROP TRIGGER {table}_partition_log ON {table}')
+    cursor.execute(f'DROP TABLE {table}_changes')
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+    sequence = cursor.fetchone()[0]
+    if sequence:
+        cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {new}.id')
+    cursor.execute(f'ALTER TABLE {table} RENAME TO {table}_old')
+    cursor.execute(f'ALTER TABLE {new} RENAME TO {table}')
+
+
+def _add_relation_keys(cursor, table, partitions):
+    """Add unvalidated through-table foreign keys and return their names"""
+    column, target = THROUGH_TABLES[table]
+    if partitions:
+        # Partitioned parents cannot take NOT VALID keys; add per partition.
+        owners = [f'{table}_p{remainder}' for remainder in range(partitions)]
+        recipe_key = '(recipe_id, user_id) REFERENCES ' \
+            f'{RECIPE_TABLE} (id, user_id)'
+    else:
+        owners = [table]
+        recipe_key = f'(recipe_id) REFERENCES {RECIPE_TABLE} (id)'
+
+    added = []
+    for owner in owners:
+        for name, key in (
+            (f'{owner}_recipe_fk', recipe_key),
+            (f'{owner}_{column}_fk', f'({column}) REFERENCES {target} (id)'),
+        ):
+            cursor.execute(
+                f'ALTER TABLE {owner} ADD CONSTRAINT {name} FOREIGN KEY '
+                f'{key} DEFERRABLE INITIALLY DEFERRED NOT VALID'
+            )
+            added.append((owner, name))
+    return added
+
+
+def rebuild_tables(connection, partitions, batch_size=10000, log=print):
+    """
+    Rebuild the recipe tables online, hash partitioned by user_id into
+    `partitions` partitions, or unpartitioned when `partitions` is 0.
+    """
+    tables = [RECIPE_TABLE, *THROUGH_TABLES]
+    alias = connection.alias
+
+    with transaction.atomic(using=alias):
+        with connection.cursor() as cursor:
+            indexes = []
+            for table in tables:
+                _create_table(cursor, table, partitions)
+                indexes += _copy_indexes(cursor, table)
+                _start_capture(cursor, table)
+
+    for table in tables:
+        _copy_batches(connection, table, batch_size, log)
+        with transaction.atomic(using=alias):
+            with connection.cursor() as cursor:
+                count = _replay_changes(cursor, table)
+        log(f'{table}: replayed {count} concurrent changes')
+
+    with transaction.atomic(using=alias):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'LOCK TABLE {", ".join(tables)} IN SHARE ROW EXCLUSIVE MODE'
+            )
+            for table in tables:
+                _replay_changes(cursor, table)
+                _swap(cursor, table)
+            keys = [
+                key
+                for table in THROUGH_TABLES
+                for key in _add_relation_keys(cursor, table, partitions)
+            ]
+    log('swapped tables')
+
+    with transaction.atomic(using=alias):
+        with connection.cursor() as cursor:
+            for table in THROUGH_TABLES:
+                cursor.execute(f'DROP TABLE {table}_old')
+            cursor.execute(f'DROP TABLE {RECIPE_TABLE}_old')
+            for name in indexes:
+                cursor.execute(f'ALTER INDEX {name}_new RENAME TO {name}')
+    log('dropped old tables')
+
+    for table, name in keys:
+        with transaction.atomic(using=alias):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'ALTER TABLE {table} VALIDATE CONSTRAINT {name}'
+                )
+    log('validated foreign keys')
+
+
+def partition_tables(connection, partitions, batch_size=10000, log=print):
+    """Hash partition the recipe tables by user unless already done"""
+    if connection.vendor != 'postgresql' or is_partitioned(connection):
+        return False
+    rebuild_tables(connection, partitions, batch_size, log)
+    return True
+
+
+def unpartition_tables(connection, batch_size=10000, log=print):
+    """Turn partitioned recipe tables back into single tables"""
+    if not is_partitioned(connection):
+        return False
+    rebuild_tables(connection, 0, batch_size, log)
+    return True
@@ -0,0 +1,149 @@
+"""
+Server-side prepared statements for the hottest read queries.
+
+Queries run inside a `prepared(name)` block, for a registered name listed
+in the PREPARED_STATEMENTS setting, are sent to Postgres with PREPARE the
+first time a connection sees their SQL and with EXECUTE and bound
+parameters afterwards, so Postgres parses them once per connection and
+can reuse a cached plan. Everything else, and every other backend, runs
+through the ORM as usual.
+
+Statements live as long as their connection, so they only pay off with
+connections kept open across requests (DB_CONN_MAX_AGE). A migration
+drops the statements of the migrating process's connections; a statement
+another process's migration made stale is dropped, with the rest of its
+connection's statements, the first time it fails.
+"""
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+from django.dispatch import receiver
+
+
+REGISTRY = {}
+
+STALE_PLAN = 'cached plan must not change result type'
+
+_active = ContextVar('prepared_statement', default=None)
+_placeholder = re.compile(r'%[s%]')
+
+
+def register(name, description):
+    """Allow queries to be prepared under name"""
+    REGISTRY[name] = description
+
+
+def enabled(name):
+    return name in settings.PREPARED_STATEMENTS
+
+
+@contextmanager
+def prepared(name):
+    """Prepare the queries run in this block as the named hot statement
+
+    A name of None runs the block unchanged.
+    """
+    if name is not None and name not in REGISTRY:
+        raise ValueError(f'Unknown prepared statement {name!r}')
+    token = _active.set(name if name and enabled(name) else None)
+    try:
+        yield
+    finally:
+        _active.reset(token)
+
+
+def positional(sql):
+    """Turn ORM SQL with %s placeholders into PREPARE's $1, $2, ..."""
+    count = 0
+
+    def replace(match):
+        nonlocal count
+        if match.group() == '%%':
+            return '%'
+        count += 1
+        return f'${count}'
+
+    return _placeholder.sub(replace, sql)
+
+
+def execute_statement(name, params):
+    """Return the EXECUTE SQL of a prepared statement"""
+    if not params:
+        return f'EXECUTE {name}'
+    return f'EXECUTE {name} ({", ".join(["%s"] * len(params))})'
+
+
+def forget(connection):
+    """Drop a connection's statements before it next prepares one"""
+    connection.prepared_statements = None
+
+
+def _statements(execute, context):
+    """Return the connection's statements by SQL, after any pending drop"""
+    connection = context['connection']
+    statements = getattr(connection, 'prepared_statements', None)
+    if statements is None:
+        execute('DEALLOCATE ALL', None, False, context)
+        statements = connection.prepared_statements = {}
+    return statements
+
+
+def _execute(execute, sql, params, many, context):
+    """Execute wrapper running hot queries as prepared statements"""
+    name = _active.get()
+    if name is None or many:
+        return execute(sql, params, many, context)
+
+    statements = _statements(execute, context)
+    statement = statements.get(sql)
+    if statement is None:
+        if len(statements) >= settings.PREPARED_MAX_PER_CONNECTION:
+            return execute(sql, params, many, context)
+        statement = f'{name}_{len(statements)}'
+        execute(
+            f'PREPARE {statement} AS {positional(sql)}',
+            None,
+            False,
+            context,
+        )
+        statements[sql] = statement
+
+    try:
+        return execute(
+            execute_statement(statement, params),
+            params,
+            False,
+            context,
+        )
+    except DatabaseError as exc:
+        connection = context['connection']
+        if STALE_PLAN not in str(exc):
+            raise
+        forget(connection)
+        if connection.in_atomic_block:
+            raise
+        return execute(sql, params, many, context)
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    """Start each Postgres session with no statements and the wrapper"""
+    if connection.vendor != 'postgresql':
+        return
+    connection.prepared_statements = {}
+    if _execute not in connection.execute_wrappers:
+        # Innermost, so other wrappers see the SQL the ORM generated.
+        connection.execute_wrappers.insert(0, _execute)
+
+
+@receiver(post_migrate)
+def migrated(sender, **kwargs):
+    """Drop statements whose tables a migration may have changed"""
+    for connection in connections.all():
+        if hasattr(connection, 'prepared_statements'):
+            forget(connection)
@@ -0,0 +1,197 @@
+"""
+Background removal of soft-deleted users and recipes.
+
+Deleting through the API or admin only flags rows (see User.soft_delete
+and Recipe.soft_delete), which hides them at once. The reaper then
+removes the data in chunks of a bounded size, each in its own short
+transaction, with plain DELETE statements filtered by user so they stay
+within one partition. Image files of each chunk are removed from storage
+once its transaction has committed.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+    RecipeTag,
+    RecipeIngredient,
+    UserDashboard,
+    DashboardUsage,
+    IngredientNutrition,
+    RecipeNutrition,
+    RecipeSignature,
+    SignatureBand,
+    ChangeSequence,
+    Tombstone,
+)
+
+
+def pending(using='default'):
+    """Return how much soft-deleted data is waiting to be reaped"""
+    users = get_user_model().objects.using(using).filter(
+        deleted_at__isnull=False,
+    )
+    return {
+        'users': users.count(),
+        'recipes': Recipe.all_objects.using(using).filter(
+            user__in=users,
+        ).count() + Recipe.all_objects.using(using).filter(
+            deleted_at__isnull=False,
+            user__deleted_at__isnull=True,
+        ).count(),
+    }
+
+
+def remove_files(names, workers=8):
+    """Delete files from the image storage concurrently; return failures"""
+    storage = Recipe._meta.get_field('image').storage
+    failed = []
+
+    def remove(name):
+        try:
+            storage.delete(name)
+        except OSError:
+            failed.append(name)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(remove, names))
+    return failed
+
+
+def _delete(cursor, model, column, ids, user_id=None):
+    """Delete the rows of model whose column is one of ids"""
+    quote = cursor.db.ops.quote_name
+    sql = (
+        f'DELETE FROM {quote(model._meta.db_table)} '
+        f'WHERE {quote(column)} IN ({", ".join(["%s"] * len(ids))})'
+    )
+    params = list(ids)
+    if user_id is not None:
+        sql += ' AND user_id = %s'
+        params.append(user_id)
+    cursor.execute(sql, params)
+
+
+def _delete_recipes(rows, user_id, using):
+    """Delete (id, image) recipe rows and their m2m rows"""
+    ids = [pk for pk, _ in rows]
+    with transaction.atomic(using=using):
+        with connections[using].cursor() as cursor:
+            _delete(cursor, RecipeTag, 'recipe_id', ids, user_id)
+            _delete(cursor, RecipeIngredient, 'recipe_id', ids, user_id)
+            _delete(cursor, RecipeNutrition, 'recipe_id', ids, user_id)
+            _delete(cursor, RecipeSignature, 'recipe_id', ids, user_id)
+            _delete(cursor, SignatureBand, 'recipe_id', ids, user_id)
+            _delete(cursor, Recipe, 'id', ids, user_id)
+    remove_files([image for _, image in rows if image])
+    return len(ids)
+
+
+def _chunks(queryset, fields, chunk_size):
+    """Yield lists of rows until the queryset is empty"""
+    while True:
+        rows = list(queryset.order_by('id').values_list(*fields)[:chunk_size])
+        if not rows:
+            return
+        yield rows
+
+
+def reap_user(user, chunk_size=None, using='default', log=None):
+    """Remove a soft-deleted user and everything they own in chunks"""
+    chunk_size = chunk_size or settings.REAPER_CHUNK_SIZE
+    user_id = user.pk
+    UserDashboard.objects.using(using).filter(user_id=user_id).delete()
+    DashboardUsage.objects.using(using).filter(user_id=user_id).delete()
+
+    recipes = Recipe.all_objects.using(using).filter(user_id=user_id)
+    done = 0
+    for rows in _chunks(recipes, ['id', 'image'], chunk_size):
+        done += _delete_recipes(rows, user_id, using)
+        if log:
+            log(f'user {user_id}: deleted {done} recipes')
+
+    for model, through, column in (
+        (Tag, RecipeTag, 'tag_id'),
+        (Ingredient, RecipeIngredient, 'ingredient_id'),
+    ):
+        items = model.objects.using(using).filter(user_id=user_id)
+        for rows in _chunks(items, ['id'], chunk_size):
+            ids = [pk for pk, in rows]
+            with transaction.atomic(using=using):
+                with connections[using].cursor() as cursor:
+                    _delete(cursor, through, column, ids, user_id)
+                    if model is Ingredient:
+                        _delete(cursor, IngredientNutrition, 'ingredient_id',
+                                ids, user_id)
+                    _delete(cursor, model, 'id', ids, user_id)
+        if log:
+            log(f'user {user_id}: deleted {model._meta.verbose_name_plural}')
+
+    _delete_admin_log(user_id, using)
+    user.delete(using=using)
+    ChangeSequence.objects.using(using).filter(user_id=user_id).delete()
+    Tombstone.objects.using(using).filter(user_id=user_id).delete()
+    if log:
+        log(f'user {user_id}: deleted')
+
+
+def _delete_admin_log(user_id, using):
+    """Remove the user's admin log entries, which reference the user row
+
+    Processes running with the admin disabled can't cascade to its log,
+    though the table exists wherever the admin was ever migrated.
+    """
+    if apps.is_installed('django.contrib.admin'):
+        from django.contrib.admin.models import LogEntry
+        LogEntry.objects.using(using).filter(user_id=user_id)._raw_delete(
+            using,
+        )
+        return
+    connection = connections[using]
+    if 'django_admin_log' in connection.introspection.table_names():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'DELETE FROM django_admin_log WHERE user_id = %s',
+                [user_id],
+            )
+
+
+def reap_recipes(recipe_ids, chunk_size=None, using='default'):
+    """Remove the given recipes if they are still soft-deleted"""
+    chunk_size = chunk_size or settings.REAPER_CHUNK_SIZE
+    recipes = Recipe.all_objects.using(using).filter(
+        id__in=recipe_ids,
+        deleted_at__isnull=False,
+    )
+    reaped = 0
+    for rows in _chunks(recipes, ['id', 'image'], chunk_size):
+        reaped += _delete_recipes(rows, None, using)
+    return reaped
+
+
+def reap(chunk_size=None, using='default', log=None):
+    """Remove all soft-deleted data; return (users, recipes) reaped"""
+    chunk_size = chunk_size or settings.REAPER_CHUNK_SIZE
+    users = get_user_model().objects.using(using).filter(
+        deleted_at__isnull=False,
+    ).order_by('id')
+    reaped_users = 0
+    for user in list(users):
+        reap_user(user, chunk_size, using, log)
+        reaped_users += 1
+
+    recipes = Recipe.all_objects.using(using).filter(
+        deleted_at__isnull=False,
+    )
+    reaped_recipes = 0
+    for rows in _chunks(recipes, ['id', 'image'], chunk_size):
+        reaped_recipes += _delete_recipes(rows, None, using)
+        if log:
+            log(f'deleted {reaped_recipes} recipes')
+    return reaped_users, reaped_recipes
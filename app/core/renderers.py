@@ -0,0 +1,112 @@
+"""
+Fast JSON renderer for the API
+"""
+from functools import lru_cache
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - stdlib fallback
+    orjson = None
+
+
+LINE_SEPARATORS = (
+    (b'\xe2\x80\xa8', b'\\u2028'),
+    (b'\xe2\x80\xa9', b'\\u2029'),
+)
+
+
+@lru_cache(maxsize=None)
+def get_encoder(encoder_class, ensure_ascii, allow_nan, compact):
+    """Return a shared stdlib encoder; encoders are stateless"""
+    return encoder_class(
+        ensure_ascii=ensure_ascii,
+        allow_nan=allow_nan,
+        separators=(',', ':') if compact else (', ', ': '),
+    )
+
+
+def use_orjson():
+    """Return True when the orjson backend is selected and installed"""
+    backend = getattr(settings, 'JSON_BACKEND', 'orjson')
+    return orjson is not None and backend == 'orjson'
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer backed by orjson with a stdlib fallback.
+
+    Output is byte-identical to the stock JSONRenderer: decimals render as
+    numbers and datetimes use DRF's ECMA 262 format.
+    """
+    orjson_options = (
+        orjson.OPT_NON_STR_KEYS
+        | orjson.OPT_PASSTHROUGH_DATETIME
+        | orjson.OPT_SERIALIZE_NUMPY
+    ) if orjson is not None else 0
+
+    @property
+    def encoder(self):
+        """Stdlib encoder reused across requests"""
+        return get_encoder(
+            self.encoder_class,
+            self.ensure_ascii,
+            not self.strict,
+            self.compact,
+        )
+
+    def default(self, obj):
+        """Encode Decimal, datetime and lazy strings the way DRF does"""
+        return self.encoder.default(obj)
+
+    def dumps(self, data):
+        """Serialize data to JSON bytes"""
+        if use_orjson() and self.compact:
+            ret = orjson.dumps(
+                data,
+                default=self.default,
+                option=self.orjson_options,
+            )
+        else:
+            ret = self.encoder.encode(data).encode()
+        for raw, escaped in LINE_SEPARATORS:
+            if raw in ret:
+                ret = ret.replace(raw, escaped)
+        return ret
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Render data into JSON, returning a bytestring"""
+        if data is None:
+            return b''
+
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        return self.dumps(data)
+
+    def render_iter(self, items, chunk_size=500):
+        """Render a list incrementally as a stream of byte chunks"""
+        yield b'['
+        chunk = []
+        first = True
+        for item in items:
+            chunk.append(self.dumps(item))
+            if len(chunk) >= chunk_size:
+                yield (b'' if first else b',') + b','.join(chunk)
+                first = False
+                chunk = []
+        if chunk:
+            yield (b'' if first else b',') + b','.join(chunk)
+        yield b']'
+
+
+def streaming_json_response(items, status=200):
+    """Return a response that renders a large list incrementally"""
+    return StreamingHttpResponse(
+        FastJSONRenderer().render_iter(items),
+        status=status,
+        content_type=FastJSONRenderer.media_type,
+    )
@@ -0,0 +1,42 @@
+"""
+Serializers for the core APIs
+"""
+from django.conf import settings
+from rest_framework import serializers
+
+from core.batch import METHODS
+
+
+class BatchOperationSerializer(serializers.Serializer):
+    """Serializer for one API call inside a batch"""
+    method = serializers.ChoiceField(choices=METHODS)
+    path = serializers.CharField(max_length=2000)
+    body = serializers.JSONField(required=False)
+
+
+class BatchRequestSerializer(serializers.Serializer):
+    """Serializer for a batch of API calls"""
+    requests = BatchOperationSerializer(many=True, allow_empty=False)
+    atomic = serializers.BooleanField(default=False)
+
+    def validate_requests(self, value):
+        if len(value) > settings.BATCH_MAX_REQUESTS:
+            raise serializers.ValidationError(
+                f'At most {settings.BATCH_MAX_REQUESTS} requests per batch.'
+            )
+        return value
+
+
+class BatchResultSerializer(serializers.Serializer):
+    """Serializer for the response to one API call of a batch"""
+    status = serializers.IntegerField()
+    body = serializers.JSONField(allow_null=True)
+    # Set for bodies other than JSON or text, such as images.
+    encoding = serializers.ChoiceField(choices=['base64'], required=False)
+    content_type = serializers.CharField(required=False)
+
+
+class BatchResponseSerializer(serializers.Serializer):
+    """Serializer for the responses to a batch of API calls"""
+    responses = BatchResultSerializer(many=True)
+    rolled_back = serializers.BooleanField()
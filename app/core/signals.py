@@ -0,0 +1,130 @@
+"""
+Signal handlers keeping user dashboards in step with recipe data, and
+queueing removal of soft-deleted data
+"""
+from collections import Counter
+
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+
+from core import dashboard, jobs
+from core.models import (
+    User,
+    Recipe,
+    Tag,
+    Ingredient,
+    RecipeTag,
+    RecipeIngredient,
+)
+
+
+RELATIONS = {
+    RecipeTag: (Tag, 'tag_id'),
+    RecipeIngredient: (Ingredient, 'ingredient_id'),
+}
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def item_saved(sender, instance, created, using, raw=False,
+               update_fields=None, **kwargs):
+    """Count new items and keep renamed tags and ingredients current"""
+    if raw:
+        return
+    if created:
+        dashboard.adjust_count(sender, instance.user_id, 1, using)
+    elif sender in dashboard.USAGE_KINDS:
+        dashboard.rename_item(sender, instance, using)
+    elif update_fields and 'deleted_at' in update_fields:
+        # Recipe.soft_delete() clears the recipe's m2m rows first.
+        dashboard.adjust_count(sender, instance.user_id, -1, using)
+        jobs.enqueue(
+            'reap_recipes',
+            {'recipe_ids': [instance.pk]},
+            key=f'reap-recipe:{instance.pk}',
+            using=using,
+        )
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, using, raw=False, update_fields=None,
+               **kwargs):
+    """Queue removal of a soft-deleted user's data"""
+    if raw or not update_fields or 'deleted_at' not in update_fields:
+        return
+    jobs.enqueue(
+        'reap_user',
+        {'user_id': instance.pk},
+        key=f'reap-user:{instance.pk}',
+        using=using,
+    )
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting(sender, instance, using, **kwargs):
+    """Remember what a recipe uses before its m2m rows are deleted"""
+    instance._dashboard_usage = {
+        model: list(
+            through.objects.using(using).filter(
+                recipe_id=instance.pk,
+            ).values_list(column, flat=True)
+        )
+        for through, (model, column) in RELATIONS.items()
+    }
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, using, **kwargs):
+    """Uncount a deleted recipe and the items it used"""
+    if instance.deleted_at is None:
+        dashboard.adjust_count(Recipe, instance.user_id, -1, using)
+    usage = instance.__dict__.pop('_dashboard_usage', {})
+    for model, item_ids in usage.items():
+        if item_ids:
+            deltas = {pk: -uses for pk, uses in Counter(item_ids).items()}
+            dashboard.adjust_usage(model, instance.user_id, deltas, using)
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def item_deleted(sender, instance, using, **kwargs):
+    """Uncount a deleted tag or ingredient"""
+    dashboard.remove_item(sender, instance, using)
+
+
+@receiver(m2m_changed, sender=RecipeTag)
+@receiver(m2m_changed, sender=RecipeIngredient)
+def relations_changed(sender, instance, action, reverse, pk_set, using,
+                      **kwargs):
+    """Track how many recipes use each tag and ingredient"""
+    model, column = RELATIONS[sender]
+    own, other = (column, 'recipe_id') if reverse else ('recipe_id', column)
+
+    if action in ('pre_remove', 'pre_clear'):
+        # pk_set may name rows that do not exist, so look up the real ones.
+        rows = sender.objects.using(using).filter(**{own: instance.pk})
+        if action == 'pre_remove':
+            rows = rows.filter(**{f'{other}__in': pk_set})
+        instance._dashboard_removed = list(
+            rows.values_list(column, flat=True)
+        )
+        return
+
+    if action == 'post_add':
+        sign = 1
+        item_ids = [instance.pk] * len(pk_set) if reverse else list(pk_set)
+    elif action in ('post_remove', 'post_clear'):
+        sign = -1
+        item_ids = instance.__dict__.pop('_dashboard_removed', [])
+    else:
+        return
+
+    if item_ids:
+        deltas = {pk: sign * uses for pk, uses in Counter(item_ids).items()}
+        dashboard.adjust_usage(model, instance.user_id, deltas, using)
@@ -0,0 +1,107 @@
+"""
+Process start-up: lazily loaded views and admin, and the uWSGI preload.
+
+Processes that never serve the schema or the admin (job workers, the
+reaper, the events server, management commands) skip importing them.
+uWSGI loads the app once in its master and forks the workers from it, so
+`preload` imports everything a request may need there instead, and
+freezes the garbage collector so workers share those pages copy-on-write
+rather than each touching, and so copying, them on collection.
+"""
+import gc
+import re
+from collections import defaultdict
+from importlib import import_module
+
+from django.conf import settings
+from django.db import connections
+from django.urls import get_resolver
+from django.utils.functional import cached_property
+from django.utils.module_loading import import_string
+
+
+IMPORT_TIME = re.compile(
+    r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$'
+)
+
+
+class LazyView:
+    """View importing its class-based view on first request
+
+    Schema generation reads the class through `cls` and `initkwargs`,
+    which import it too.
+    """
+
+    csrf_exempt = True
+
+    def __init__(self, dotted_path, **initkwargs):
+        self.dotted_path = dotted_path
+        self.kwargs = initkwargs
+
+    @cached_property
+    def view(self):
+        return import_string(self.dotted_path).as_view(**self.kwargs)
+
+    def __call__(self, request, *args, **kwargs):
+        return self.view(request, *args, **kwargs)
+
+    def __getattr__(self, name):
+        if name in ('cls', 'initkwargs'):
+            return getattr(self.view, name)
+        raise AttributeError(name)
+
+
+class LazyAdminURLConf:
+    """URLconf for the admin site, discovering admin modules on first use"""
+
+    @cached_property
+    def urlpatterns(self):
+        from django.contrib import admin
+
+        admin.autodiscover()
+        return admin.site.get_urls()
+
+
+def lazy_admin_urls():
+    """Admin URLs to pass to path() in place of admin.site.urls"""
+    return LazyAdminURLConf(), 'admin', 'admin'
+
+
+def preload():
+    """Import and build what requests use, before workers are forked"""
+    resolver = get_resolver()
+    # Populating reverse() data loads every URLconf, the admin included.
+    resolver.reverse_dict
+    _load_lazy_views(resolver.url_patterns)
+    for module in settings.PRELOAD_MODULES:
+        import_module(module)
+    # Workers must open their own database connections.
+    connections.close_all()
+    gc.collect()
+    gc.freeze()
+
+
+def _load_lazy_views(patterns):
+    for pattern in patterns:
+        if hasattr(pattern, 'url_patterns'):
+            _load_lazy_views(pattern.url_patterns)
+        elif isinstance(pattern.callback, LazyView):
+            pattern.callback.view
+
+
+def parse_import_times(output):
+    """Sum `python -X importtime` output per top-level package
+
+    Returns (total microseconds, {package: microseconds}) from the self
+    time of every imported module.
+    """
+    total = 0
+    packages = defaultdict(int)
+    for line in output.splitlines():
+        match = IMPORT_TIME.match(line)
+        if match is None:
+            continue
+        own = int(match.group(1))
+        total += own
+        packages[match.group(4).split('.')[0]] += own
+    return total, dict(packages)
@@ -0,0 +1,101 @@
+"""
+Static files storage with content-hashed names and precompressed copies.
+
+collectstatic writes every file under a name carrying a hash of its
+content, so the proxy can let clients cache them for good, and then
+writes a gzip copy (and a brotli one, when the brotli package is
+installed) next to each compressible file for nginx's `gzip_static` to
+send as is. Files are compressed on a thread pool, as zlib and brotli
+release the GIL, and files whose copies are already up to date are
+skipped on later runs.
+"""
+import gzip
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE = (
+    '.css', '.js', '.map', '.svg', '.json', '.html', '.txt', '.xml',
+    '.ico', '.ttf', '.otf', '.eot',
+)
+# Files smaller than this fit in a packet either way.
+MIN_SIZE = 256
+
+
+def _gzip(data):
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _brotli(data):
+    return brotli.compress(data, quality=11)
+
+
+def compressors():
+    """Return (suffix, compress) pairs for the available encodings"""
+    found = [('.gz', _gzip)]
+    if brotli is not None:
+        found.append(('.br', _brotli))
+    return found
+
+
+def compress_file(path, encodings=None):
+    """Write compressed copies of a file, returning the suffixes written
+
+    A copy is only kept when it is smaller than the file.
+    """
+    size = os.path.getsize(path)
+    if size < MIN_SIZE:
+        return []
+    modified = os.path.getmtime(path)
+    data = None
+    written = []
+    for suffix, compress in encodings or compressors():
+        target = path + suffix
+        if (os.path.exists(target)
+                and os.path.getmtime(target) >= modified):
+            continue
+        if data is None:
+            with open(path, 'rb') as source:
+                data = source.read()
+        compressed = compress(data)
+        if len(compressed) >= size:
+            continue
+        with open(target, 'wb') as out:
+            out.write(compressed)
+        written.append(suffix)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Hashed static files with gzip and brotli copies for the proxy"""
+
+    def stored_name(self, name):
+        # Until collectstatic writes a manifest (development, tests) the
+        # files are served under their own names.
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+
+        names = set(paths) | set(self.hashed_files.values())
+        targets = [
+            self.path(name) for name in sorted(names)
+            if name.endswith(COMPRESSIBLE) and self.exists(name)
+        ]
+        with ThreadPoolExecutor(
+            max_workers=settings.STATIC_COMPRESS_WORKERS,
+        ) as pool:
+            # Exhaust the results so failures are raised here.
+            list(pool.map(compress_file, targets))
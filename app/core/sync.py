@@ -0,0 +1,266 @@
+"""
+Per-user change feed for incremental sync.
+
+Every save of a recipe, tag or ingredient stamps the row with the next
+number of its owner's change sequence, and every delete leaves a small
+tombstone numbered the same way. Numbers are handed out by updating the
+user's ChangeSequence row, which stays locked until the transaction
+commits, so one user's changes commit in the order of their numbers and
+a client holding cursor N has seen everything numbered up to N.
+
+Tombstones older than SYNC_TOMBSTONE_RETENTION are compacted away and
+the user's horizon raised past them; clients whose cursor is older than
+the horizon must sync from scratch. Writes that bypass signals, such as
+bulk_create or queryset updates, must call `touch` or `record_deletes`.
+"""
+from datetime import timedelta
+from itertools import chain
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max, Value
+from django.db.models.functions import Greatest
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.models import (
+    ChangeSequence,
+    Recipe,
+    Tag,
+    Ingredient,
+    RecipeTag,
+    RecipeIngredient,
+    Tombstone,
+)
+
+
+KINDS = {
+    Recipe: 'recipe',
+    Tag: 'tag',
+    Ingredient: 'ingredient',
+}
+RELATIONS = {
+    RecipeTag: 'tag_id',
+    RecipeIngredient: 'ingredient_id',
+}
+ITEM_RELATIONS = {
+    Tag: RecipeTag,
+    Ingredient: RecipeIngredient,
+}
+
+
+class ResyncRequired(Exception):
+    """The cursor is older than the tombstones still kept"""
+
+
+def next_seq(user_id, count=1, using='default'):
+    """Reserve count change numbers for a user; return the last one"""
+    sequences = ChangeSequence.objects.using(using).filter(user_id=user_id)
+    with transaction.atomic(using=using):
+        if not sequences.update(last_seq=F('last_seq') + count):
+            try:
+                with transaction.atomic(using=using):
+                    ChangeSequence.objects.using(using).create(
+                        user_id=user_id,
+                        last_seq=count,
+                    )
+                return count
+            except IntegrityError:
+                sequences.update(last_seq=F('last_seq') + count)
+        return sequences.values_list('last_seq', flat=True).get()
+
+
+def touch(model, user_id, ids, using='default'):
+    """Mark rows of a user as changed"""
+    ids = list(ids)
+    if not ids:
+        return
+    # Keep the sequence row locked until the stamped rows commit.
+    with transaction.atomic(using=using):
+        model._base_manager.using(using).filter(
+            user_id=user_id,
+            id__in=ids,
+        ).update(sync_seq=next_seq(user_id, using=using))
+
+
+def record_deletes(model, user_id, ids, using='default'):
+    """Leave tombstones for deleted rows of a user"""
+    ids = list(ids)
+    if not ids:
+        return
+    with transaction.atomic(using=using):
+        seq = next_seq(user_id, using=using)
+        Tombstone.objects.using(using).bulk_create([
+            Tombstone(
+                user_id=user_id,
+                kind=KINDS[model],
+                object_id=pk,
+                seq=seq,
+            )
+            for pk in ids
+        ])
+
+
+def _sources(user_id, since, using):
+    """Return (kind, queryset, seq field) for everything with changes"""
+    sources = [
+        (kind, model.objects.using(using).filter(
+            user_id=user_id,
+            sync_seq__gt=since,
+        ), 'sync_seq')
+        for model, kind in KINDS.items()
+    ]
+    if since:
+        # A first sync only needs the rows that exist.
+        sources.append(('deleted', Tombstone.objects.using(using).filter(
+            user_id=user_id,
+            seq__gt=since,
+        ), 'seq'))
+    return sources
+
+
+def changes(user_id, since=0, limit=500, using='default'):
+    """Return a page of a user's changes after the cursor since
+
+    The page holds up to about limit rows: changes sharing a number are
+    never split across pages, so a page may hold a few more.
+    """
+    horizon = ChangeSequence.objects.using(using).filter(
+        user_id=user_id,
+    ).values_list('horizon', flat=True).first() or 0
+    if since and since < horizon:
+        raise ResyncRequired(horizon)
+
+    sources = _sources(user_id, since, using)
+    seqs = sorted(chain.from_iterable(
+        queryset.order_by(field).values_list(field, flat=True)[:limit + 1]
+        for _, queryset, field in sources
+    ))
+    upper = seqs[limit - 1] if len(seqs) > limit else None
+
+    page = {'recipes': [], 'tags': [], 'ingredients': [], 'deleted': []}
+    cursor = since
+    for kind, queryset, field in sources:
+        if upper is not None:
+            queryset = queryset.filter(**{f'{field}__lte': upper})
+        if kind == 'recipe':
+            queryset = queryset.select_related('nutrition').prefetch_related(
+                'tags',
+                'ingredients',
+            )
+        rows = list(queryset.order_by(field, 'id'))
+        if rows:
+            cursor = max(cursor, getattr(rows[-1], field))
+        if kind == 'deleted':
+            page['deleted'] = [
+                {'type': row.kind, 'id': row.object_id} for row in rows
+            ]
+        else:
+            page[f'{kind}s'] = rows
+
+    page['has_more'] = upper is not None and any(
+        queryset.filter(**{f'{field}__gt': upper}).exists()
+        for _, queryset, field in sources
+    )
+    page['cursor'] = cursor
+    return page
+
+
+def compact_tombstones(retention=None, using='default'):
+    """Delete tombstones older than retention seconds; return how many"""
+    retention = (
+        settings.SYNC_TOMBSTONE_RETENTION if retention is None
+        else retention
+    )
+    cutoff = timezone.now() - timedelta(seconds=retention)
+    tombstones = Tombstone.objects.using(using)
+    horizons = tombstones.filter(deleted_at__lt=cutoff).order_by().values(
+        'user_id',
+    ).annotate(seq=Max('seq')).values_list('user_id', 'seq')
+
+    deleted = 0
+    for user_id, seq in horizons:
+        with transaction.atomic(using=using):
+            ChangeSequence.objects.using(using).filter(
+                user_id=user_id,
+            ).update(horizon=Greatest(F('horizon'), Value(seq)))
+            deleted += tombstones.filter(
+                user_id=user_id,
+                seq__lte=seq,
+            ).delete()[0]
+    return deleted
+
+
+@receiver(pre_save, sender=Recipe)
+@receiver(pre_save, sender=Tag)
+@receiver(pre_save, sender=Ingredient)
+def item_saving(sender, instance, using, raw=False, **kwargs):
+    """Number the change being saved"""
+    if not raw:
+        instance.sync_seq = next_seq(instance.user_id, using=using)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, using, raw=False, update_fields=None,
+                 **kwargs):
+    """Leave a tombstone for a soft-deleted recipe"""
+    if raw or not update_fields or 'deleted_at' not in update_fields:
+        return
+    Tombstone.objects.using(using).create(
+        user_id=instance.user_id,
+        kind=KINDS[Recipe],
+        object_id=instance.pk,
+        seq=instance.sync_seq,
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def item_deleted(sender, instance, using, **kwargs):
+    """Leave a tombstone for a deleted row"""
+    if getattr(instance, 'deleted_at', None) is None:
+        record_deletes(sender, instance.user_id, [instance.pk], using)
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def item_deleting(sender, instance, using, **kwargs):
+    """Mark recipes losing a tag or ingredient as changed"""
+    through = ITEM_RELATIONS[sender]
+    touch(
+        Recipe,
+        instance.user_id,
+        through.objects.using(using).filter(**{
+            RELATIONS[through]: instance.pk,
+        }).values_list('recipe_id', flat=True),
+        using,
+    )
+
+
+@receiver(m2m_changed, sender=RecipeTag)
+@receiver(m2m_changed, sender=RecipeIngredient)
+def relations_changed(sender, instance, action, reverse, pk_set, using,
+                      **kwargs):
+    """Mark recipes whose tags or ingredients changed"""
+    if action == 'pre_clear' and reverse:
+        instance._sync_cleared = list(
+            sender.objects.using(using).filter(**{
+                RELATIONS[sender]: instance.pk,
+            }).values_list('recipe_id', flat=True)
+        )
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            recipe_ids = [instance.pk]
+        elif action == 'post_clear':
+            recipe_ids = instance.__dict__.pop('_sync_cleared', [])
+        else:
+            recipe_ids = pk_set
+        touch(Recipe, instance.user_id, recipe_ids, using)
@@ -0,0 +1,32 @@
+"""
+Job queue tasks for removing deleted data
+"""
+from django.contrib.auth import get_user_model
+
+from core import reaper
+from core.jobs import task
+
+
+@task('reap_user')
+def reap_user(user_id):
+    """Remove a soft-deleted user and their data"""
+    user = get_user_model().objects.filter(
+        pk=user_id,
+        deleted_at__isnull=False,
+    ).first()
+    if user is not None:
+        reaper.reap_user(user)
+
+
+@task('reap_recipes')
+def reap_recipes(recipe_ids):
+    """Remove soft-deleted recipes"""
+    reaper.reap_recipes(recipe_ids)
+
+
+@task('remove_files')
+def remove_files(names):
+    """Delete files no longer referenced, retrying any that fail"""
+    failed = reaper.remove_files(names)
+    if failed:
+        raise OSError(f'Could not delete {", ".join(failed)}')
@@ -1,11 +1,19 @@
 """
 Test admin setup
 """
+from decimal import Decimal
+from unittest.mock import patch
+
 from django.test import TestCase
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import Client
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from core import models
+from core.admin import EstimatedCountPaginator, RecipeAdmin
+
 
 class AdminSiteTests(TestCase):
     """Tests for Django admin"""
@@ -47,3 +55,168 @@ class AdminSiteTests(TestCase):
         res = self.client.get(url)
 
         self.assertEqual(res.status_code, 200)
+
+
+def create_recipe(user, **params):
+    defaults = {
+        'title': 'Sample recipe',
+        'time_minutes': 10,
+        'price': Decimal('5.00'),
+    }
+    defaults.update(params)
+    return models.Recipe.objects.create(user=user, **defaults)
+
+
+class ScalableAdminTests(TestCase):
+    """Tests for the admin of recipes, tags and ingredients"""
+
+    def setUp(self):
+        self.client = Client()
+        admin_user = get_user_model().objects.create_superuser(
+            email='admin@example.com',
+            password='testpass123',
+        )
+        self.client.force_login(admin_user)
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+        self.recipes_url = reverse('admin:core_recipe_changelist')
+
+    def _queries(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(url, params)
+        self.assertEqual(res.status_code, 200)
+        return len(queries)
+
+    def test_recipe_list_queries_constant(self):
+        """Test listing recipes does not query once per owner"""
+        create_recipe(self.user)
+        few = self._queries(self.recipes_url)
+        for i in range(5):
+            other = get_user_model().objects.create_user(
+                email=f'user{i}@example.com',
+                password='testpass123',
+            )
+            create_recipe(other)
+
+        self.assertEqual(self._queries(self.recipes_url), few)
+
+    def test_recipe_change_page(self):
+        """Test a recipe's change page renders"""
+        recipe = create_recipe(self.user)
+
+        url = reverse('admin:core_recipe_change', args=[recipe.id])
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, 200)
+
+    def test_search_by_email_and_text(self):
+        """Test searching recipes within one owner's rows"""
+        other = get_user_model().objects.create_user(
+            email='other@example.com',
+            password='testpass123',
+        )
+        create_recipe(self.user, title='Lentil soup')
+        create_recipe(self.user, title='Apple pie')
+        create_recipe(other, title='Onion soup')
+
+        res = self.client.get(
+            self.recipes_url,
+            {'q': 'user@example.com soup'},
+        )
+
+        self.assertContains(res, 'Lentil soup')
+        self.assertNotContains(res, 'Apple pie')
+        self.assertNotContains(res, 'Onion soup')
+
+    def test_search_text_needs_owner(self):
+        """Test text alone does not scan every user's recipes"""
+        create_recipe(self.user, title='Lentil soup')
+
+        res = self.client.get(self.recipes_url, {'q': 'soup'})
+
+        self.assertNotContains(res, 'Lentil soup')
+        self.assertContains(res, 'to search by text')
+
+    def test_search_text_without_lookups(self):
+        """Test text is not searched when the admin names no lookups"""
+        create_recipe(self.user, title='Lentil soup')
+
+        with patch.object(RecipeAdmin, 'text_search_fields', ()):
+            res = self.client.get(
+                self.recipes_url,
+                {'q': 'user@example.com soup'},
+            )
+
+        self.assertNotContains(res, 'Lentil soup')
+        self.assertContains(res, 'cannot be searched by text')
+
+    def test_search_tags_by_name(self):
+        """Test tags are searched by normalized name"""
+        models.Tag.objects.create(user=self.user, name='Vegan')
+        models.Tag.objects.create(user=self.user, name='Dessert')
+
+        res = self.client.get(
+            reverse('admin:core_tag_changelist'),
+            {'q': 'user@example.com VEG'},
+        )
+
+        self.assertContains(res, 'Vegan')
+        self.assertNotContains(res, 'Dessert')
+
+    def test_estimated_count_used_when_large(self):
+        """Test the paginator trusts large estimates instead of counting"""
+        create_recipe(self.user)
+        queryset = models.Recipe.objects.order_by('id')
+
+        with patch('core.admin.estimated_count', return_value=5_000_000):
+            paginator = EstimatedCountPaginator(queryset, 100)
+            self.assertEqual(paginator.count, 5_000_000)
+
+        with patch('core.admin.estimated_count', return_value=10):
+            paginator = EstimatedCountPaginator(queryset, 100)
+            self.assertEqual(paginator.count, 1)
+
+
+class NutrientProfileAdminTests(TestCase):
+    """Tests for the admin of the nutrient catalog"""
+
+    def setUp(self):
+        self.client = Client()
+        admin_user = get_user_model().objects.create_superuser(
+            email='admin@example.com',
+            password='testpass123',
+        )
+        self.client.force_login(admin_user)
+
+    def test_catalog_list(self):
+        """Test catalog entries are listed and searched by name"""
+        models.NutrientProfile.objects.create(name='Lentils', protein_g=9)
+        models.NutrientProfile.objects.create(name='Rice')
+
+        res = self.client.get(
+            reverse('admin:core_nutrientprofile_changelist'),
+            {'q': 'lent'},
+        )
+
+        self.assertContains(res, 'Lentils')
+        self.assertNotContains(res, 'Rice')
+
+    def test_catalog_add(self):
+        """Test catalog entries can be added"""
+        url = reverse('admin:core_nutrientprofile_add')
+
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, 200)
+
+        res = self.client.post(url, {
+            'name': 'Oats',
+            **{name: 0 for name in models.NUTRIENTS},
+            'energy_kcal': 380,
+        })
+        self.assertEqual(res.status_code, 302)
+        self.assertEqual(
+            models.NutrientProfile.objects.get(name='Oats').energy_kcal,
+            380,
+        )
@@ -0,0 +1,226 @@
+"""
+Tests for the batch API
+"""
+import base64
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.batch import _groups
+from core.models import Recipe, Tag
+
+
+BATCH_URL = reverse('batch')
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+ME_URL = reverse('user:me')
+
+RECIPE = {'title': 'Soup', 'time_minutes': 10, 'price': '2.50'}
+
+
+class PublicBatchApiTests(TestCase):
+    """Test unauthenticated API requests"""
+
+    def test_auth_required(self):
+        """Test auth is required to send a batch"""
+        res = APIClient().post(
+            BATCH_URL,
+            {'requests': [{'method': 'GET', 'path': ME_URL}]},
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(BATCH_WORKERS=1)
+class PrivateBatchApiTests(TestCase):
+    """Test authenticated API requests"""
+
+    def setUp(self):
+        caches['throttle'].clear()
+        self.addCleanup(caches['throttle'].clear)
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def batch(self, operations, atomic=False):
+        res = self.client.post(
+            BATCH_URL,
+            {'requests': operations, 'atomic': atomic},
+            format='json',
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def test_reads(self):
+        """Test several reads come back in one response, in order"""
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        data = self.batch([
+            {'method': 'GET', 'path': ME_URL},
+            {'method': 'GET', 'path': TAGS_URL},
+            {'method': 'GET', 'path': f'{RECIPES_URL}?max_price=5'},
+        ])
+
+        statuses = [item['status'] for item in data['responses']]
+        self.assertEqual(statuses, [200, 200, 200])
+        self.assertEqual(data['responses'][0]['body']['email'],
+                         'user@example.com')
+        self.assertEqual(data['responses'][1]['body'][0]['name'], 'Vegan')
+        self.assertEqual(data['responses'][2]['body'], [])
+        self.assertFalse(data['rolled_back'])
+
+    def test_write_then_read(self):
+        """Test reads after a write in the batch see the write"""
+        data = self.batch([
+            {'method': 'POST', 'path': RECIPES_URL, 'body': RECIPE},
+            {'method': 'GET', 'path': RECIPES_URL},
+        ])
+
+        self.assertEqual(data['responses'][0]['status'], 201)
+        self.assertEqual(data['responses'][1]['body'][0]['title'], 'Soup')
+
+    def test_atomic_batch_rolls_back(self):
+        """Test a failing call undoes the earlier calls of an atomic batch"""
+        data = self.batch([
+            {'method': 'POST', 'path': RECIPES_URL, 'body': RECIPE},
+            {
+                'method': 'PATCH',
+                'path': reverse('recipe:recipe-detail', args=[999999]),
+                'body': {'title': 'Missing'},
+            },
+            {'method': 'GET', 'path': ME_URL},
+        ], atomic=True)
+
+        self.assertTrue(data['rolled_back'])
+        self.assertEqual(
+            [item['status'] for item in data['responses']],
+            [201, 404],
+        )
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
+
+    def test_non_atomic_failure_keeps_other_calls(self):
+        """Test a failing call leaves the rest of a plain batch alone"""
+        data = self.batch([
+            {'method': 'POST', 'path': RECIPES_URL, 'body': {}},
+            {'method': 'POST', 'path': RECIPES_URL, 'body': RECIPE},
+        ])
+
+        self.assertEqual(
+            [item['status'] for item in data['responses']],
+            [400, 201],
+        )
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 1)
+
+    def test_rejected_paths(self):
+        """Test non-API paths, nested batches and unknown paths fail"""
+        data = self.batch([
+            {'method': 'GET', 'path': '/admin/'},
+            {'method': 'POST', 'path': BATCH_URL, 'body': {}},
+            {'method': 'GET', 'path': '/api/nothing/'},
+        ])
+
+        self.assertEqual(
+            [item['status'] for item in data['responses']],
+            [400, 400, 404],
+        )
+
+    def test_binary_body_encoded(self):
+        """Test images come back base64 encoded, not decoded as text"""
+        image = b'\xff\xd8\xff\xe0 jpeg'
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root):
+            recipe = Recipe.objects.create(user=self.user, **RECIPE)
+            recipe.image.save('soup.jpg', ContentFile(image))
+            fetch = [{'method': 'GET', 'path': recipe.image.url}]
+
+            with override_settings(MEDIA_ACCEL_PREFIX=''):
+                data = self.batch(fetch)
+            self.assertEqual(data['responses'][0], {
+                'status': 200,
+                'body': base64.b64encode(image).decode(),
+                'encoding': 'base64',
+                'content_type': 'image/jpeg',
+            })
+
+            with override_settings(MEDIA_ACCEL_PREFIX='/protected-media/'):
+                data = self.batch(fetch)
+            self.assertEqual(data['responses'][0]['status'], 400)
+
+    @override_settings(BATCH_MAX_REQUESTS=2)
+    def test_too_many_requests(self):
+        """Test batches above the limit are refused"""
+        res = self.client.post(
+            BATCH_URL,
+            {'requests': [{'method': 'GET', 'path': ME_URL}] * 30},
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class GroupingTests(TestCase):
+    """Test how batches are split for concurrent reads"""
+
+    def test_reads_grouped_between_writes(self):
+        """Test consecutive reads share a group and writes stand alone"""
+        methods = ['GET', 'GET', 'POST', 'GET', 'DELETE', 'DELETE', 'GET']
+        operations = [{'method': m, 'path': '/api/'} for m in methods]
+
+        groups = [[op['method'] for op in group]
+                  for group in _groups(operations)]
+
+        self.assertEqual(groups, [
+            ['GET', 'GET'], ['POST'], ['GET'], ['DELETE'], ['DELETE'],
+            ['GET'],
+        ])
+
+
+@override_settings(BATCH_WORKERS=4)
+class ConcurrentBatchApiTests(TransactionTestCase):
+    """Test reads spread over the thread pool"""
+
+    def setUp(self):
+        caches['throttle'].clear()
+        self.addCleanup(caches['throttle'].clear)
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        Tag.objects.create(user=self.user, name='Vegan')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_concurrent_reads(self):
+        """Test concurrent reads return every response in order"""
+        operations = [
+            {'method': 'GET', 'path': TAGS_URL},
+            {'method': 'GET', 'path': ME_URL},
+        ] * 3
+
+        res = self.client.post(
+            BATCH_URL,
+            {'requests': operations},
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        bodies = [item['body'] for item in res.data['responses']]
+        self.assertEqual(
+            [body[0]['name'] for body in bodies[0::2]],
+            ['Vegan'] * 3,
+        )
+        self.assertEqual(
+            [body['email'] for body in bodies[1::2]],
+            ['user@example.com'] * 3,
+        )
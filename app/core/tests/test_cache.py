@@ -0,0 +1,64 @@
+"""
+Tests for the uWSGI shared cache backend
+"""
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from core import cache as uwsgi_cache
+
+
+def fake_uwsgi():
+    """Return a stand-in for the uwsgi module's cache API"""
+    store = {}
+    return SimpleNamespace(
+        cache_get=lambda key, name: store.get((name, key)),
+        cache_update=lambda key, value, ttl, name: store.__setitem__(
+            (name, key), value,
+        ) or True,
+        cache_del=lambda key, name: store.pop((name, key), None) is not None,
+        cache_clear=lambda name: store.clear(),
+        lock=lambda num: None,
+        unlock=lambda num: None,
+    )
+
+
+class UwsgiCacheTests(SimpleTestCase):
+    """Test the cache backend on the uWSGI cache API"""
+
+    def setUp(self):
+        patcher = patch.object(uwsgi_cache, 'uwsgi', fake_uwsgi())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = uwsgi_cache.UwsgiCache('default', {})
+
+    def test_set_get_delete(self):
+        """Test values round-trip through the shared store"""
+        self.cache.set('bucket', (5.0, 100.0))
+
+        self.assertEqual(self.cache.get('bucket'), (5.0, 100.0))
+        self.assertTrue(self.cache.delete('bucket'))
+        self.assertIsNone(self.cache.get('bucket'))
+
+    def test_add_existing(self):
+        """Test add does not overwrite an existing key"""
+        self.assertTrue(self.cache.add('key', 1))
+        self.assertFalse(self.cache.add('key', 2))
+        self.assertEqual(self.cache.get('key'), 1)
+
+    def test_expired_value(self):
+        """Test expired values are not returned"""
+        self.cache.set('key', 1, timeout=0)
+
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_fallback_without_uwsgi(self):
+        """Test the backend works as a local cache outside uWSGI"""
+        with patch.object(uwsgi_cache, 'uwsgi', None):
+            local = uwsgi_cache.UwsgiCache('default', {})
+            local.set('key', 'value')
+
+            self.assertEqual(local.get('key'), 'value')
+            with local.lock():
+                self.assertTrue(local.add('other', 1))
@@ -0,0 +1,226 @@
+"""
+Tests for incrementally maintained user dashboards
+"""
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from core import dashboard
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+    UserDashboard,
+    DashboardUsage,
+)
+
+
+def create_user(email='user@example.com'):
+    return get_user_model().objects.create_user(email, 'testpass123')
+
+
+def create_recipe(user, **params):
+    defaults = {
+        'title': 'Sample recipe',
+        'time_minutes': 10,
+        'price': Decimal('5.00'),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+def usage(user, kind):
+    """Return `{id: [name, uses]}` of a user's stored tag or ingredient use"""
+    return {
+        str(pk): [name, uses]
+        for pk, name, uses in DashboardUsage.objects.filter(
+            user=user,
+            kind=kind,
+        ).values_list('item_id', 'name', 'uses')
+    }
+
+
+def snapshot(user):
+    """Return the stored dashboard fields of a user"""
+    row = UserDashboard.objects.get(user=user)
+    return (
+        row.recipe_count,
+        row.tag_count,
+        row.ingredient_count,
+        usage(user, 'tag'),
+        usage(user, 'ingredient'),
+    )
+
+
+class DashboardTests(TestCase):
+    """Test dashboard maintenance"""
+
+    def setUp(self):
+        self.user = create_user()
+
+    def assertMatchesRebuild(self):
+        incremental = snapshot(self.user)
+        dashboard.build_dashboard(self.user.pk)
+        self.assertEqual(incremental, snapshot(self.user))
+
+    def test_build_dashboard(self):
+        """Test building a dashboard from existing data"""
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        Tag.objects.create(user=self.user, name='Unused')
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        for _ in range(2):
+            recipe = create_recipe(self.user)
+            recipe.tags.add(vegan)
+            recipe.ingredients.add(salt)
+
+        row = dashboard.build_dashboard(self.user.pk)
+
+        self.assertEqual(row.recipe_count, 2)
+        self.assertEqual(row.tag_count, 2)
+        self.assertEqual(row.ingredient_count, 1)
+        self.assertEqual(
+            usage(self.user, 'tag'),
+            {str(vegan.id): ['Vegan', 2]},
+        )
+        self.assertEqual(
+            usage(self.user, 'ingredient'),
+            {str(salt.id): ['Salt', 2]},
+        )
+
+    def test_no_row_until_built(self):
+        """Test changes before the first build do not create a row"""
+        create_recipe(self.user)
+
+        self.assertFalse(UserDashboard.objects.filter(user=self.user).exists())
+        self.assertEqual(dashboard.get_dashboard(self.user.pk).recipe_count, 1)
+
+    def test_incremental_updates(self):
+        """Test signals keep the row equal to a full rebuild"""
+        dashboard.build_dashboard(self.user.pk)
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        quick = Tag.objects.create(user=self.user, name='Quick')
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        first = create_recipe(self.user)
+        second = create_recipe(self.user)
+
+        first.tags.add(vegan, quick)
+        second.tags.add(vegan)
+        first.ingredients.add(salt)
+        self.assertEqual(
+            snapshot(self.user)[3],
+            {str(vegan.id): ['Vegan', 2], str(quick.id): ['Quick', 1]},
+        )
+        self.assertMatchesRebuild()
+
+        second.tags.remove(vegan, quick)
+        quick.recipe_set.add(second)
+        vegan.name = 'Plant based'
+        vegan.save()
+        self.assertMatchesRebuild()
+
+        first.tags.clear()
+        salt.recipe_set.clear()
+        self.assertMatchesRebuild()
+
+        first.tags.add(vegan)
+        second.delete()
+        quick.delete()
+        self.assertEqual(
+            snapshot(self.user),
+            (1, 1, 1, {str(vegan.id): ['Plant based', 1]}, {}),
+        )
+        self.assertMatchesRebuild()
+
+    def test_unrenamed_save_leaves_dashboard(self):
+        """Test saving a tag without renaming it skips its dashboard"""
+        create_recipe(self.user).tags.add(
+            Tag.objects.create(user=self.user, name='Vegan'),
+        )
+        dashboard.build_dashboard(self.user.pk)
+
+        for tag in (Tag.objects.get(), Tag.objects.create(
+            user=self.user,
+            name='Quick',
+        )):
+            tag.name = f'{tag.name} '
+            with CaptureQueriesContext(connection) as queries:
+                tag.save()
+            self.assertFalse([
+                query for query in queries.captured_queries
+                if 'core_userdashboard' in query['sql']
+            ])
+
+        vegan = Tag.objects.get(name='Vegan')
+        vegan.name = 'Plant based'
+        vegan.save()
+        self.assertEqual(
+            snapshot(self.user)[3][str(vegan.id)],
+            ['Plant based', 1],
+        )
+
+    def test_other_users_untouched(self):
+        """Test changes only touch the owner's dashboard"""
+        other = create_user('other@example.com')
+        dashboard.build_dashboard(other.pk)
+
+        create_recipe(self.user)
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        self.assertEqual(snapshot(other), (0, 0, 0, {}, {}))
+
+    def test_user_delete(self):
+        """Test deleting a user also deletes the dashboard"""
+        dashboard.build_dashboard(self.user.pk)
+        recipe = create_recipe(self.user)
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+
+        self.user.delete()
+
+        self.assertFalse(UserDashboard.objects.exists())
+
+    def test_usage_changes_leave_summary_row(self):
+        """Test adding and removing tags only updates their own rows"""
+        dashboard.build_dashboard(self.user.pk)
+        recipe = create_recipe(self.user)
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+
+        for change in (recipe.tags.add, recipe.tags.remove):
+            with CaptureQueriesContext(connection) as queries:
+                change(vegan)
+            self.assertFalse([
+                query for query in queries.captured_queries
+                if query['sql'].startswith('UPDATE "core_userdashboard"')
+            ])
+        self.assertEqual(usage(self.user, 'tag'), {})
+
+    def test_top_items(self):
+        """Test most used items are ranked by count then name"""
+        tags = [
+            Tag.objects.create(user=self.user, name=name)
+            for name in 'bacd'
+        ]
+        recipes = [create_recipe(self.user) for _ in range(5)]
+        dashboard.build_dashboard(self.user.pk)
+        for tag, uses in zip(tags, (2, 2, 5, 1)):
+            tag.recipe_set.add(*recipes[:uses])
+
+        ranked = dashboard.top_items(Tag, self.user.pk, limit=3)
+
+        self.assertEqual(
+            [(item['name'], item['count']) for item in ranked],
+            [('c', 5), ('a', 2), ('b', 2)],
+        )
+
+    def test_rebuild_command(self):
+        """Test the rebuild command recomputes stale rows"""
+        create_recipe(self.user)
+        UserDashboard.objects.create(user=self.user, recipe_count=7)
+
+        call_command('rebuild_dashboards', '--workers', '1', stdout=StringIO())
+
+        self.assertEqual(snapshot(self.user)[0], 1)
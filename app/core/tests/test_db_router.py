@@ -0,0 +1,180 @@
+"""
+Tests for the read replica database router
+"""
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import OperationalError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import db_router
+from core.models import Recipe, Tag
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class RouterTests(SimpleTestCase):
+    """Test replica selection and routing"""
+
+    def setUp(self):
+        db_router._health.clear()
+
+    def test_reads_default_outside_replica_block(self):
+        """Test reads use the default database unless a replica is set"""
+        router = db_router.ReplicaRouter()
+
+        self.assertIsNone(router.db_for_read(Recipe))
+        with db_router.use_replica('replica_0'):
+            self.assertEqual(router.db_for_read(Recipe), 'replica_0')
+        self.assertIsNone(router.db_for_read(Recipe))
+        self.assertEqual(router.db_for_write(Recipe), 'default')
+
+    @override_settings(REPLICA_DATABASES=['replica_0'])
+    def test_no_migrations_on_replicas(self):
+        """Test migrations only run against the primary"""
+        router = db_router.ReplicaRouter()
+
+        self.assertTrue(router.allow_migrate('default', 'core'))
+        self.assertFalse(router.allow_migrate('replica_0', 'core'))
+
+    def test_no_replicas_configured(self):
+        """Test reads stay on the primary without replicas"""
+        self.assertIsNone(db_router.get_replica())
+
+    @override_settings(REPLICA_DATABASES=['replica_0', 'replica_1'])
+    @patch('core.db_router.check_replica')
+    def test_failover_to_primary(self, patched_check):
+        """Test unhealthy replicas fail over to the primary"""
+        patched_check.return_value = False
+
+        self.assertIsNone(db_router.get_replica())
+        self.assertEqual(patched_check.call_count, 2)
+
+    @override_settings(REPLICA_DATABASES=['replica_0', 'replica_1'])
+    @patch('core.db_router.check_replica')
+    def test_failover_to_healthy_replica(self, patched_check):
+        """Test an unhealthy replica is skipped"""
+        patched_check.side_effect = lambda alias: alias == 'replica_1'
+
+        for _ in range(3):
+            self.assertEqual(db_router.get_replica(), 'replica_1')
+
+    @override_settings(REPLICA_DATABASES=['replica_0'])
+    @patch('core.db_router.check_replica', return_value=True)
+    def test_health_check_cached(self, patched_check):
+        """Test health checks are cached between intervals"""
+        db_router.get_replica()
+        db_router.get_replica()
+
+        patched_check.assert_called_once_with('replica_0')
+
+        db_router.mark_unhealthy('replica_0')
+        self.assertIsNone(db_router.get_replica())
+
+
+@override_settings(REPLICA_DATABASES=['default'])
+@patch('core.db_router.get_replica', return_value='default')
+class ReplicaReadAPITests(TestCase):
+    """Test viewsets read from replicas with read-your-writes pinning"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_safe_request_reads_replica(self, patched_replica):
+        """Test list requests are routed to a replica"""
+        seen = []
+        db_for_read = db_router.ReplicaRouter().db_for_read
+
+        with patch(
+            'recipe.fast_serializers.serialize_recipes',
+            side_effect=lambda qs, **kwargs: (
+                seen.append(db_for_read(Recipe)) or []
+            ),
+        ):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(seen, ['default'])
+        self.assertIsNone(db_for_read(Recipe))
+
+    def test_write_pins_reads_to_primary(self, patched_replica):
+        """Test reads after a write stay on the primary"""
+        payload = {
+            'title': 'Curry',
+            'time_minutes': 10,
+            'price': Decimal('2.50'),
+        }
+        res = self.client.post(RECIPES_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertIn(db_router.PIN_COOKIE, res.cookies)
+
+        self.client.cookies.clear()
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 1)
+        patched_replica.assert_not_called()
+
+    def test_pin_cookie_keeps_primary(self, patched_replica):
+        """Test the pin cookie alone keeps reads on the primary"""
+        self.client.cookies[db_router.PIN_COOKIE] = '1'
+
+        self.client.get(RECIPES_URL)
+
+        patched_replica.assert_not_called()
+
+    def _failing_replica(self, write=False):
+        """Serializer stub failing on the replica and recording routing"""
+        seen = []
+        db_for_read = db_router.ReplicaRouter().db_for_read
+
+        def serialize(queryset, **kwargs):
+            seen.append(db_for_read(Recipe))
+            if len(seen) == 1:
+                if write:
+                    Tag.objects.create(user=self.user, name='Written')
+                raise OperationalError('replica went away')
+            return []
+
+        self.addCleanup(db_router._health.clear)
+        return seen, patch(
+            'recipe.fast_serializers.serialize_recipes',
+            side_effect=serialize,
+        )
+
+    def test_failed_replica_read_retried_on_primary(self, patched_replica):
+        """Test a read failing on a replica is answered by the primary"""
+        seen, serializer = self._failing_replica()
+
+        with serializer:
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(seen, ['default', None])
+        self.assertFalse(db_router.is_healthy('default'))
+        self.assertIsNone(db_router.ReplicaRouter().db_for_read(Recipe))
+
+    def test_failed_replica_read_not_retried_after_write(
+        self, patched_replica,
+    ):
+        """Test a request that already wrote is not run a second time"""
+        seen, serializer = self._failing_replica(write=True)
+
+        with serializer, self.assertRaises(OperationalError):
+            self.client.get(RECIPES_URL)
+
+        self.assertEqual(seen, ['default'])
+        self.assertEqual(Tag.objects.count(), 1)
@@ -0,0 +1,69 @@
+"""
+Tests for work deferred until a transaction commits
+"""
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+
+from core.deferred import CommitBatch
+
+
+class CommitBatchTests(TestCase):
+    """Test items are flushed once committed, and never when rolled back"""
+
+    def setUp(self):
+        self.flushed = []
+        self.batch = CommitBatch(
+            lambda pending, using: self.flushed.append(pending),
+        )
+
+    def test_flushed_once_on_commit(self):
+        """Test a transaction's items are flushed together on commit"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.batch.add(1, {1, 2})
+            self.batch.add(1, {2, 3})
+            self.batch.add(2, {4})
+            self.assertEqual(self.flushed, [])
+
+        self.assertEqual(self.flushed, [{1: {1, 2, 3}, 2: {4}}])
+
+    def test_rolled_back_items_dropped(self):
+        """Test items from a rolled back atomic block are never flushed"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.batch.add(1, {1})
+            try:
+                with transaction.atomic():
+                    self.batch.add(1, {2})
+                    raise ValueError
+            except ValueError:
+                pass
+            self.batch.add(1, {3})
+
+        self.assertEqual(self.flushed, [{1: {1, 3}}])
+
+    def test_rollback_not_leaked_into_next_commit(self):
+        """Test a rolled back transaction's items stay out of the next"""
+        try:
+            with transaction.atomic():
+                self.batch.add(1, {1})
+                raise ValueError
+        except ValueError:
+            pass
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.batch.add(1, {2})
+
+        self.assertEqual(self.flushed, [{1: {2}}])
+
+
+class AutocommitTests(TransactionTestCase):
+    """Test items added outside a transaction"""
+
+    def test_flushed_right_away(self):
+        """Test items added in autocommit are flushed immediately"""
+        flushed = []
+        batch = CommitBatch(lambda pending, using: flushed.append(pending))
+
+        batch.add(1, {1})
+
+        self.assertEqual(flushed, [{1: {1}}])
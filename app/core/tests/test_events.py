@@ -0,0 +1,302 @@
+"""
+Tests for server-sent change events
+"""
+import asyncio
+import json
+from datetime import timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from app.asgi import application
+from core import events
+from core.models import Recipe, StreamTicket, Tag
+
+
+TICKET_URL = reverse('recipe:events-ticket')
+
+
+def scope(headers=(), query_string=b''):
+    return {
+        'type': 'http',
+        'method': 'GET',
+        'path': settings.EVENTS_PATH,
+        'headers': list(headers),
+        'query_string': query_string,
+    }
+
+
+async def wait_for(condition):
+    for _ in range(500):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError('Condition not met')
+
+
+class HubTests(TestCase):
+    """Test fan-out of events to open streams"""
+
+    async def test_publish_reaches_own_streams(self):
+        """Test events reach every stream of their user only"""
+        hub = events.Hub(asyncio.get_running_loop())
+        first, second = hub.subscribe(1), hub.subscribe(1)
+        other = hub.subscribe(2)
+
+        hub.publish(1, {'type': 'tag', 'id': 5, 'action': 'saved'})
+
+        self.assertEqual(first.get_nowait()['id'], 5)
+        self.assertEqual(second.get_nowait()['id'], 5)
+        self.assertTrue(other.empty())
+
+        hub.unsubscribe(1, first)
+        hub.unsubscribe(1, second)
+        self.assertNotIn(1, hub.subscribers)
+
+    async def test_overflow_becomes_resync(self):
+        """Test a stream falling behind gets one resync event"""
+        hub = events.Hub(asyncio.get_running_loop(), queue_size=2)
+        queue = hub.subscribe(1)
+
+        for pk in range(3):
+            hub.publish(1, {'type': 'tag', 'id': pk, 'action': 'saved'})
+
+        self.assertIs(queue.get_nowait(), events.RESYNC)
+        self.assertTrue(queue.empty())
+
+
+class PublishTests(TestCase):
+    """Test changes are published once committed"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+
+    def test_changes_published_on_commit(self):
+        """Test saves, m2m changes and deletes are announced"""
+        with patch.object(events.LocalBroker, 'deliver') as deliver:
+            with self.captureOnCommitCallbacks(execute=True):
+                recipe = Recipe.objects.create(
+                    user=self.user,
+                    title='Soup',
+                    time_minutes=5,
+                    price=Decimal('1.00'),
+                )
+                tag = Tag.objects.create(user=self.user, name='Vegan')
+                recipe.tags.add(tag, through_defaults={'user': self.user})
+                self.assertFalse(deliver.called)
+            with self.captureOnCommitCallbacks(execute=True):
+                recipe.soft_delete()
+
+        published = [call.args for call in deliver.call_args_list]
+        self.assertIn(
+            (self.user.pk, {'type': 'tag', 'id': tag.id, 'action': 'saved'}),
+            published,
+        )
+        self.assertEqual(
+            published[-1],
+            (self.user.pk, {
+                'type': 'recipe', 'id': recipe.id, 'action': 'deleted',
+            }),
+        )
+
+    def test_rolled_back_changes_not_notified(self):
+        """Test events of a rolled back block are left out of the commit"""
+        broker = events.PostgresBroker()
+        saved = {'type': 'tag', 'id': 1, 'action': 'saved'}
+        deleted = {'type': 'tag', 'id': 2, 'action': 'deleted'}
+        try:
+            with transaction.atomic():
+                broker.publish(self.user.pk, deleted)
+                raise ValueError
+        except ValueError:
+            pass
+
+        with patch.object(events, 'notifications', return_value=[]) as sent:
+            with self.captureOnCommitCallbacks(execute=True):
+                broker.publish(self.user.pk, saved)
+
+        sent.assert_called_once_with({self.user.pk: {('tag', 1): saved}})
+
+
+class NotificationTests(SimpleTestCase):
+    """Test a transaction's events are batched into notifications"""
+
+    def test_one_payload_per_user(self):
+        """Test each user's events share one payload, latest per row"""
+        pending = {
+            1: {
+                ('tag', 5): {'type': 'tag', 'id': 5, 'action': 'deleted'},
+                ('recipe', 2): {'type': 'recipe', 'id': 2, 'action': 'saved'},
+            },
+            2: {('tag', 6): {'type': 'tag', 'id': 6, 'action': 'saved'}},
+        }
+
+        payloads = [json.loads(p) for p in events.notifications(pending)]
+
+        self.assertEqual(payloads, [
+            {'user': 1, 'events': [
+                {'type': 'tag', 'id': 5, 'action': 'deleted'},
+                {'type': 'recipe', 'id': 2, 'action': 'saved'},
+            ]},
+            {'user': 2, 'events': [
+                {'type': 'tag', 'id': 6, 'action': 'saved'},
+            ]},
+        ])
+
+    def test_oversized_batch_becomes_resync(self):
+        """Test too many events for one notification become a resync"""
+        pending = {1: {
+            ('recipe', pk): {'type': 'recipe', 'id': pk, 'action': 'saved'}
+            for pk in range(1000)
+        }}
+
+        payloads = events.notifications(pending)
+
+        self.assertEqual(
+            [json.loads(p) for p in payloads],
+            [{'user': 1, 'events': None}],
+        )
+
+
+class StreamTests(TestCase):
+    """Test the event stream served over ASGI"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.token = Token.objects.create(user=self.user)
+
+    async def test_token_required(self):
+        """Test streams are refused without a valid token"""
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        await application(scope(query_string=b'ticket=wrong'), None, send)
+
+        self.assertEqual(sent[0]['status'], 401)
+
+    async def test_token_refused_in_query(self):
+        """Test the API token is not accepted in the URL"""
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        query = f'token={self.token.key}'.encode()
+        await application(scope(query_string=query), None, send)
+
+        self.assertEqual(sent[0]['status'], 401)
+
+    async def open_with_ticket(self, key):
+        """Open a stream with a ticket and return its response status"""
+        sent, inbox = [], asyncio.Queue()
+
+        async def send(message):
+            sent.append(message)
+
+        query = f'ticket={key}'.encode()
+        task = asyncio.ensure_future(
+            application(scope(query_string=query), inbox.get, send),
+        )
+        await wait_for(lambda: sent)
+        await inbox.put({'type': 'http.disconnect'})
+        await asyncio.wait_for(task, 1)
+        return sent[0]['status']
+
+    async def test_ticket_used_once(self):
+        """Test a ticket opens one stream and is then used up"""
+        ticket = await sync_to_async(events.issue_ticket)(self.user)
+
+        self.assertEqual(await self.open_with_ticket(ticket.key), 200)
+        self.assertEqual(await self.open_with_ticket(ticket.key), 401)
+
+    async def test_expired_ticket_refused(self):
+        """Test a ticket past its expiry opens no stream"""
+        ticket = await sync_to_async(StreamTicket.objects.create)(
+            key='expired',
+            user=self.user,
+            expires_at=timezone.now() - timedelta(seconds=1),
+        )
+
+        self.assertEqual(await self.open_with_ticket(ticket.key), 401)
+
+    async def test_stream_delivers_events(self):
+        """Test events published for the user are streamed to them"""
+        sent, inbox = [], asyncio.Queue()
+
+        async def send(message):
+            sent.append(message)
+
+        auth = (b'authorization', f'Token {self.token.key}'.encode())
+        task = asyncio.ensure_future(
+            application(scope([auth]), inbox.get, send),
+        )
+        await wait_for(lambda: len(sent) == 2)
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertIn(
+            (b'content-type', b'text/event-stream'),
+            sent[0]['headers'],
+        )
+
+        event = {'type': 'recipe', 'id': 3, 'action': 'saved'}
+        events.get_broker().deliver(self.user.pk, event)
+        await wait_for(lambda: len(sent) == 3)
+        await inbox.put({'type': 'http.disconnect'})
+        await asyncio.wait_for(task, 1)
+
+        name, data = sent[2]['body'].decode().strip().split('\n')
+        self.assertEqual(name, 'event: change')
+        self.assertEqual(json.loads(data[len('data: '):]), event)
+        self.assertEqual(events.hub.subscribers, {})
+
+
+class StreamTicketApiTests(TestCase):
+    """Test stream tickets are issued to authenticated users"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+
+    def test_auth_required(self):
+        """Test tickets are only issued to authenticated users"""
+        res = self.client.post(TICKET_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_issue_ticket(self):
+        """Test a ticket is issued and expired ones are cleared"""
+        StreamTicket.objects.create(
+            key='old',
+            user=self.user,
+            expires_at=timezone.now(),
+        )
+        self.client.force_authenticate(self.user)
+
+        res = self.client.post(TICKET_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        ticket = StreamTicket.objects.get()
+        self.assertEqual(res.data['ticket'], ticket.key)
+        self.assertEqual(ticket.user, self.user)
+        self.assertGreater(ticket.expires_at, timezone.now())
@@ -0,0 +1,98 @@
+"""
+Tests for resized image variants
+"""
+import io
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from django.test import SimpleTestCase
+
+from core import images
+
+
+def jpeg(width, height):
+    out = io.BytesIO()
+    Image.new('RGB', (width, height)).save(out, 'JPEG')
+    out.seek(0)
+    return out
+
+
+class RenderTests(SimpleTestCase):
+    """Test images are resized and encoded"""
+
+    def test_fits_box_keeping_aspect(self):
+        """Test images shrink to fit the box without being stretched"""
+        data = images.render(jpeg(400, 200), width=100, height=100,
+                             fmt='png')
+
+        with Image.open(io.BytesIO(data)) as image:
+            self.assertEqual(image.format, 'PNG')
+            self.assertEqual(image.size, (100, 50))
+
+    def test_never_enlarged(self):
+        """Test small images keep their size"""
+        data = images.render(jpeg(20, 10), width=512, fmt='webp')
+
+        with Image.open(io.BytesIO(data)) as image:
+            self.assertEqual(image.size, (20, 10))
+
+
+class VariantCacheTests(SimpleTestCase):
+    """Test the bounded disk cache"""
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.cache = images.VariantCache(root.name, max_bytes=350)
+
+    def test_least_recently_used_evicted(self):
+        """Test going over the cap deletes the least recently used files"""
+        for number in range(3):
+            self.cache.get_or_create(f'a{number}/file', lambda: b'x' * 100)
+            # Keep modification times apart on coarse clocks.
+            os.utime(self.cache.path(f'a{number}/file'),
+                     (number, number))
+        self.assertIsNotNone(self.cache.get('a0/file'))
+
+        self.cache.get_or_create('a3/file', lambda: b'x' * 100)
+
+        self.assertIsNotNone(self.cache.get('a0/file'))
+        self.assertIsNone(self.cache.get('a1/file'))
+        self.assertIsNone(self.cache.get('a2/file'))
+        self.assertIsNotNone(self.cache.get('a3/file'))
+        self.assertLessEqual(self.cache.size, 280)
+
+    def test_concurrent_requests_collapsed(self):
+        """Test concurrent requests for one file make it only once"""
+        calls = []
+
+        def make():
+            calls.append(1)
+            time.sleep(0.1)
+            return b'data'
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            paths = list(pool.map(
+                lambda _: self.cache.get_or_create('ab/file', make),
+                range(4),
+            ))
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(set(paths)), 1)
+        with open(paths[0], 'rb') as f:
+            self.assertEqual(f.read(), b'data')
+
+    def test_failure_not_cached(self):
+        """Test a failed encode is retried by the next request"""
+        def fail():
+            raise OSError('broken image')
+
+        with self.assertRaises(OSError):
+            self.cache.get_or_create('ab/file', fail)
+
+        path = self.cache.get_or_create('ab/file', lambda: b'data')
+        self.assertTrue(os.path.exists(path))
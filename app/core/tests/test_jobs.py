@@ -0,0 +1,221 @@
+"""
+Tests for the job queue
+"""
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import jobs
+from core.models import Job, Recipe
+
+
+METRICS_URL = reverse('job-metrics')
+
+calls = []
+
+
+@jobs.task('test_record')
+def record(value):
+    calls.append(value)
+
+
+@jobs.task('test_fail')
+def fail():
+    raise RuntimeError('boom')
+
+
+class JobQueueTests(TestCase):
+    """Test enqueueing, claiming and running jobs"""
+
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_unknown_task(self):
+        """Test enqueueing a task that is not registered fails"""
+        with self.assertRaises(ValueError):
+            jobs.enqueue('no_such_task')
+
+    def test_idempotency_key(self):
+        """Test a key enqueues its job only once"""
+        first = jobs.enqueue('test_record', {'value': 1}, key='once')
+        second = jobs.enqueue('test_record', {'value': 2}, key='once')
+
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_run_job(self):
+        """Test a claimed job runs its task and is marked done"""
+        job = jobs.enqueue('test_record', {'value': 'x'})
+
+        self.assertEqual(jobs.run_until_empty(), 1)
+
+        job.refresh_from_db()
+        self.assertEqual(calls, ['x'])
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(job.attempts, 1)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_delayed_job_waits(self):
+        """Test a job is not claimed before it is due"""
+        jobs.enqueue('test_record', {'value': 1}, delay=60)
+
+        self.assertEqual(jobs.claim('w'), [])
+
+    @override_settings(JOB_BACKOFF_BASE=10)
+    def test_failed_job_retried_with_backoff(self):
+        """Test a failing job is requeued for later with its error"""
+        job = jobs.enqueue('test_fail', max_attempts=3)
+
+        with self.assertLogs('core.jobs', 'WARNING'):
+            jobs.work('w')
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertEqual(job.attempts, 1)
+        self.assertIn('boom', job.last_error)
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=4))
+        self.assertEqual(jobs.claim('w'), [])
+
+    def test_failed_job_gives_up(self):
+        """Test a job failing its last attempt is marked failed"""
+        job = jobs.enqueue('test_fail', max_attempts=1)
+
+        with self.assertLogs('core.jobs', 'WARNING'):
+            jobs.work('w')
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIsNotNone(job.finished_at)
+
+    @override_settings(JOB_LOCK_TIMEOUT=60)
+    def test_stale_job_reclaimed(self):
+        """Test a job left running by a dead worker is claimed again"""
+        job = jobs.enqueue('test_record', {'value': 1})
+        jobs.claim('dead')
+        self.assertEqual(jobs.claim('w'), [])
+
+        Job.objects.filter(pk=job.pk).update(
+            locked_at=timezone.now() - timedelta(seconds=120),
+        )
+        claimed = jobs.claim('w')
+
+        self.assertEqual([j.pk for j in claimed], [job.pk])
+        self.assertEqual(claimed[0].attempts, 2)
+
+    @override_settings(JOB_LOCK_TIMEOUT=60)
+    def test_stale_job_out_of_attempts_failed(self):
+        """Test a stale job that used its last attempt is not run again"""
+        job = jobs.enqueue('test_record', {'value': 1}, max_attempts=1)
+        jobs.claim('dead')
+        Job.objects.filter(pk=job.pk).update(
+            locked_at=timezone.now() - timedelta(seconds=120),
+        )
+
+        self.assertEqual(jobs.claim('w'), [])
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 1)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_queue_depth(self):
+        """Test queue depth counts jobs by status and task"""
+        jobs.enqueue('test_record', {'value': 1})
+        jobs.enqueue('test_record', {'value': 2})
+        jobs.enqueue('test_record', {'value': 3}, delay=60)
+        jobs.enqueue('test_fail', max_attempts=1)
+        with self.assertLogs('core.jobs', 'WARNING'):
+            jobs.run_until_empty()
+        jobs.enqueue('test_record', {'value': 4})
+
+        depth = jobs.queue_depth()
+
+        self.assertEqual(depth['queued'], 2)
+        self.assertEqual(depth['ready'], 1)
+        self.assertEqual(depth['done'], 2)
+        self.assertEqual(depth['failed'], 1)
+        self.assertEqual(depth['ready_by_task'], {'test_record': 1})
+
+    def test_prune(self):
+        """Test old finished jobs are deleted"""
+        old = jobs.enqueue('test_record', {'value': 1})
+        jobs.enqueue('test_record', {'value': 2})
+        jobs.run_until_empty()
+        Job.objects.filter(pk=old.pk).update(
+            finished_at=timezone.now() - timedelta(days=2),
+        )
+
+        self.assertEqual(jobs.prune(retention=86400), 1)
+        self.assertFalse(Job.objects.filter(pk=old.pk).exists())
+
+    def test_run_workers_burst(self):
+        """Test the command runs queued jobs and exits when empty"""
+        jobs.enqueue('test_record', {'value': 1})
+        jobs.enqueue('test_record', {'value': 2})
+        out = StringIO()
+
+        call_command('run_workers', processes=1, burst=True, stdout=out)
+
+        self.assertEqual(sorted(calls), [1, 2])
+        self.assertIn('Ran 2 jobs', out.getvalue())
+
+    def test_soft_delete_queues_reaping(self):
+        """Test soft-deleting a recipe queues a job removing it"""
+        user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        recipe = Recipe.objects.create(
+            user=user,
+            title='Soup',
+            time_minutes=10,
+            price=Decimal('2.00'),
+        )
+
+        recipe.soft_delete()
+        jobs.run_until_empty()
+
+        self.assertFalse(Recipe.all_objects.filter(pk=recipe.pk).exists())
+
+
+class JobMetricsApiTests(TestCase):
+    """Test the job queue metrics endpoint"""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_staff_only(self):
+        """Test metrics are not served to regular users"""
+        user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client.force_authenticate(user)
+
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_metrics(self):
+        """Test staff see the queue depth"""
+        admin = get_user_model().objects.create_superuser(
+            'admin@example.com',
+            'testpass123',
+        )
+        self.client.force_authenticate(admin)
+        jobs.enqueue('test_record', {'value': 1})
+
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['queued'], 1)
+        self.assertEqual(res.data['ready'], 1)
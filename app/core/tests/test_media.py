@@ -0,0 +1,98 @@
+"""
+Tests for the protected media view
+"""
+import tempfile
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+
+
+def media_url(path):
+    return reverse('media', args=[path])
+
+
+@override_settings(MEDIA_ACCEL_PREFIX='/protected-media/')
+class MediaViewTests(TestCase):
+    """Test media is only sent to the owner of its recipe"""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings = override_settings(MEDIA_ROOT=media_root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        caches['throttle'].clear()
+        self.addCleanup(caches['throttle'].clear)
+
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Soup',
+            time_minutes=5,
+            price=Decimal('1.00'),
+        )
+        self.recipe.image.save('soup.jpg', ContentFile(b'jpeg bytes'))
+        self.path = self.recipe.image.name
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_image_url_points_at_view(self):
+        """Test image URLs go through the media view"""
+        self.assertEqual(self.recipe.image.url, media_url(self.path))
+
+    def test_auth_required(self):
+        """Test anonymous requests are refused"""
+        res = APIClient().get(media_url(self.path))
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_owner_redirected_to_proxy(self):
+        """Test the owner gets the file handed over to nginx"""
+        res = self.client.get(media_url(self.path))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['X-Accel-Redirect'],
+                         f'/protected-media/{self.path}')
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        self.assertEqual(res.content, b'')
+
+    def test_other_users_get_not_found(self):
+        """Test images of other users' recipes are not found"""
+        other = get_user_model().objects.create_user(
+            'other@example.com',
+            'testpass123',
+        )
+        self.client.force_authenticate(other)
+
+        res = self.client.get(media_url(self.path))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_deleted_recipe_and_bad_paths_not_found(self):
+        """Test deleted recipes' images and odd paths are not found"""
+        res = self.client.get(media_url(f'uploads/../{self.path}'))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+        self.recipe.soft_delete()
+        res = self.client.get(media_url(self.path))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(MEDIA_ACCEL_PREFIX='')
+    def test_sent_by_django_without_proxy(self):
+        """Test files are streamed by Django when no proxy is set"""
+        res = self.client.get(media_url(self.path))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(res.streaming_content), b'jpeg bytes')
@@ -0,0 +1,75 @@
+"""
+Tests for the load shedding middleware
+"""
+import time
+from unittest.mock import patch
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core.middleware import LoadSheddingMiddleware
+
+
+def stamped_request(path='/api/recipe/recipes/', queued=0.0):
+    """Return a request stamped as queued for `queued` seconds"""
+    return RequestFactory().get(
+        path,
+        HTTP_X_REQUEST_START=f't={time.time() - queued:.3f}',
+    )
+
+
+@override_settings(LOAD_SHED_QUEUE_THRESHOLD=1.0)
+class LoadSheddingTests(SimpleTestCase):
+    """Test requests are shed while the queue is backed up"""
+
+    def setUp(self):
+        self.middleware = LoadSheddingMiddleware(lambda r: HttpResponse())
+
+    def test_passes_when_queue_short(self):
+        """Test requests pass while queue latency is low"""
+        res = self.middleware(stamped_request(queued=0.1))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertFalse(self.middleware.shedding)
+
+    def test_sheds_when_queue_backed_up(self):
+        """Test requests are rejected with Retry-After under overload"""
+        for _ in range(20):
+            res = self.middleware(stamped_request(queued=3.0))
+
+        self.assertTrue(self.middleware.shedding)
+        self.assertEqual(res.status_code, 503)
+        self.assertGreaterEqual(int(res['Retry-After']), 1)
+
+    def test_recovers_after_queue_drains(self):
+        """Test shedding stops once latency falls below half the threshold"""
+        for _ in range(20):
+            self.middleware(stamped_request(queued=3.0))
+
+        with patch('core.middleware.random.random', return_value=0.99):
+            for _ in range(30):
+                res = self.middleware(stamped_request(queued=0.0))
+
+        self.assertFalse(self.middleware.shedding)
+        self.assertEqual(res.status_code, 200)
+
+    def test_ignores_other_paths(self):
+        """Test non-API paths are never shed"""
+        for _ in range(20):
+            res = self.middleware(stamped_request('/admin/', queued=3.0))
+
+        self.assertEqual(res.status_code, 200)
+
+    def test_unstamped_requests_pass(self):
+        """Test requests without a queue stamp are not shed"""
+        res = self.middleware(RequestFactory().get('/api/recipe/recipes/'))
+
+        self.assertEqual(res.status_code, 200)
+
+    @override_settings(LOAD_SHED_QUEUE_THRESHOLD=0)
+    def test_disabled(self):
+        """Test a zero threshold disables shedding"""
+        for _ in range(20):
+            res = self.middleware(stamped_request(queued=3.0))
+
+        self.assertEqual(res.status_code, 200)
@@ -93,3 +93,39 @@ class ModelTests(TestCase):
         file_path = models.recipe_image_file_path(None, 'example.jpg')
 
         self.assertEqual(file_path, f'uploads/recipe/{uuid}.jpg')
+
+    def test_recipe_tag_gets_recipe_owner(self):
+        """Test m2m rows added without a user get the recipe owner"""
+        user = create_user()
+        recipe = models.Recipe.objects.create(
+            user=user,
+            title='Sample Recipe Name',
+            time_minutes=5,
+            price=Decimal('5.50'),
+        )
+        tag = models.Tag.objects.create(user=user, name='Tag1')
+        ingredient = models.Ingredient.objects.create(user=user, name='Salt')
+
+        recipe.tags.add(tag)
+        recipe.ingredients.add(ingredient)
+
+        self.assertEqual(models.RecipeTag.objects.get().user, user)
+        self.assertEqual(models.RecipeIngredient.objects.get().user, user)
+
+    def test_names_normalized_on_write(self):
+        """Test names are tidied and keyed for duplicate matching"""
+        user = create_user()
+        tag = models.Tag.objects.create(user=user, name='  Ｓalt\t flakes ')
+        models.Ingredient.objects.bulk_create([
+            models.Ingredient(user=user, name='SALT  '),
+        ])
+
+        self.assertEqual(tag.name, 'Salt flakes')
+        self.assertEqual(tag.normalized_name, 'salt flakes')
+        ingredient = models.Ingredient.objects.get()
+        self.assertEqual(ingredient.name, 'SALT')
+        self.assertEqual(ingredient.normalized_name, 'salt')
+        self.assertEqual(
+            models.Ingredient.objects.matching(' salt').get(),
+            ingredient,
+        )
@@ -0,0 +1,83 @@
+"""
+Tests for hash partitioning recipe tables by user
+"""
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+
+from core import benchmark, partitioning
+from core.models import (
+    Recipe,
+    RecipeTag,
+    Tag,
+)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Requires PostgreSQL')
+class PartitioningTests(TestCase):
+    """Test partitioning keeps data and prunes per-user queries"""
+
+    def setUp(self):
+        self.users = [benchmark.create_user() for _ in range(4)]
+        for user in self.users:
+            benchmark.seed_recipes(user, 20)
+
+    def _partition(self):
+        partitioning.partition_tables(
+            connection,
+            partitions=4,
+            batch_size=7,
+            log=lambda message: None,
+        )
+
+    def test_partition_keeps_rows(self):
+        """Test every recipe and m2m row survives partitioning"""
+        recipes = list(Recipe.objects.order_by('id').values())
+        tags = list(RecipeTag.objects.order_by('id').values())
+
+        self._partition()
+
+        self.assertTrue(partitioning.is_partitioned(connection))
+        self.assertEqual(list(Recipe.objects.order_by('id').values()), recipes)
+        self.assertEqual(list(RecipeTag.objects.order_by('id').values()), tags)
+
+    def test_partition_prunes_user_queries(self):
+        """Test per-user recipe queries scan a single partition"""
+        self._partition()
+        user = self.users[0]
+
+        plan = benchmark.explain_plan(Recipe.objects.filter(user=user))
+
+        relations = benchmark.plan_relations(plan)
+        self.assertEqual(len(relations), 1)
+        self.assertTrue(relations.pop().startswith('core_recipe_p'))
+
+    def test_writes_after_partitioning(self):
+        """Test recipes and m2m rows can still be written"""
+        self._partition()
+        user = self.users[0]
+        recipe = Recipe.objects.create(
+            user=user,
+            title='New recipe',
+            time_minutes=5,
+            price=Decimal('1.00'),
+        )
+        tag = Tag.objects.create(user=user, name='New tag')
+
+        recipe.tags.add(tag)
+        self.assertEqual(RecipeTag.objects.get(tag=tag).user, user)
+        recipe.delete()
+
+        self.assertFalse(Recipe.objects.filter(id=recipe.id).exists())
+
+    def test_unpartition(self):
+        """Test partitioned tables can be turned back into single tables"""
+        count = Recipe.objects.count()
+        self._partition()
+
+        partitioning.unpartition_tables(connection, log=lambda message: None)
+
+        self.assertFalse(partitioning.is_partitioned(connection))
+        self.assertEqual(Recipe.objects.count(), count)
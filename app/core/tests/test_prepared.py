@@ -0,0 +1,139 @@
+"""
+Tests for server-side prepared statements
+"""
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import prepared
+from core.models import Tag
+
+
+class FakeConnection:
+    in_atomic_block = False
+
+    def __init__(self):
+        self.prepared_statements = {}
+
+
+class FakeExecute:
+    """Records statements instead of running them"""
+
+    def __init__(self, fail=None):
+        self.statements = []
+        self.fail = fail
+
+    def __call__(self, sql, params, many, context):
+        self.statements.append(sql)
+        if self.fail and sql.startswith('EXECUTE'):
+            error, self.fail = self.fail, None
+            raise error
+        return sql
+
+
+@override_settings(
+    PREPARED_STATEMENTS=['tag_list'],
+    PREPARED_MAX_PER_CONNECTION=2,
+)
+class ExecuteWrapperTests(SimpleTestCase):
+    """Test hot queries are prepared once and then executed"""
+
+    def setUp(self):
+        self.connection = FakeConnection()
+        self.context = {'connection': self.connection}
+
+    def run_query(self, execute, sql, params, name='tag_list'):
+        with prepared.prepared(name):
+            return prepared._execute(execute, sql, params, False,
+                                     self.context)
+
+    def test_positional(self):
+        """Test placeholders are numbered and percent signs unescaped"""
+        self.assertEqual(
+            prepared.positional("a = %s AND b LIKE 'x%%' AND c = %s"),
+            "a = $1 AND b LIKE 'x%' AND c = $2",
+        )
+
+    def test_prepared_once_per_connection(self):
+        """Test the first run prepares and every run executes"""
+        execute = FakeExecute()
+        sql = 'SELECT id FROM core_tag WHERE user_id = %s'
+
+        self.run_query(execute, sql, [1])
+        self.run_query(execute, sql, [2])
+
+        self.assertEqual(execute.statements, [
+            'PREPARE tag_list_0 AS SELECT id FROM core_tag '
+            'WHERE user_id = $1',
+            'EXECUTE tag_list_0 (%s)',
+            'EXECUTE tag_list_0 (%s)',
+        ])
+
+    def test_disabled_and_unknown_names(self):
+        """Test names not enabled run as usual and unknown names fail"""
+        execute = FakeExecute()
+
+        self.run_query(execute, 'SELECT 1', [], name='token')
+        self.run_query(execute, 'SELECT 2', [], name=None)
+
+        self.assertEqual(execute.statements, ['SELECT 1', 'SELECT 2'])
+        with self.assertRaises(ValueError):
+            self.run_query(execute, 'SELECT 1', [], name='missing')
+
+    def test_limit_per_connection(self):
+        """Test queries past the limit are no longer prepared"""
+        execute = FakeExecute()
+        for number in range(3):
+            self.run_query(execute, f'SELECT {number}', [])
+
+        self.assertEqual(execute.statements[-1], 'SELECT 2')
+        self.assertEqual(len(self.connection.prepared_statements), 2)
+
+    def test_stale_statement_dropped(self):
+        """Test a plan made stale by a migration is dropped and retried"""
+        execute = FakeExecute(fail=DatabaseError(prepared.STALE_PLAN))
+        self.connection.prepared_statements = {'SELECT 1': 'tag_list_0'}
+
+        self.assertEqual(self.run_query(execute, 'SELECT 1', []), 'SELECT 1')
+        self.run_query(execute, 'SELECT 1', [])
+
+        self.assertEqual(execute.statements, [
+            'EXECUTE tag_list_0',
+            'SELECT 1',
+            'DEALLOCATE ALL',
+            'PREPARE tag_list_0 AS SELECT 1',
+            'EXECUTE tag_list_0',
+        ])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Requires PostgreSQL')
+@override_settings(PREPARED_STATEMENTS=['tag_list', 'token'])
+class PreparedStatementTests(TestCase):
+    """Test hot API queries run as prepared statements on Postgres"""
+
+    def test_list_and_token_prepared(self):
+        """Test listing tags prepares the token and tag list queries"""
+        user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        Tag.objects.create(user=user, name='Vegan')
+        token = Token.objects.create(user=user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        for _ in range(2):
+            res = client.get(reverse('recipe:tag-list'))
+            self.assertEqual(res.data[0]['name'], 'Vegan')
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT name FROM pg_prepared_statements')
+            names = {row[0] for row in cursor.fetchall()}
+        self.assertTrue(any(name.startswith('token_') for name in names))
+        self.assertTrue(any(name.startswith('tag_list_') for name in names))
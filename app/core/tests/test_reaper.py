@@ -0,0 +1,190 @@
+"""
+Tests for soft deletion and the reaper
+"""
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.admin.models import ADDITION, LogEntry
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import reaper
+from core.dashboard import build_dashboard
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+    RecipeTag,
+    UserDashboard,
+    DashboardUsage,
+    IngredientNutrition,
+    RecipeNutrition,
+)
+
+
+ME_URL = reverse('user:me')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def create_user(email='user@example.com'):
+    return get_user_model().objects.create_user(email, 'testpass123')
+
+
+def create_recipe(user, **params):
+    defaults = {
+        'title': 'Sample recipe',
+        'time_minutes': 10,
+        'price': Decimal('5.00'),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class SoftDeleteTests(TestCase):
+    """Test data is hidden as soon as it is deleted"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+
+    def test_deleted_user_cannot_authenticate(self):
+        """Test deleting the account locks it out at once"""
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        res = self.client.delete(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.deleted_at)
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_recipe_hidden(self):
+        """Test a deleted recipe leaves lists and counts immediately"""
+        self.client.force_authenticate(self.user)
+        recipe = create_recipe(self.user)
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        build_dashboard(self.user.pk)
+
+        res = self.client.delete(
+            reverse('recipe:recipe-detail', args=[recipe.id]),
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.get(RECIPES_URL).data, [])
+        self.assertTrue(Recipe.all_objects.filter(id=recipe.id).exists())
+        self.assertFalse(RecipeTag.objects.exists())
+        dashboard = UserDashboard.objects.get(user=self.user)
+        self.assertEqual(dashboard.recipe_count, 0)
+        self.assertFalse(DashboardUsage.objects.exists())
+
+    def test_admin_delete_is_soft(self):
+        """Test deleting a user in the admin only flags it"""
+        admin = get_user_model().objects.create_superuser(
+            'admin@example.com',
+            'testpass123',
+        )
+        self.client.force_login(admin)
+        create_recipe(self.user)
+        url = reverse('admin:core_user_delete', args=[self.user.id])
+
+        res = self.client.post(url, {'post': 'yes'})
+
+        self.assertEqual(res.status_code, status.HTTP_302_FOUND)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertEqual(Recipe.all_objects.count(), 1)
+
+
+class ReaperTests(TestCase):
+    """Test the reaper removes soft-deleted data"""
+
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        override = override_settings(MEDIA_ROOT=self.media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def create_image(self, recipe):
+        recipe.image.save('photo.jpg', ContentFile(b'jpeg'), save=True)
+        return recipe.image.path
+
+    def test_reap_user(self):
+        """Test a user's data is removed in chunks with the images"""
+        user = create_user()
+        keep = create_user('keep@example.com')
+        kept = create_recipe(keep)
+        tag = Tag.objects.create(user=user, name='Vegan')
+        salt = Ingredient.objects.create(user=user, name='Salt')
+        IngredientNutrition.objects.create(ingredient=salt, user=user)
+        paths = []
+        for _ in range(5):
+            recipe = create_recipe(user)
+            recipe.tags.add(tag)
+            paths.append(self.create_image(recipe))
+        build_dashboard(user.pk)
+        user.soft_delete()
+        self.assertEqual(reaper.pending(), {'users': 1, 'recipes': 5})
+
+        messages = []
+        reaped = reaper.reap(chunk_size=2, log=messages.append)
+
+        self.assertEqual(reaped, (1, 0))
+        self.assertIn(f'user {user.pk}: deleted 4 recipes', messages)
+        self.assertEqual(list(Recipe.all_objects.all()), [kept])
+        self.assertFalse(Tag.objects.exists())
+        self.assertFalse(Ingredient.objects.exists())
+        self.assertFalse(RecipeTag.objects.exists())
+        self.assertFalse(IngredientNutrition.objects.exists())
+        self.assertFalse(UserDashboard.objects.exists())
+        self.assertFalse(DashboardUsage.objects.exists())
+        self.assertEqual(list(get_user_model().objects.all()), [keep])
+        self.assertFalse(any(os.path.exists(path) for path in paths))
+        self.assertEqual(reaper.pending(), {'users': 0, 'recipes': 0})
+
+    def test_reap_user_admin_log(self):
+        """Test the user's admin log goes, whether or not admin is loaded"""
+        for installed in (True, False):
+            user = create_user()
+            LogEntry.objects.log_action(
+                user.pk, None, None, 'Recipe', ADDITION,
+            )
+            user.soft_delete()
+            apps = {} if installed else {
+                'remove': ['django.contrib.admin'],
+            }
+            with self.subTest(installed=installed), \
+                    self.modify_settings(INSTALLED_APPS=apps):
+                reaper.reap()
+
+                self.assertFalse(LogEntry.objects.exists())
+                self.assertFalse(get_user_model().objects.exists())
+
+    def test_reap_recipes(self):
+        """Test soft-deleted recipes of active users are removed"""
+        user = create_user()
+        recipe = create_recipe(user)
+        path = self.create_image(recipe)
+        RecipeNutrition.objects.create(recipe=recipe, user=user)
+        live = create_recipe(user)
+        recipe.soft_delete()
+
+        out = StringIO()
+        call_command('reap_deleted', '--status', stdout=out)
+        self.assertIn('0 users and 1 recipes', out.getvalue())
+        call_command('reap_deleted', stdout=out)
+
+        self.assertEqual(list(Recipe.all_objects.all()), [live])
+        self.assertFalse(RecipeNutrition.objects.exists())
+        self.assertFalse(os.path.exists(path))
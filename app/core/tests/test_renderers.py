@@ -0,0 +1,95 @@
+"""
+Tests for the fast JSON renderer and parser
+"""
+import datetime
+import io
+import json
+from decimal import Decimal
+
+from django.test import SimpleTestCase, override_settings
+from django.utils import timezone
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+
+from core.parsers import FastJSONParser
+from core.renderers import FastJSONRenderer
+
+
+SAMPLE = {
+    'id': 1,
+    'title': 'Thai curry  ',
+    'price': Decimal('5.50'),
+    'created': datetime.datetime(2023, 6, 5, 3, 25, 1, 123456,
+                                 tzinfo=timezone.utc),
+    'day': datetime.date(2023, 6, 5),
+    'tags': [{'id': 2, 'name': 'Thai'}],
+    1: 'non string key',
+}
+
+
+class RendererTests(SimpleTestCase):
+    """Test FastJSONRenderer"""
+
+    def test_matches_stock_renderer(self):
+        """Test output is byte-identical to the stock JSONRenderer"""
+        expected = JSONRenderer().render(SAMPLE)
+
+        self.assertEqual(FastJSONRenderer().render(SAMPLE), expected)
+
+    @override_settings(JSON_BACKEND='stdlib')
+    def test_stdlib_fallback(self):
+        """Test the stdlib backend produces the same output"""
+        expected = JSONRenderer().render(SAMPLE)
+
+        self.assertEqual(FastJSONRenderer().render(SAMPLE), expected)
+
+    def test_indent_requested(self):
+        """Test indented output falls back to the stock renderer"""
+        media_type = 'application/json; indent=4'
+        expected = JSONRenderer().render(SAMPLE, media_type)
+
+        res = FastJSONRenderer().render(SAMPLE, media_type)
+
+        self.assertEqual(res, expected)
+
+    def test_render_none(self):
+        """Test rendering None returns an empty body"""
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+    def test_render_iter(self):
+        """Test incremental rendering joins to a valid JSON array"""
+        items = [{'id': i, 'price': Decimal('1.25')} for i in range(7)]
+
+        chunks = list(FastJSONRenderer().render_iter(items, chunk_size=3))
+
+        self.assertGreater(len(chunks), 3)
+        self.assertEqual(b''.join(chunks), JSONRenderer().render(items))
+
+    def test_render_iter_empty(self):
+        """Test incremental rendering of an empty list"""
+        chunks = FastJSONRenderer().render_iter([])
+
+        self.assertEqual(b''.join(chunks), b'[]')
+
+
+class ParserTests(SimpleTestCase):
+    """Test FastJSONParser"""
+
+    def test_parse(self):
+        """Test parsing a JSON body"""
+        payload = {'title': 'Curry', 'tags': [{'name': 'Thai'}]}
+        stream = io.BytesIO(json.dumps(payload).encode())
+
+        self.assertEqual(FastJSONParser().parse(stream), payload)
+
+    def test_parse_error(self):
+        """Test invalid JSON raises ParseError"""
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(io.BytesIO(b'{"title": '))
+
+    @override_settings(JSON_BACKEND='stdlib')
+    def test_parse_stdlib_fallback(self):
+        """Test parsing with the stdlib backend"""
+        stream = io.BytesIO(b'{"title": "Curry"}')
+
+        self.assertEqual(FastJSONParser().parse(stream), {'title': 'Curry'})
@@ -0,0 +1,73 @@
+"""
+Tests for the static files storage
+"""
+import gzip
+import os
+import tempfile
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from core import storage
+
+
+CSS = b'body { color: #123456; }\n' * 100
+
+
+class StaticStorageTests(SimpleTestCase):
+    """Test collectstatic writes hashed and precompressed files"""
+
+    def setUp(self):
+        source = tempfile.TemporaryDirectory()
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(source.cleanup)
+        self.addCleanup(root.cleanup)
+        self.root = root.name
+        with open(os.path.join(source.name, 'site.css'), 'wb') as f:
+            f.write(CSS)
+        with open(os.path.join(source.name, 'tiny.js'), 'wb') as f:
+            f.write(b'var a;')
+
+        settings = override_settings(
+            STATIC_ROOT=self.root,
+            STATICFILES_DIRS=[source.name],
+            STATICFILES_FINDERS=[
+                'django.contrib.staticfiles.finders.FileSystemFinder',
+            ],
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_unhashed_without_manifest(self):
+        """Test files keep their names until a manifest is written"""
+        self.assertEqual(staticfiles_storage.url('site.css'),
+                         '/static/static/site.css')
+
+    def test_collectstatic_hashes_and_compresses(self):
+        """Test hashed names and gzip copies of compressible files"""
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+        storage_ = storage.CompressedManifestStaticFilesStorage()
+        hashed = storage_.stored_name('site.css')
+        self.assertRegex(hashed, r'^site\.[0-9a-f]{12}\.css$')
+        with gzip.open(os.path.join(self.root, hashed + '.gz')) as f:
+            self.assertEqual(f.read(), CSS)
+        self.assertTrue(
+            os.path.exists(os.path.join(self.root, 'site.css.gz')),
+        )
+        # Too small to be worth compressing.
+        self.assertFalse(os.path.exists(
+            os.path.join(self.root, storage_.stored_name('tiny.js') + '.gz'),
+        ))
+
+    def test_up_to_date_copies_skipped(self):
+        """Test files already compressed are not compressed again"""
+        path = os.path.join(self.root, 'site.css')
+        with open(path, 'wb') as f:
+            f.write(CSS)
+
+        self.assertEqual(storage.compress_file(path), [
+            suffix for suffix, _ in storage.compressors()
+        ])
+        self.assertEqual(storage.compress_file(path), [])
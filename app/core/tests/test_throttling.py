@@ -0,0 +1,101 @@
+"""
+Tests for the token bucket throttles
+"""
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.throttling import (
+    TokenBucketThrottle,
+    UserTokenBucketThrottle,
+)
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+RATES = {
+    'user': '100/min',
+    'recipes': '3/min',
+    'tags': '100/min',
+    'ingredients': '100/min',
+    'upload-image': '1/min',
+}
+
+
+@patch.object(TokenBucketThrottle, 'THROTTLE_RATES', RATES)
+class ThrottleTests(TestCase):
+    """Test token bucket throttling of the API"""
+
+    def setUp(self):
+        caches['throttle'].clear()
+        self.addCleanup(caches['throttle'].clear)
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_endpoint_bucket_exhausted(self):
+        """Test requests beyond the bucket size are rejected"""
+        for _ in range(3):
+            res = self.client.get(RECIPES_URL)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', res)
+
+    def test_buckets_per_user(self):
+        """Test one user exhausting a bucket does not affect others"""
+        for _ in range(4):
+            self.client.get(RECIPES_URL)
+        other = get_user_model().objects.create_user(
+            email='other@example.com',
+            password='testpass123',
+        )
+        self.client.force_authenticate(other)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_filters_cost_more(self):
+        """Test filtered requests take extra tokens"""
+        res = self.client.get(RECIPES_URL, {'tags': '1', 'ingredients': '1'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.get(RECIPES_URL, {'tags': '1'})
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_bucket_refills(self):
+        """Test tokens refill over time"""
+        with patch.object(TokenBucketThrottle, 'timer') as timer:
+            timer.return_value = 1000.0
+            for _ in range(4):
+                self.client.get(RECIPES_URL)
+
+            timer.return_value = 1020.0
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_user_bucket_wait(self):
+        """Test the wait time until the next token"""
+        throttle = UserTokenBucketThrottle()
+        throttle.rate = '2/min'
+        throttle.num_requests, throttle.duration = 2, 60
+        request = RequestFactory().get('/')
+        request.user = self.user
+
+        self.assertTrue(throttle.allow_request(request, None))
+        self.assertTrue(throttle.allow_request(request, None))
+        self.assertFalse(throttle.allow_request(request, None))
+        self.assertGreater(throttle.wait(), 0)
+        self.assertLessEqual(throttle.wait(), 30)
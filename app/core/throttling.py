@@ -0,0 +1,79 @@
+"""
+Token bucket throttles with state shared across worker processes
+"""
+from django.core.cache import caches
+
+from rest_framework.throttling import SimpleRateThrottle
+
+from core.cache import cache_lock
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    Token bucket throttle stored in the `throttle` cache.
+
+    The bucket holds up to `num_requests` tokens and refills over
+    `duration` seconds. Views may define `get_throttle_cost(request)` to
+    charge expensive requests more than one token.
+    """
+    cache = caches['throttle']
+    wait_time = None
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def get_cost(self, request, view):
+        get_cost = getattr(view, 'get_throttle_cost', None)
+        cost = get_cost(request) if get_cost is not None else 1
+        return min(max(cost, 1), self.num_requests)
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        capacity = self.num_requests
+        refill = self.num_requests / self.duration
+        cost = self.get_cost(request, view)
+        now = self.timer()
+        with cache_lock(self.cache):
+            tokens, stamp = self.cache.get(self.key, (capacity, now))
+            tokens = min(capacity, tokens + (now - stamp) * refill)
+            if tokens < cost:
+                self.wait_time = (cost - tokens) / refill
+                return False
+            self.cache.set(self.key, (tokens - cost, now), self.duration)
+        return True
+
+    def wait(self):
+        return self.wait_time
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """Throttle each user, or each client address when anonymous"""
+    scope = 'user'
+
+
+class EndpointTokenBucketThrottle(TokenBucketThrottle):
+    """Throttle each user per endpoint named by the view's throttle_scope"""
+    scope_attr = 'throttle_scope'
+
+    def __init__(self):
+        # The rate depends on the view, so it is resolved per request.
+        pass
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, self.scope_attr, None)
+        if not self.scope:
+            return True
+
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
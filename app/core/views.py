@@ -0,0 +1,94 @@
+"""
+Views for operating the app
+"""
+import mimetypes
+import posixpath
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse
+from drf_spectacular.utils import extend_schema, OpenApiTypes
+from rest_framework import generics
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core import serializers
+from core.authentication import TokenAuthentication
+from core.batch import run_batch
+from core.jobs import queue_depth
+from core.models import Recipe
+
+
+class JobMetricsView(APIView):
+    """Report the depth and lag of the job queue to staff"""
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(responses=OpenApiTypes.OBJECT)
+    def get(self, request):
+        return Response(queue_depth())
+
+
+class BatchView(generics.GenericAPIView):
+    """Run several API calls as the authenticated user in one request"""
+    serializer_class = serializers.BatchRequestSerializer
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(responses=serializers.BatchResponseSerializer)
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        responses, rolled_back = run_batch(
+            request,
+            serializer.validated_data['requests'],
+            serializer.validated_data['atomic'],
+        )
+        return Response({
+            'responses': responses,
+            'rolled_back': rolled_back,
+        })
+
+
+def media_response(path, content_type=None):
+    """Return a response sending a file from MEDIA_ROOT
+
+    Behind the proxy the response only names the file in an
+    X-Accel-Redirect header and nginx sends it from an internal location.
+    """
+    content_type = content_type or mimetypes.guess_type(path)[0]
+    if not settings.MEDIA_ACCEL_PREFIX:
+        try:
+            response = FileResponse(
+                default_storage.open(path, 'rb'),
+                content_type=content_type,
+            )
+        except FileNotFoundError:
+            raise Http404
+    else:
+        response = HttpResponse(
+            content_type=content_type or 'application/octet-stream',
+        )
+        response['X-Accel-Redirect'] = (
+            settings.MEDIA_ACCEL_PREFIX + quote(path)
+        )
+    response['Cache-Control'] = 'private, max-age=86400'
+    return response
+
+
+class MediaView(APIView):
+    """Send a recipe image to the owner of the recipe"""
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(responses={(200, 'image/*'): OpenApiTypes.BINARY})
+    def get(self, request, path):
+        if posixpath.normpath(path) != path or path.startswith('/'):
+            raise Http404
+        owned = Recipe.objects.filter(user=request.user, image=path)
+        if not owned.exists():
+            raise Http404
+
+        return media_response(path)
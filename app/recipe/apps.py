@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class RecipeConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipe'
+
+    def ready(self):
+        from recipe import (  # noqa: F401
+            duplicates,
+            nutrition,
+            pantry,
+            similarity,
+        )
@@ -0,0 +1,370 @@
+"""
+Near-duplicate recipes found with MinHash and locality-sensitive hashing.
+
+A recipe is reduced to a set of shingles: runs of SHINGLE_WORDS words of
+its title and description, and its ingredients' normalized names. Its
+MinHash signature keeps, for each of NUM_PERM hash functions, the
+smallest hash of any shingle, so the share of equal signature entries of
+two recipes estimates the Jaccard similarity of their shingle sets. The
+hash functions are multiply-shift hashes evaluated for all shingles of a
+batch of recipes in one NumPy expression.
+
+Signatures are cut into BANDS bands of ROWS entries and each band is
+hashed to a bucket, stored in SignatureBand. Recipes sharing any bucket
+are candidates, so finding duplicates only compares recipes that landed
+together instead of all pairs; with 16 bands of 8 rows, pairs above a
+similarity of about 0.7 are very likely to share a bucket. Candidates
+are then checked against their full signatures.
+
+Signatures are recomputed after commit for recipes created or edited, so
+a new recipe is checked against the others without reindexing them.
+"""
+import re
+import zlib
+from collections import defaultdict
+
+import numpy as np
+
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_save
+from django.dispatch import receiver
+
+from core.deferred import CommitBatch
+from core.models import (
+    Recipe,
+    Ingredient,
+    RecipeIngredient,
+    RecipeSignature,
+    SignatureBand,
+)
+from core.names import name_key
+from core.parallel import for_each_user
+
+
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_WORDS = 2
+# Pairs taken from one bucket; larger buckets only hold common text.
+MAX_BUCKET = 50
+# Shingles hashed at once, bounding the (shingles, NUM_PERM) matrix.
+CHUNK_SHINGLES = 8192
+
+WORD = re.compile(r'\w+')
+
+_random = np.random.default_rng(0x5eed)
+MULTIPLIERS = _random.integers(
+    0, 2 ** 64, NUM_PERM, dtype=np.uint64,
+) | np.uint64(1)
+OFFSETS = _random.integers(0, 2 ** 64, NUM_PERM, dtype=np.uint64)
+BAND_MULTIPLIERS = _random.integers(
+    0, 2 ** 64, ROWS, dtype=np.uint64,
+) | np.uint64(1)
+
+
+def shingles(title, description='', ingredients=()):
+    """Return the set of shingles of a recipe's text"""
+    words = WORD.findall(name_key(f'{title} {description}'))
+    result = {
+        ' '.join(words[start:start + SHINGLE_WORDS])
+        for start in range(max(len(words) - SHINGLE_WORDS + 1, 1))
+    } if words else set()
+    result.update(f'ingredient:{name}' for name in ingredients)
+    return result
+
+
+def hash_shingles(items):
+    """Return 32-bit hashes of shingles"""
+    return np.fromiter(
+        (zlib.crc32(item.encode()) for item in items),
+        dtype=np.uint64,
+        count=len(items),
+    )
+
+
+def signatures(hashes):
+    """Return the (documents, NUM_PERM) MinHash signatures of hash arrays
+
+    Every array must be non-empty.
+    """
+    result = np.empty((len(hashes), NUM_PERM), dtype=np.uint32)
+    start = 0
+    while start < len(hashes):
+        stop, size = start, 0
+        while stop < len(hashes) and (stop == start
+                                      or size < CHUNK_SHINGLES):
+            size += len(hashes[stop])
+            stop += 1
+        chunk = hashes[start:stop]
+        values = np.concatenate(chunk)[:, None]
+        # Multiply-shift hashing: wraps modulo 2**64, keeps the high bits.
+        permuted = (values * MULTIPLIERS + OFFSETS) >> np.uint64(32)
+        bounds = np.cumsum([0] + [len(h) for h in chunk[:-1]])
+        result[start:stop] = np.minimum.reduceat(permuted, bounds, axis=0)
+        start = stop
+    return result
+
+
+def band_buckets(signatures):
+    """Return the (documents, BANDS) bucket of each band of signatures"""
+    bands = signatures.reshape(len(signatures), BANDS, ROWS)
+    keys = (bands.astype(np.uint64) * BAND_MULTIPLIERS).sum(
+        axis=2,
+        dtype=np.uint64,
+    )
+    return keys.view(np.int64)
+
+
+def similarity(left, right):
+    """Return the estimated Jaccard similarity of rows of signatures"""
+    return (left == right).mean(axis=-1)
+
+
+def _to_array(minhash):
+    return np.frombuffer(bytes(minhash), dtype='<u4')
+
+
+def _documents(user_id, recipe_ids, using):
+    recipes = Recipe.objects.using(using).filter(user_id=user_id)
+    relations = RecipeIngredient.objects.using(using).filter(user_id=user_id)
+    if recipe_ids is not None:
+        recipes = recipes.filter(id__in=recipe_ids)
+        relations = relations.filter(recipe_id__in=recipe_ids)
+    names = defaultdict(list)
+    for recipe_id, name in relations.values_list(
+        'recipe_id', 'ingredient__normalized_name',
+    ):
+        names[recipe_id].append(name)
+    ids, hashes = [], []
+    for pk, title, description in recipes.values_list(
+        'id', 'title', 'description',
+    ).order_by('id'):
+        items = shingles(title, description, names[pk])
+        if items:
+            ids.append(pk)
+            hashes.append(hash_shingles(items))
+    return ids, hashes
+
+
+def index(user_id, recipe_ids=None, using='default', batch_size=1000):
+    """(Re)compute signatures of a user's recipes, or some of them
+
+    Recipes no longer live lose their signature. Returns how many recipes
+    were indexed.
+    """
+    ids, hashes = _documents(user_id, recipe_ids, using)
+    minhashes = signatures(hashes)
+    buckets = band_buckets(minhashes)
+    with transaction.atomic(using=using):
+        for model in (SignatureBand, RecipeSignature):
+            stale = model.objects.using(using).filter(user_id=user_id)
+            if recipe_ids is not None:
+                stale = stale.filter(recipe_id__in=recipe_ids)
+            stale.delete()
+        RecipeSignature.objects.using(using).bulk_create(
+            [
+                RecipeSignature(
+                    recipe_id=pk,
+                    user_id=user_id,
+                    minhash=minhash.astype('<u4').tobytes(),
+                )
+                for pk, minhash in zip(ids, minhashes)
+            ],
+            batch_size=batch_size,
+        )
+        SignatureBand.objects.using(using).bulk_create(
+            [
+                SignatureBand(
+                    user_id=user_id,
+                    recipe_id=pk,
+                    band=band,
+                    bucket=int(bucket),
+                )
+                for pk, row in zip(ids, buckets)
+                for band, bucket in enumerate(row)
+            ],
+            batch_size=batch_size,
+        )
+    return len(ids)
+
+
+def index_all(user_ids, workers=4, chunk_size=100, log=None):
+    """Recompute the signatures of every recipe of the given users"""
+    return sum(for_each_user(
+        index,
+        user_ids,
+        workers=workers,
+        chunk_size=chunk_size,
+        log=log,
+    ))
+
+
+def _signatures(recipe_ids, using):
+    rows = RecipeSignature.objects.using(using).filter(
+        recipe_id__in=recipe_ids,
+    ).values_list('recipe_id', 'minhash')
+    return {pk: _to_array(minhash) for pk, minhash in rows}
+
+
+def _live_bands(user_id, using):
+    return SignatureBand.objects.using(using).filter(
+        user_id=user_id,
+        recipe_id__in=Recipe.objects.using(using).filter(
+            user_id=user_id,
+        ).values('id'),
+    )
+
+
+def duplicate_pairs(user_id, threshold, limit=None, using='default'):
+    """Return (recipe id, duplicate id, similarity) for a user's recipes
+
+    Pairs are ordered most similar first, each pair once with the older
+    recipe first.
+    """
+    rows = np.array(
+        list(_live_bands(user_id, using).values_list(
+            'band', 'bucket', 'recipe_id',
+        )),
+        dtype=np.int64,
+    ).reshape(-1, 3)
+    rows = rows[np.lexsort((rows[:, 2], rows[:, 1], rows[:, 0]))]
+    starts = np.flatnonzero(np.r_[
+        True,
+        (rows[1:, 0] != rows[:-1, 0]) | (rows[1:, 1] != rows[:-1, 1]),
+    ]) if len(rows) else np.zeros(0, dtype=np.int64)
+    sizes = np.diff(np.r_[starts, len(rows)])
+
+    pairs = []
+    for start, size in zip(starts[sizes > 1], sizes[sizes > 1]):
+        members = rows[start:start + min(size, MAX_BUCKET), 2]
+        left, right = np.triu_indices(len(members), k=1)
+        pairs.append(np.column_stack([members[left], members[right]]))
+    if not pairs:
+        return []
+    pairs = np.unique(np.concatenate(pairs), axis=0)
+
+    found = _signatures(set(pairs.ravel().tolist()), using)
+    if not found:
+        return []
+    order = sorted(found)
+    position = {pk: number for number, pk in enumerate(order)}
+    matrix = np.stack([found[pk] for pk in order])
+    pairs = pairs[[
+        a in position and b in position for a, b in pairs.tolist()
+    ]]
+    scores = similarity(
+        matrix[[position[a] for a in pairs[:, 0].tolist()]],
+        matrix[[position[b] for b in pairs[:, 1].tolist()]],
+    )
+    keep = scores >= threshold
+    result = sorted(
+        zip(pairs[keep, 0].tolist(), pairs[keep, 1].tolist(),
+            scores[keep].tolist()),
+        key=lambda pair: (-pair[2], pair[0], pair[1]),
+    )
+    return result[:limit]
+
+
+def duplicates_of(recipe, threshold, limit=None, using='default'):
+    """Return (recipe id, similarity) of the duplicates of one recipe
+
+    A recipe not indexed yet is indexed first.
+    """
+    found = _signatures([recipe.pk], using)
+    if recipe.pk not in found:
+        index(recipe.user_id, [recipe.pk], using)
+        found = _signatures([recipe.pk], using)
+        if recipe.pk not in found:
+            return []
+    buckets = SignatureBand.objects.using(using).filter(
+        recipe_id=recipe.pk,
+    ).values_list('band', 'bucket')
+    matches = Q()
+    for band, bucket in buckets:
+        matches |= Q(band=band, bucket=bucket)
+    candidates = set(
+        _live_bands(recipe.user_id, using).filter(matches).exclude(
+            recipe_id=recipe.pk,
+        ).values_list('recipe_id', flat=True)
+    )
+    others = _signatures(candidates, using)
+    if not others:
+        return []
+    ids = sorted(others)
+    scores = similarity(
+        found[recipe.pk],
+        np.stack([others[pk] for pk in ids]),
+    )
+    result = sorted(
+        (
+            (pk, score)
+            for pk, score in zip(ids, scores.tolist())
+            if score >= threshold
+        ),
+        key=lambda match: (-match[1], match[0]),
+    )
+    return result[:limit]
+
+
+def _flush(pending, using):
+    for user_id, recipe_ids in pending.items():
+        index(user_id, recipe_ids, using)
+
+
+_pending = CommitBatch(_flush)
+
+
+def index_on_commit(user_id, recipe_ids, using='default'):
+    """Reindex some recipes once the transaction commits"""
+    recipe_ids = set(recipe_ids)
+    if recipe_ids:
+        _pending.add(user_id, recipe_ids, using)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, using, raw=False, update_fields=None,
+                 **kwargs):
+    """Reindex recipes created or given a new title or description"""
+    if raw:
+        return
+    if update_fields is not None and not {
+        'title', 'description',
+    } & set(update_fields):
+        return
+    index_on_commit(instance.user_id, [instance.pk], using)
+
+
+@receiver(m2m_changed, sender=RecipeIngredient)
+def ingredients_changed(sender, instance, action, reverse, pk_set, using,
+                        **kwargs):
+    """Reindex recipes whose ingredients were changed"""
+    if action == 'pre_clear' and reverse:
+        instance._duplicates_cleared = list(
+            RecipeIngredient.objects.using(using).filter(
+                ingredient_id=instance.pk,
+            ).values_list('recipe_id', flat=True)
+        )
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            recipe_ids = [instance.pk]
+        elif action == 'post_clear':
+            recipe_ids = instance.__dict__.pop('_duplicates_cleared', [])
+        else:
+            recipe_ids = pk_set
+        index_on_commit(instance.user_id, recipe_ids, using)
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(sender, instance, created, using, raw=False,
+                     **kwargs):
+    """Reindex the recipes of a renamed ingredient"""
+    if created or raw:
+        return
+    index_on_commit(
+        instance.user_id,
+        RecipeIngredient.objects.using(using).filter(
+            ingredient_id=instance.pk,
+        ).values_list('recipe_id', flat=True),
+        using,
+    )
@@ -0,0 +1,69 @@
+"""
+Read-only fast path for the recipe list endpoints.
+
+Builds plain dicts straight from `.values()` rows instead of instantiating
+a ModelSerializer per object. The output matches RecipeSerializer,
+TagSerializer and IngredientSerializer field for field.
+"""
+from collections import defaultdict
+
+from core.models import Recipe
+from core.prepared import prepared
+from recipe import serializers
+
+
+NESTED_FIELDS = ('tags', 'ingredients')
+RECIPE_FIELDS = [
+    field for field in serializers.RecipeSerializer.Meta.fields
+    if field not in NESTED_FIELDS
+]
+
+_price_field = serializers.RecipeSerializer().fields['price']
+
+
+def serialize_names(queryset, statement=None):
+    """Serialize a tag or ingredient queryset to a list of dicts"""
+    with prepared(statement):
+        return list(queryset.values('id', 'name'))
+
+
+def _group_related(through, related_field, recipe_ids):
+    """Group related id/name dicts per recipe from one through-table query"""
+    rows = through.objects.filter(
+        recipe_id__in=recipe_ids,
+    ).order_by('id').values_list(
+        'recipe_id',
+        f'{related_field}_id',
+        f'{related_field}__name',
+    )
+    grouped = defaultdict(list)
+    for recipe_id, related_id, name in rows:
+        grouped[recipe_id].append({'id': related_id, 'name': name})
+    return grouped
+
+
+def serialize_recipes(queryset, statement=None):
+    """Serialize a recipe queryset to a list of dicts
+
+    Only the recipe rows are fetched under the prepared statement name;
+    the tag and ingredient lookups vary with the number of recipes.
+    """
+    with prepared(statement):
+        rows = list(queryset.values(*RECIPE_FIELDS))
+    recipe_ids = [row['id'] for row in rows]
+    tags = _group_related(Recipe.tags.through, 'tag', recipe_ids)
+    ingredients = _group_related(
+        Recipe.ingredients.through,
+        'ingredient',
+        recipe_ids,
+    )
+
+    to_price = _price_field.to_representation
+    data = []
+    for row in rows:
+        recipe_id = row['id']
+        row['price'] = to_price(row['price'])
+        row['tags'] = tags.get(recipe_id, [])
+        row['ingredients'] = ingredients.get(recipe_id, [])
+        data.append(row)
+    return data
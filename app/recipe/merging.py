@@ -0,0 +1,134 @@
+"""
+Merging of duplicate tags and ingredients.
+
+Items of one user whose names normalize to the same key (see core.names)
+are merged into the oldest of them. Recipe rows pointing at the
+duplicates are repointed with one INSERT ... SELECT ... ON CONFLICT DO
+NOTHING and one DELETE per batch, which also folds a recipe using two
+duplicates into a single row, before the duplicates themselves are
+deleted. A kept ingredient without a nutrient profile takes one of its
+duplicates' profiles.
+
+The raw statements send no signals, so the work their receivers would do
+is started here: sync stamps, change events, nutrition totals, duplicate
+signatures and dashboards. Similarity indexes follow the sync stamps.
+"""
+from django.db import connections, transaction
+from django.db.models import Count, Min
+
+from core import events, sync
+from core.dashboard import build_dashboard
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+    RecipeTag,
+    RecipeIngredient,
+    UserDashboard,
+)
+from core.parallel import for_each_user
+from recipe.duplicates import index_on_commit
+from recipe.nutrition import merge_profiles, recompute_on_commit
+from recipe.pantry import touch_ingredients
+
+
+MERGE_MODELS = {
+    Tag: (RecipeTag, 'tag_id'),
+    Ingredient: (RecipeIngredient, 'ingredient_id'),
+}
+
+
+def duplicate_map(model, user_id, using='default'):
+    """Return {duplicate id: id kept} for one user's tags or ingredients"""
+    items = model.objects.using(using).filter(user_id=user_id)
+    keep = dict(
+        items.values('normalized_name').annotate(
+            keep=Min('id'),
+            total=Count('id'),
+        ).filter(total__gt=1).values_list('normalized_name', 'keep')
+    )
+    if not keep:
+        return {}
+    rows = items.filter(
+        normalized_name__in=keep,
+    ).values_list('id', 'normalized_name')
+    return {pk: keep[name] for pk, name in rows if pk != keep[name]}
+
+
+def _repoint(cursor, model, mapping):
+    """Move recipe rows from duplicates to the items kept"""
+    through, column = MERGE_MODELS[model]
+    quote = cursor.db.ops.quote_name
+    table, column = quote(through._meta.db_table), quote(column)
+    model_table = quote(model._meta.db_table)
+    duplicates = list(mapping)
+    placeholders = ', '.join(['%s'] * len(duplicates))
+    cases = ' '.join(['WHEN %s THEN %s'] * len(duplicates))
+
+    cursor.execute(
+        f'INSERT INTO {table} (user_id, recipe_id, {column}) '
+        f'SELECT DISTINCT user_id, recipe_id, CASE {column} {cases} END '
+        f'FROM {table} WHERE {column} IN ({placeholders}) '
+        f'ON CONFLICT DO NOTHING',
+        [value for pair in mapping.items() for value in pair] + duplicates,
+    )
+    cursor.execute(
+        f'DELETE FROM {table} WHERE {column} IN ({placeholders})',
+        duplicates,
+    )
+    cursor.execute(
+        f'DELETE FROM {model_table} WHERE id IN ({placeholders})',
+        duplicates,
+    )
+
+
+def merge_duplicates(user_id, models=tuple(MERGE_MODELS), batch_size=500,
+                     using='default'):
+    """Merge a user's duplicate tags and ingredients; return how many"""
+    merged = 0
+    for model in models:
+        through, column = MERGE_MODELS[model]
+        pairs = sorted(duplicate_map(model, user_id, using).items())
+        for start in range(0, len(pairs), batch_size):
+            mapping = dict(pairs[start:start + batch_size])
+            with transaction.atomic(using=using):
+                recipe_ids = list(
+                    through.objects.using(using).filter(**{
+                        f'{column}__in': mapping,
+                    }).values_list('recipe_id', flat=True).distinct()
+                )
+                if model is Ingredient:
+                    merge_profiles(mapping, using)
+                with connections[using].cursor() as cursor:
+                    _repoint(cursor, model, mapping)
+                sync.touch(Recipe, user_id, recipe_ids, using)
+                sync.record_deletes(model, user_id, mapping, using)
+                for pk in mapping:
+                    events.publish(user_id, events.KINDS[model], pk,
+                                   'deleted', using)
+                for pk in recipe_ids:
+                    events.publish(user_id, 'recipe', pk, 'saved', using)
+                if model is Ingredient:
+                    recompute_on_commit(user_id, recipe_ids, using)
+                    index_on_commit(user_id, recipe_ids, using)
+                    touch_ingredients(user_id, using)
+            merged += len(mapping)
+
+    # The statements above skip the signals keeping dashboards current.
+    if merged and UserDashboard.objects.using(using).filter(
+        user_id=user_id,
+    ).exists():
+        build_dashboard(user_id, using)
+    return merged
+
+
+def merge_all(user_ids, models=tuple(MERGE_MODELS), batch_size=500,
+              workers=4, using='default', log=None):
+    """Merge duplicates for many users in parallel; return how many"""
+    return sum(for_each_user(
+        lambda user_id: merge_duplicates(user_id, models, batch_size, using),
+        user_ids,
+        workers=workers,
+        using=using,
+        log=log,
+    ))
@@ -0,0 +1,289 @@
+"""
+Nutrient totals of recipes.
+
+An ingredient's nutrient profile (IngredientNutrition) holds the
+nutrients of as much of it as one recipe uses, since recipes list their
+ingredients without quantities. Users type the values in or copy them
+from the shared catalog (NutrientProfile). A recipe's totals are the sum
+over its ingredients, which for many recipes at once is the product of
+the sparse recipe x ingredient matrix of the m2m rows and the dense
+ingredient x nutrient matrix of the profiles. The sparse matrix is kept
+as its coordinate arrays and each nutrient column of the product is one
+weighted `bincount` over them, so the cost grows with the m2m rows
+rather than recipes x ingredients.
+
+Totals are stored in RecipeNutrition and recomputed after commit for
+just the recipes whose ingredients, or whose ingredients' profiles,
+changed.
+"""
+from collections import defaultdict
+
+import numpy as np
+
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core import jobs, sync
+from core.deferred import CommitBatch
+from core.models import (
+    NUTRIENTS,
+    Recipe,
+    Ingredient,
+    RecipeIngredient,
+    IngredientNutrition,
+    NutrientProfile,
+    RecipeNutrition,
+)
+from core.parallel import for_each_user
+
+
+def _lookup(ids, keys):
+    """Return positions of ids in sorted keys, and which were found"""
+    positions = np.searchsorted(keys, ids)
+    positions[positions == len(keys)] = 0
+    found = keys[positions] == ids if len(keys) else np.zeros(
+        len(ids), dtype=bool,
+    )
+    return positions, found
+
+
+def compute(user_id, recipe_ids=None, using='default'):
+    """Return (recipe ids, totals) for a user's recipes, or some of them
+
+    totals has one row per recipe and one column per nutrient, in the
+    order of NUTRIENTS.
+    """
+    recipes = Recipe.objects.using(using).filter(user_id=user_id)
+    rows = RecipeIngredient.objects.using(using).filter(user_id=user_id)
+    if recipe_ids is not None:
+        recipes = recipes.filter(id__in=recipe_ids)
+        rows = rows.filter(recipe_id__in=recipe_ids)
+    ids = np.sort(np.fromiter(
+        recipes.values_list('id', flat=True),
+        dtype=np.int64,
+    ))
+    pairs = np.array(
+        list(rows.values_list('recipe_id', 'ingredient_id')),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+
+    recipe_pos, live = _lookup(pairs[:, 0], ids)
+    recipe_pos, ingredient_ids = recipe_pos[live], pairs[live, 1]
+
+    profiles = IngredientNutrition.objects.using(using).filter(
+        user_id=user_id,
+    )
+    if recipe_ids is not None:
+        profiles = profiles.filter(ingredient_id__in=set(ingredient_ids))
+    profile_rows = sorted(profiles.values_list('ingredient_id', *NUTRIENTS))
+    profile_ids = np.array([row[0] for row in profile_rows], dtype=np.int64)
+    # One extra row of zeros for ingredients without a profile.
+    nutrients = np.zeros((len(profile_rows) + 1, len(NUTRIENTS)))
+    if profile_rows:
+        nutrients[:-1] = [row[1:] for row in profile_rows]
+    ingredient_pos, has_profile = _lookup(ingredient_ids, profile_ids)
+    ingredient_pos[~has_profile] = len(profile_rows)
+
+    contributions = nutrients[ingredient_pos]
+    totals = np.column_stack([
+        np.bincount(
+            recipe_pos,
+            weights=contributions[:, column],
+            minlength=len(ids),
+        )
+        for column in range(len(NUTRIENTS))
+    ]) if len(ids) else np.zeros((0, len(NUTRIENTS)))
+    return ids, totals
+
+
+def store(user_id, recipe_ids, totals, using='default', batch_size=1000):
+    """Write computed totals to RecipeNutrition; return the ids changed
+
+    Rows whose totals are unchanged are left alone.
+    """
+    changed = []
+    for start in range(0, len(recipe_ids), batch_size):
+        chunk = [int(pk) for pk in recipe_ids[start:start + batch_size]]
+        existing = {
+            row[0]: row[1:]
+            for row in RecipeNutrition.objects.using(using).filter(
+                recipe_id__in=chunk,
+            ).values_list('recipe_id', *NUTRIENTS)
+        }
+        updates, creates = [], []
+        now = timezone.now()
+        for pk, values in zip(chunk, totals[start:start + batch_size]):
+            values = tuple(round(float(value), 4) for value in values)
+            if existing.get(pk) == values:
+                continue
+            row = RecipeNutrition(
+                recipe_id=pk,
+                user_id=user_id,
+                updated_at=now,
+                **dict(zip(NUTRIENTS, values)),
+            )
+            (updates if pk in existing else creates).append(row)
+            changed.append(pk)
+        RecipeNutrition.objects.using(using).bulk_update(
+            updates,
+            [*NUTRIENTS, 'updated_at'],
+        )
+        RecipeNutrition.objects.using(using).bulk_create(creates)
+    return changed
+
+
+def recompute(user_id, recipe_ids=None, using='default'):
+    """Recompute and store totals; return how many recipes changed
+
+    Recipes whose totals changed are marked for clients to sync.
+    """
+    with transaction.atomic(using=using):
+        ids, totals = compute(user_id, recipe_ids, using)
+        changed = store(user_id, ids, totals, using)
+        sync.touch(Recipe, user_id, changed, using)
+    return len(changed)
+
+
+def rebuild_nutrition(user_ids, workers=4, chunk_size=100, log=None):
+    """Recompute the totals of every recipe of the given users"""
+    return sum(for_each_user(
+        recompute,
+        user_ids,
+        workers=workers,
+        chunk_size=chunk_size,
+        log=log,
+    ))
+
+
+def _flush(pending, using):
+    for user_id, recipe_ids in pending.items():
+        recompute(user_id, recipe_ids, using)
+
+
+_pending = CommitBatch(_flush)
+
+
+def recompute_on_commit(user_id, recipe_ids, using='default'):
+    """Recompute some recipes' totals once the transaction commits
+
+    Recipes changed several times in one transaction are recomputed once.
+    """
+    recipe_ids = set(recipe_ids)
+    if recipe_ids:
+        _pending.add(user_id, recipe_ids, using)
+
+
+def _recipes_using(ingredient_ids, using):
+    return RecipeIngredient.objects.using(using).filter(
+        ingredient_id__in=ingredient_ids,
+    ).values_list('recipe_id', flat=True)
+
+
+def copy_profile(profile):
+    """Copy a catalog entry's values to the ingredients using it
+
+    Returns {user id: ingredient ids} of the ingredients updated.
+    """
+    linked = IngredientNutrition.objects.filter(profile=profile)
+    changed = defaultdict(list)
+    for ingredient_id, user_id in linked.values_list(
+        'ingredient_id', 'user_id',
+    ):
+        changed[user_id].append(ingredient_id)
+    linked.update(**{name: getattr(profile, name) for name in NUTRIENTS})
+    return changed
+
+
+def merge_profiles(mapping, using='default'):
+    """Keep a profile for ingredients merged into others (see merging)
+
+    An ingredient kept without a profile takes one of its duplicates'.
+    """
+    profiles = IngredientNutrition.objects.using(using).filter(
+        ingredient_id__in=mapping,
+    )
+    kept = set(
+        IngredientNutrition.objects.using(using).filter(
+            ingredient_id__in=set(mapping.values()),
+        ).values_list('ingredient_id', flat=True)
+    )
+    for profile in profiles.order_by('ingredient_id'):
+        target = mapping[profile.ingredient_id]
+        if target not in kept:
+            IngredientNutrition.objects.using(using).create(
+                ingredient_id=target,
+                user_id=profile.user_id,
+                profile_id=profile.profile_id,
+                **{name: getattr(profile, name) for name in NUTRIENTS},
+            )
+            kept.add(target)
+    profiles.delete()
+
+
+def apply_catalog(profile_id):
+    """Update the ingredients and recipes using a changed catalog entry"""
+    profile = NutrientProfile.objects.filter(pk=profile_id).first()
+    if profile is None:
+        return
+    with transaction.atomic():
+        for user_id, ingredient_ids in copy_profile(profile).items():
+            recompute(user_id, set(_recipes_using(ingredient_ids, 'default')))
+
+
+@receiver(m2m_changed, sender=RecipeIngredient)
+def ingredients_changed(sender, instance, action, reverse, pk_set, using,
+                        **kwargs):
+    """Recompute recipes whose ingredients were changed"""
+    if action == 'pre_clear' and reverse:
+        instance._nutrition_cleared = list(
+            _recipes_using([instance.pk], using)
+        )
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            recipe_ids = [instance.pk]
+        elif action == 'post_clear':
+            recipe_ids = instance.__dict__.pop('_nutrition_cleared', [])
+        else:
+            recipe_ids = pk_set
+        recompute_on_commit(instance.user_id, recipe_ids, using)
+
+
+@receiver(post_save, sender=IngredientNutrition)
+@receiver(post_delete, sender=IngredientNutrition)
+def profile_changed(sender, instance, using, raw=False, **kwargs):
+    """Recompute recipes using an ingredient whose profile changed"""
+    if not raw:
+        recompute_on_commit(
+            instance.user_id,
+            _recipes_using([instance.ingredient_id], using),
+            using,
+        )
+
+
+@receiver(pre_delete, sender=Ingredient)
+def ingredient_deleting(sender, instance, using, **kwargs):
+    """Recompute recipes losing an ingredient that is being deleted"""
+    recompute_on_commit(
+        instance.user_id,
+        _recipes_using([instance.pk], using),
+        using,
+    )
+
+
+@receiver(post_save, sender=NutrientProfile)
+def catalog_changed(sender, instance, created, using, raw=False,
+                    **kwargs):
+    """Pass a changed catalog entry on to the ingredients using it"""
+    if not created and not raw:
+        jobs.enqueue(
+            'apply_catalog',
+            {'profile_id': instance.pk},
+            using=using,
+        )
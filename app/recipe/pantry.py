@@ -0,0 +1,138 @@
+"""
+"What can I cook" matching of recipes against a pantry of ingredients.
+
+Each user's recipes are held as an inverted index from ingredient id to
+the sorted array of recipe rows using it. Counting a pantry's hits per
+recipe is one `bincount` over the posting arrays of the pantry's
+ingredients, from which coverage and the number of missing ingredients
+follow for every recipe at once. The index is rebuilt lazily, whenever
+the user's `ingredients_seq` has moved on; the receivers below advance it
+on changes to recipe ingredients only, so edits such as a new title keep
+the index.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from django.conf import settings
+from django.db import router
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete
+from django.dispatch import receiver
+
+from core.models import (
+    ChangeSequence,
+    Recipe,
+    Ingredient,
+    RecipeIngredient,
+)
+from recipe.similarity import compress
+
+
+class PantryIndex:
+    """Inverted ingredient -> recipe index for one user"""
+
+    def __init__(self, recipe_ids, ingredient_ids, version=0):
+        self.version = version
+        self.recipe_ids, rows = np.unique(recipe_ids, return_inverse=True)
+        self.ingredients, cols = np.unique(ingredient_ids, return_inverse=True)
+        self.sizes = np.bincount(rows, minlength=len(self.recipe_ids))
+        self.indptr, self.postings = compress(
+            cols,
+            rows.astype(np.int32),
+            len(self.ingredients),
+        )
+
+    @classmethod
+    def from_database(cls, user_id, version=0):
+        rows = np.array(
+            list(
+                RecipeIngredient.objects.using(
+                    router.db_for_write(RecipeIngredient),
+                ).filter(user_id=user_id).values_list(
+                    'recipe_id',
+                    'ingredient_id',
+                )
+            ),
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        return cls(rows[:, 0], rows[:, 1], version)
+
+    def match(self, pantry, max_missing=2, limit=50):
+        """
+        Return (recipe id, coverage, missing count) for recipes missing
+        at most max_missing ingredients, fewest missing first.
+        """
+        pantry = np.unique(np.asarray(list(pantry), dtype=np.int64))
+        positions = np.searchsorted(self.ingredients, pantry)
+        found = positions < len(self.ingredients)
+        found[found] = self.ingredients[positions[found]] == pantry[found]
+        postings = [
+            self.postings[self.indptr[col]:self.indptr[col + 1]]
+            for col in positions[found]
+        ]
+        have = np.bincount(
+            np.concatenate(postings + [np.zeros(0, dtype=np.int32)]),
+            minlength=len(self.recipe_ids),
+        )
+        missing = self.sizes - have
+        rows = np.flatnonzero((have > 0) & (missing <= max_missing))
+        coverage = have[rows] / self.sizes[rows]
+        order = np.lexsort((self.recipe_ids[rows], -coverage, missing[rows]))
+        rows, coverage = rows[order][:limit], coverage[order][:limit]
+        return [
+            (int(self.recipe_ids[row]), float(share), int(missing[row]))
+            for row, share in zip(rows, coverage)
+        ]
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def current_version(user_id):
+    """Return the number of ingredient changes of a user's recipes"""
+    return ChangeSequence.objects.using(
+        router.db_for_write(ChangeSequence),
+    ).filter(user_id=user_id).values_list(
+        'ingredients_seq',
+        flat=True,
+    ).first() or 0
+
+
+def touch_ingredients(user_id, using='default'):
+    """Mark the ingredients of a user's recipes as changed"""
+    ChangeSequence.objects.using(using).filter(user_id=user_id).update(
+        ingredients_seq=F('ingredients_seq') + 1,
+    )
+
+
+def get_index(user_id):
+    """Return a user's pantry index, rebuilding it if ingredients changed"""
+    version = current_version(user_id)
+    with _indexes_lock:
+        index = _indexes.get(user_id)
+    if index is None or index.version != version:
+        index = PantryIndex.from_database(user_id, version)
+
+    with _indexes_lock:
+        _indexes[user_id] = index
+        _indexes.move_to_end(user_id)
+        while len(_indexes) > settings.PANTRY_INDEX_MAX_USERS:
+            _indexes.popitem(last=False)
+    return index
+
+
+@receiver(m2m_changed, sender=RecipeIngredient)
+def ingredients_changed(sender, instance, action, using, **kwargs):
+    """Move the index version on when recipe ingredients change"""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        touch_ingredients(instance.user_id, using)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Ingredient)
+def item_deleted(sender, instance, using, **kwargs):
+    """Move the index version on when deletes cascade to ingredient rows"""
+    touch_ingredients(instance.user_id, using)
@@ -2,13 +2,23 @@
 Serializers for Recipe APIs
 """
 
+from django.conf import settings
+from django.db import transaction
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 
+from core.dashboard import top_items
 from core.models import (
+    NUTRIENTS,
     Recipe,
     Tag,
     Ingredient,
+    UserDashboard,
+    NutrientProfile,
+    IngredientNutrition,
+    RecipeNutrition,
 )
+from core.names import name_key
 
 
 
@@ -29,6 +39,11 @@ class IngredientSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
+class MergeResultSerializer(serializers.Serializer):
+    """Serializer for the number of duplicates merged away"""
+    merged = serializers.IntegerField()
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     """Serializer for the recipes"""
 
@@ -49,26 +64,42 @@ class RecipeSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id']
 
+    def get_or_create_items(self, model, items):
+        """Return the user's items named in items, creating any missing
+
+        Names already stored are found with one query, and each name
+        counts once however it is spelled.
+        """
+        auth_user = self.context['request'].user
+        names = {}
+        for item in items:
+            names.setdefault(name_key(item['name']), item['name'])
+        found = {}
+        for obj in model.objects.filter(
+            user=auth_user,
+            normalized_name__in=names,
+        ).order_by('-id'):
+            found[obj.normalized_name] = obj
+        return [
+            found.get(key) or model.objects.create(user=auth_user, name=name)
+            for key, name in names.items()
+        ]
+
     def get_or_create_tags(self, tags, recipe):
         """Handle getting or creating tags as needed"""
-        auth_user = self.context['request'].user
-        for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(
-                user=auth_user,
-                **tag,
-            )
-            recipe.tags.add(tag_obj)
+        recipe.tags.add(
+            *self.get_or_create_items(Tag, tags),
+            through_defaults={'user': self.context['request'].user},
+        )
 
     def get_or_create_ingredients(self, ingredients, recipe):
         """Handle getting or creating ingredients as needed"""
-        auth_user = self.context['request'].user
-        for ingredient in ingredients:
-            ing_obj, created = Ingredient.objects.get_or_create(
-                user=auth_user,
-                **ingredient,
-            )
-            recipe.ingredients.add(ing_obj)
+        recipe.ingredients.add(
+            *self.get_or_create_items(Ingredient, ingredients),
+            through_defaults={'user': self.context['request'].user},
+        )
 
+    @transaction.atomic
     def create(self, validated_data):
         """Create a recipe"""
         tags = validated_data.pop('tags', [])
@@ -78,6 +109,7 @@ class RecipeSerializer(serializers.ModelSerializer):
         self.get_or_create_ingredients(ingredients=ingredients, recipe=recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """Update recipe"""
         tags = validated_data.pop('tags', None)
@@ -92,12 +124,120 @@ class RecipeSerializer(serializers.ModelSerializer):
             setattr(instance, attr, value)
         instance.save()
         return instance
+
+
+class SimilarRecipeSerializer(RecipeSerializer):
+    """Serializer for a recipe with its similarity score"""
+    score = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ['score']
+
+
+class DuplicateRecipeSerializer(RecipeSerializer):
+    """Serializer for a recipe with its estimated similarity"""
+    similarity = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ['similarity']
+
+
+class DuplicatePairSerializer(serializers.Serializer):
+    """Serializer for two recipes that are near duplicates"""
+    recipe = serializers.IntegerField()
+    duplicate = serializers.IntegerField()
+    similarity = serializers.FloatField()
+
+
+class PantryRecipeSerializer(RecipeSerializer):
+    """Serializer for a recipe matched against a pantry"""
+    coverage = serializers.FloatField(read_only=True)
+    missing_count = serializers.IntegerField(read_only=True)
+    missing_ingredients = IngredientSerializer(many=True, read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + [
+            'coverage',
+            'missing_count',
+            'missing_ingredients',
+        ]
+
+
+class ShoppingListRequestSerializer(serializers.Serializer):
+    """Serializer for the recipes planned in a shopping list"""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=10000,
+    )
+
+
+class ShoppingListItemSerializer(serializers.Serializer):
+    """Serializer for an ingredient on a shopping list"""
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    count = serializers.IntegerField()
+    recipes = serializers.ListField(child=serializers.IntegerField())
+
+
+class NutrientProfileSerializer(serializers.ModelSerializer):
+    """Serializer for an entry of the shared nutrient catalog"""
+
+    class Meta:
+        model = NutrientProfile
+        fields = ['id', 'name', *NUTRIENTS]
+        read_only_fields = fields
+
+
+class IngredientNutritionSerializer(serializers.ModelSerializer):
+    """Serializer for the nutrients of an ingredient, per recipe use
+
+    Values left out are copied from the catalog entry, if one is given,
+    and are zero otherwise.
+    """
+    catalog = serializers.PrimaryKeyRelatedField(
+        source='profile',
+        queryset=NutrientProfile.objects.all(),
+        allow_null=True,
+        required=False,
+    )
+
+    class Meta:
+        model = IngredientNutrition
+        fields = [*NUTRIENTS, 'catalog']
+        extra_kwargs = {name: {'required': False} for name in NUTRIENTS}
+
+    def validate(self, attrs):
+        profile = attrs.get('profile')
+        for name in NUTRIENTS:
+            if name not in attrs:
+                attrs[name] = getattr(profile, name) if profile else 0
+        return attrs
+
+
+class RecipeNutritionSerializer(serializers.ModelSerializer):
+    """Serializer for the nutrient totals of a recipe"""
+
+    class Meta:
+        model = RecipeNutrition
+        fields = list(NUTRIENTS)
+        read_only_fields = fields
+
+
+class RecipeNutritionRowSerializer(RecipeNutritionSerializer):
+    """Serializer for the nutrient totals of one of many recipes"""
+
+    class Meta(RecipeNutritionSerializer.Meta):
+        fields = ['recipe', *NUTRIENTS]
+        read_only_fields = fields
+
+
 class RecipeDetailSerializer(RecipeSerializer):
     """Serializer for recipe detail view."""
-
+    nutrition = RecipeNutritionSerializer(read_only=True)
 
     class Meta(RecipeSerializer.Meta):
-        fields = RecipeSerializer.Meta.fields + ['description']
+        fields = RecipeSerializer.Meta.fields + ['description', 'nutrition']
 
 
 class RecipeImageSerializer(serializers.ModelSerializer):
@@ -107,4 +247,100 @@ class RecipeImageSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = ['id', 'image']
         read_only_fields = ['id']
-        extra_kwargs = {'image' : {'required' : 'True'}}
\ No newline at end of file
+        extra_kwargs = {'image' : {'required' : 'True'}}
+
+
+class ImageVariantSerializer(serializers.Serializer):
+    """Query parameters choosing a resized recipe image"""
+    width = serializers.IntegerField(required=False)
+    height = serializers.IntegerField(required=False)
+    type = serializers.CharField(required=False, default='jpeg')
+    quality = serializers.IntegerField(required=False, default=75)
+
+    def _allowed(self, value, choices):
+        if value not in choices:
+            raise serializers.ValidationError(f'Must be one of {choices}.')
+        return value
+
+    def validate_width(self, value):
+        return self._allowed(value, settings.IMAGE_VARIANT_SIZES)
+
+    def validate_height(self, value):
+        return self._allowed(value, settings.IMAGE_VARIANT_SIZES)
+
+    def validate_type(self, value):
+        return self._allowed(value, settings.IMAGE_VARIANT_TYPES)
+
+    def validate_quality(self, value):
+        return self._allowed(value, settings.IMAGE_VARIANT_QUALITIES)
+
+    def validate(self, attrs):
+        if not attrs.get('width') and not attrs.get('height'):
+            raise serializers.ValidationError(
+                'A width or a height is required.'
+            )
+        return attrs
+
+
+class UsageSerializer(serializers.Serializer):
+    """Serializer for a most used tag or ingredient"""
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    count = serializers.IntegerField()
+
+
+class DashboardSerializer(serializers.ModelSerializer):
+    """Serializer for the user dashboard summary"""
+    most_used_tags = serializers.SerializerMethodField()
+    most_used_ingredients = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UserDashboard
+        fields = [
+            'recipe_count',
+            'tag_count',
+            'ingredient_count',
+            'most_used_tags',
+            'most_used_ingredients',
+        ]
+        read_only_fields = fields
+
+    @extend_schema_field(UsageSerializer(many=True))
+    def get_most_used_tags(self, obj):
+        return top_items(Tag, obj.pk, using=obj._state.db)
+
+    @extend_schema_field(UsageSerializer(many=True))
+    def get_most_used_ingredients(self, obj):
+        return top_items(Ingredient, obj.pk, using=obj._state.db)
+
+
+class SyncQuerySerializer(serializers.Serializer):
+    """Serializer for the cursor and page size of a sync request"""
+    since = serializers.IntegerField(min_value=0, default=0)
+    limit = serializers.IntegerField(
+        min_value=1,
+        max_value=1000,
+        default=settings.SYNC_PAGE_SIZE,
+    )
+
+
+class TombstoneSerializer(serializers.Serializer):
+    """Serializer for a deleted recipe, tag or ingredient"""
+    type = serializers.CharField()
+    id = serializers.IntegerField()
+
+
+class SyncSerializer(serializers.Serializer):
+    """Serializer for a page of changes since a sync cursor"""
+    recipes = RecipeDetailSerializer(many=True)
+    tags = TagSerializer(many=True)
+    ingredients = IngredientSerializer(many=True)
+    deleted = TombstoneSerializer(many=True)
+    cursor = serializers.IntegerField()
+    has_more = serializers.BooleanField()
+
+
+class StreamTicketSerializer(serializers.Serializer):
+    """Serializer for a ticket opening the event stream"""
+    ticket = serializers.CharField(source='key')
+    expires_at = serializers.DateTimeField()
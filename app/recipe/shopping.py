@@ -0,0 +1,54 @@
+"""
+Shopping lists merged across the ingredients of many recipes
+"""
+from collections import Counter
+from itertools import groupby
+
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db import connections
+
+from core.models import RecipeIngredient
+
+
+def shopping_list(user, recipe_ids):
+    """
+    Yield each ingredient used by the recipes once, with how many of the
+    recipes use it and which. Recipes listed more than once, such as a
+    meal planned twice in a week, count once per listing.
+    """
+    planned = Counter(recipe_ids)
+    queryset = RecipeIngredient.objects.filter(
+        user=user,
+        recipe_id__in=planned,
+    )
+
+    if connections[queryset.db].vendor == 'postgresql':
+        rows = queryset.values('ingredient_id', 'ingredient__name').annotate(
+            recipes=ArrayAgg('recipe_id', ordering='recipe_id'),
+        ).order_by('ingredient__name', 'ingredient_id').values_list(
+            'ingredient_id',
+            'ingredient__name',
+            'recipes',
+        )
+        groups = rows.iterator()
+    else:
+        rows = queryset.order_by(
+            'ingredient__name',
+            'ingredient_id',
+            'recipe_id',
+        ).values_list('ingredient_id', 'ingredient__name', 'recipe_id')
+        groups = (
+            (ingredient_id, name, [row[2] for row in group])
+            for (ingredient_id, name), group in groupby(
+                rows.iterator(),
+                key=lambda row: row[:2],
+            )
+        )
+
+    for ingredient_id, name, recipes in groups:
+        yield {
+            'id': ingredient_id,
+            'name': name,
+            'count': sum(planned[recipe_id] for recipe_id in recipes),
+            'recipes': recipes,
+        }
@@ -0,0 +1,275 @@
+"""
+In-memory per-user index of recipes for "recipes like this one".
+
+Each recipe is the set of its tags and ingredients, packed into NumPy
+arrays in compressed sparse form both ways round: recipe -> items and
+item -> recipes. Scoring one recipe against all others sums the posting
+lists of its items with a single `bincount`, which gives every
+intersection size at once, so Jaccard or cosine top-k costs time in
+proportion to the recipes actually sharing an item rather than to all
+pairs.
+
+Every process keeps its own indexes, versioned by the owner's change
+sequence (see core.sync), which moves on whenever any writer, signals or
+not, changes a recipe's tags or ingredients. Before answering, an index
+that is behind reloads just the recipes numbered since its version into
+a small overlay, compacting it into the arrays once it grows; an index
+too far behind is rebuilt. Indexes are never changed in place: a
+refreshed one replaces the old, so threads still reading the old one
+are unaffected.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from django.conf import settings
+from django.db import router
+
+from core.models import (
+    ChangeSequence,
+    Recipe,
+    RecipeTag,
+    RecipeIngredient,
+    Tombstone,
+)
+from core.sync import KINDS
+
+
+METRICS = ('jaccard', 'cosine')
+
+# Tag and ingredient ids share one item space: tags even, ingredients odd.
+RELATIONS = {
+    RecipeTag: ('tag_id', 0),
+    RecipeIngredient: ('ingredient_id', 1),
+}
+
+
+def _item_rows(user_id, recipe_ids=None):
+    """Return (recipe ids, item ids) arrays for a user's m2m rows"""
+    recipes, items = [], []
+    for through, (column, offset) in RELATIONS.items():
+        queryset = through.objects.using(
+            router.db_for_write(through),
+        ).filter(user_id=user_id)
+        if recipe_ids is not None:
+            queryset = queryset.filter(recipe_id__in=recipe_ids)
+        rows = np.array(
+            list(queryset.values_list('recipe_id', column)),
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        recipes.append(rows[:, 0])
+        items.append(rows[:, 1] * 2 + offset)
+    return np.concatenate(recipes), np.concatenate(items)
+
+
+def compress(keys, values, size):
+    """Group values by integer keys into (indptr, indices) arrays"""
+    order = np.argsort(keys, kind='stable')
+    indptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=size), out=indptr[1:])
+    return indptr, values[order]
+
+
+class SimilarityIndex:
+    """Sparse recipe/item incidence arrays for one user"""
+
+    def __init__(self, recipe_ids, item_ids, version=0):
+        self.version = version
+        self.recipe_ids, rows = np.unique(recipe_ids, return_inverse=True)
+        self.items, cols = np.unique(item_ids, return_inverse=True)
+        self.row_of = {
+            int(pk): row for row, pk in enumerate(self.recipe_ids)
+        }
+        self.sizes = np.bincount(
+            rows,
+            minlength=len(self.recipe_ids),
+        ).astype(np.float64)
+        self.row_indptr, self.row_cols = compress(
+            rows, cols, len(self.recipe_ids),
+        )
+        self.col_indptr, self.col_rows = compress(
+            cols, rows, len(self.items),
+        )
+        # Recipes changed since the arrays were built: id -> item set.
+        self.overlay = {}
+
+    @classmethod
+    def from_database(cls, user_id, version=0):
+        return cls(*_item_rows(user_id), version=version)
+
+    def items_of(self, recipe_id):
+        """Return the item ids of a recipe as a set"""
+        if recipe_id in self.overlay:
+            return self.overlay[recipe_id]
+        row = self.row_of.get(recipe_id)
+        if row is None:
+            return frozenset()
+        cols = self.row_cols[self.row_indptr[row]:self.row_indptr[row + 1]]
+        return frozenset(self.items[cols].tolist())
+
+    def updated(self, recipe_ids, item_pairs, version=None):
+        """Return a copy with the items of recipes replaced
+
+        item_pairs are (recipe id, item id); recipes without any are
+        left with no items.
+        """
+        changed = {int(pk): set() for pk in recipe_ids}
+        for recipe_id, item_id in item_pairs:
+            changed[int(recipe_id)].add(int(item_id))
+        index = object.__new__(SimilarityIndex)
+        index.__dict__.update(self.__dict__)
+        index.version = self.version if version is None else version
+        index.overlay = {
+            **self.overlay,
+            **{pk: frozenset(items) for pk, items in changed.items()},
+        }
+        if len(index.overlay) > max(256, len(index.recipe_ids) // 20):
+            return index.compacted()
+        return index
+
+    def compacted(self):
+        """Return a copy with the overlay folded into fresh arrays"""
+        keep = ~np.isin(
+            self.recipe_ids,
+            np.fromiter(self.overlay, dtype=np.int64),
+        )
+        rows = np.repeat(
+            np.arange(len(self.recipe_ids)),
+            np.diff(self.row_indptr),
+        )
+        base = keep[rows]
+        recipes = [self.recipe_ids[rows[base]]]
+        items = [self.items[self.row_cols[base]]]
+        for pk, item_set in self.overlay.items():
+            recipes.append(np.full(len(item_set), pk, dtype=np.int64))
+            items.append(np.fromiter(item_set, dtype=np.int64))
+        return SimilarityIndex(
+            np.concatenate(recipes),
+            np.concatenate(items),
+            self.version,
+        )
+
+    def _score(self, inter, query_size, sizes, metric):
+        if metric == 'cosine':
+            denominator = np.sqrt(query_size * sizes)
+        else:
+            denominator = query_size + sizes - inter
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(denominator > 0, inter / denominator, 0.0)
+
+    def similar(self, recipe_id, k=10, metric='jaccard'):
+        """Return up to k (recipe id, score) pairs most like a recipe"""
+        if metric not in METRICS:
+            raise ValueError(f'Unknown metric {metric!r}')
+        query = self.items_of(recipe_id)
+        if not query:
+            return []
+
+        query_items = np.fromiter(query, dtype=np.int64)
+        positions = np.searchsorted(self.items, query_items)
+        found = positions < len(self.items)
+        found[found] = self.items[positions[found]] == query_items[found]
+        postings = [
+            self.col_rows[self.col_indptr[col]:self.col_indptr[col + 1]]
+            for col in positions[found]
+        ]
+        inter = np.bincount(
+            np.concatenate(postings + [np.zeros(0, dtype=np.int64)]),
+            minlength=len(self.recipe_ids),
+        ).astype(np.float64)
+        scores = self._score(inter, len(query), self.sizes, metric)
+
+        ids = self.recipe_ids
+        if self.overlay:
+            stale = np.isin(ids, np.fromiter(self.overlay, dtype=np.int64))
+            scores[stale] = 0.0
+            extra_ids = np.fromiter(self.overlay, dtype=np.int64)
+            extra_inter = np.array(
+                [len(query & items) for items in self.overlay.values()],
+                dtype=np.float64,
+            )
+            extra_sizes = np.array(
+                [len(items) for items in self.overlay.values()],
+                dtype=np.float64,
+            )
+            ids = np.concatenate([ids, extra_ids])
+            scores = np.concatenate([scores, self._score(
+                extra_inter, len(query), extra_sizes, metric,
+            )])
+
+        scores[ids == recipe_id] = 0.0
+        k = min(k, int(np.count_nonzero(scores)))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.lexsort((ids[top], -scores[top]))]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def current_version(user_id):
+    """Return (last change number, horizon) of a user's change sequence"""
+    return ChangeSequence.objects.using(
+        router.db_for_write(ChangeSequence),
+    ).filter(user_id=user_id).values_list(
+        'last_seq',
+        'horizon',
+    ).first() or (0, 0)
+
+
+def changed_recipes(user_id, since):
+    """Return (ids of recipes changed, ids removed) after number since"""
+    using = router.db_for_write(Recipe)
+    changed, removed = set(), set()
+    for pk, deleted_at in Recipe.all_objects.using(using).filter(
+        user_id=user_id,
+        sync_seq__gt=since,
+    ).values_list('id', 'deleted_at'):
+        (changed if deleted_at is None else removed).add(pk)
+    removed.update(Tombstone.objects.using(using).filter(
+        user_id=user_id,
+        kind=KINDS[Recipe],
+        seq__gt=since,
+    ).values_list('object_id', flat=True))
+    return changed - removed, removed
+
+
+def get_index(user_id):
+    """Return the up to date similarity index of a user"""
+    # Read before the rows, so changes made meanwhile are loaded again.
+    version, horizon = current_version(user_id)
+    with _indexes_lock:
+        index = _indexes.get(user_id)
+        if index is not None:
+            _indexes.move_to_end(user_id)
+
+    if index is None or not horizon <= index.version <= version:
+        index = SimilarityIndex.from_database(user_id, version)
+    elif index.version < version:
+        changed, removed = changed_recipes(user_id, index.version)
+        if len(changed) + len(removed) > settings.SIMILAR_MAX_REFRESH:
+            index = SimilarityIndex.from_database(user_id, version)
+        else:
+            recipes, items = _item_rows(user_id, changed)
+            index = index.updated(
+                changed | removed,
+                zip(recipes.tolist(), items.tolist()),
+                version,
+            )
+
+    with _indexes_lock:
+        latest = _indexes.get(user_id)
+        if latest is None or latest.version <= index.version:
+            _indexes[user_id] = index
+        while len(_indexes) > settings.SIMILAR_INDEX_MAX_USERS:
+            _indexes.popitem(last=False)
+    return index
+
+
+def similar_recipes(recipe, k=10, metric='jaccard'):
+    """Return (recipe id, score) pairs most like a recipe"""
+    return get_index(recipe.user_id).similar(recipe.pk, k, metric)
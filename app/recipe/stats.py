@@ -0,0 +1,88 @@
+"""
+Database-side statistics for recipe querysets
+"""
+from decimal import Decimal
+
+from django.db.models import Avg, Count, Max, Min, Q
+
+
+PRICE_BUCKETS = [Decimal('5'), Decimal('10'), Decimal('20'), Decimal('50')]
+TIME_BUCKETS = [15, 30, 60, 120]
+
+CENTS = Decimal('0.01')
+
+
+def _bucket_ranges(edges):
+    """Return (lower, upper) pairs covering everything split at edges"""
+    bounds = [None, *edges, None]
+    return list(zip(bounds, bounds[1:]))
+
+
+def _bucket_filter(field, lower, upper):
+    """Return the condition for a value falling in [lower, upper)"""
+    condition = Q()
+    if lower is not None:
+        condition &= Q(**{f'{field}__gte': lower})
+    if upper is not None:
+        condition &= Q(**{f'{field}__lt': upper})
+    return condition
+
+
+def _price(value):
+    """Format a price the way RecipeSerializer does"""
+    if value is None:
+        return None
+    return str(Decimal(value).quantize(CENTS))
+
+
+def recipe_stats(queryset, price_edges=PRICE_BUCKETS,
+                 time_edges=TIME_BUCKETS):
+    """Return counts, min/max/avg and histograms in one aggregate query"""
+    histograms = {
+        'price': _bucket_ranges(price_edges),
+        'time_minutes': _bucket_ranges(time_edges),
+    }
+    aggregates = {
+        'count': Count('id'),
+        'price_min': Min('price'),
+        'price_max': Max('price'),
+        'price_avg': Avg('price'),
+        'time_min': Min('time_minutes'),
+        'time_max': Max('time_minutes'),
+        'time_avg': Avg('time_minutes'),
+    }
+    for field, ranges in histograms.items():
+        for index, (lower, upper) in enumerate(ranges):
+            aggregates[f'{field}_bucket_{index}'] = Count(
+                'id',
+                filter=_bucket_filter(field, lower, upper) or None,
+            )
+
+    row = queryset.order_by().aggregate(**aggregates)
+
+    def histogram(field, to_repr):
+        return [
+            {
+                'min': to_repr(lower),
+                'max': to_repr(upper),
+                'count': row[f'{field}_bucket_{index}'],
+            }
+            for index, (lower, upper) in enumerate(histograms[field])
+        ]
+
+    time_avg = row['time_avg']
+    return {
+        'count': row['count'],
+        'price': {
+            'min': _price(row['price_min']),
+            'max': _price(row['price_max']),
+            'avg': _price(row['price_avg']),
+            'histogram': histogram('price', _price),
+        },
+        'time_minutes': {
+            'min': row['time_min'],
+            'max': row['time_max'],
+            'avg': None if time_avg is None else round(float(time_avg), 1),
+            'histogram': histogram('time_minutes', lambda value: value),
+        },
+    }
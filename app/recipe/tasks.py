@@ -0,0 +1,12 @@
+"""
+Job queue tasks for recipe nutrition
+"""
+from core.jobs import task
+
+from recipe import nutrition
+
+
+@task('apply_catalog')
+def apply_catalog(profile_id):
+    """Pass a changed catalog entry on to ingredients and recipes"""
+    nutrition.apply_catalog(profile_id)
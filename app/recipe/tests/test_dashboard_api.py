@@ -0,0 +1,68 @@
+"""
+Tests for the dashboard API
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag
+
+
+DASHBOARD_URL = reverse('recipe:dashboard')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class PublicDashboardApiTests(TestCase):
+    """Test unauthenticated API requests"""
+
+    def test_auth_required(self):
+        """Test auth is required to read the dashboard"""
+        res = APIClient().get(DASHBOARD_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateDashboardApiTests(TestCase):
+    """Test authenticated API requests"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_dashboard_follows_api_writes(self):
+        """Test the dashboard reflects recipes created through the API"""
+        self.client.get(DASHBOARD_URL)
+        payload = {
+            'title': 'Curry',
+            'time_minutes': 30,
+            'price': Decimal('7.50'),
+            'tags': [{'name': 'Vegan'}, {'name': 'Spicy'}],
+            'ingredients': [{'name': 'Rice'}],
+        }
+        self.client.post(RECIPES_URL, payload, format='json')
+        payload['tags'] = [{'name': 'Vegan'}]
+        self.client.post(RECIPES_URL, payload, format='json')
+
+        # The summary row, then the most used tags and ingredients.
+        with self.assertNumQueries(3):
+            res = self.client.get(DASHBOARD_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        vegan = Tag.objects.get(user=self.user, name='Vegan')
+        self.assertEqual(res.data['recipe_count'], 2)
+        self.assertEqual(res.data['tag_count'], 2)
+        self.assertEqual(res.data['ingredient_count'], 1)
+        self.assertEqual(
+            res.data['most_used_tags'][0],
+            {'id': vegan.id, 'name': 'Vegan', 'count': 2},
+        )
+        self.assertEqual(res.data['most_used_ingredients'][0]['count'], 2)
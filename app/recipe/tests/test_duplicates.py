@@ -0,0 +1,221 @@
+"""
+Tests for near-duplicate recipe detection
+"""
+from decimal import Decimal
+from io import StringIO
+
+import numpy as np
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    Recipe,
+    Ingredient,
+    RecipeSignature,
+    SignatureBand,
+)
+from recipe import duplicates
+
+
+DUPLICATES_URL = reverse('recipe:recipe-duplicates')
+
+LASAGNE = (
+    'Classic beef lasagne',
+    'Layer pasta sheets with slow cooked beef ragu and a creamy bechamel '
+    'then bake until golden and bubbling on top',
+)
+
+
+def duplicates_of_url(recipe_id):
+    return reverse('recipe:recipe-duplicates-of', args=[recipe_id])
+
+
+def create_recipe(user, title, description='', ingredients=()):
+    recipe = Recipe.objects.create(
+        user=user,
+        title=title,
+        description=description,
+        time_minutes=10,
+        price=Decimal('5.00'),
+    )
+    recipe.ingredients.add(*ingredients)
+    return recipe
+
+
+class MinHashTests(SimpleTestCase):
+    """Test shingling and signatures"""
+
+    def test_shingles(self):
+        """Test word pairs are normalized and ingredients added"""
+        self.assertEqual(
+            duplicates.shingles('Tomato  SOUP', 'quick!', ['basil']),
+            {'tomato soup', 'soup quick', 'ingredient:basil'},
+        )
+        self.assertEqual(duplicates.shingles('Soup'), {'soup'})
+
+    def test_similarity_estimates_jaccard(self):
+        """Test equal signature entries track shared shingles"""
+        base = [f'word{number}' for number in range(200)]
+        hashes = [
+            duplicates.hash_shingles(base),
+            duplicates.hash_shingles(base[:150] + ['other'] * 50),
+            duplicates.hash_shingles([f'x{number}' for number in range(200)]),
+        ]
+        # A chunk smaller than one document must still work.
+        chunk = duplicates.CHUNK_SHINGLES
+        self.addCleanup(setattr, duplicates, 'CHUNK_SHINGLES', chunk)
+        duplicates.CHUNK_SHINGLES = 100
+
+        signatures = duplicates.signatures(hashes)
+
+        self.assertEqual(signatures.shape, (3, duplicates.NUM_PERM))
+        near = duplicates.similarity(signatures[0], signatures[1])
+        self.assertAlmostEqual(near, 150 / 201, delta=0.15)
+        self.assertLess(duplicates.similarity(signatures[0], signatures[2]),
+                        0.1)
+        buckets = duplicates.band_buckets(signatures)
+        self.assertEqual(buckets.shape, (3, duplicates.BANDS))
+        self.assertTrue(np.array_equal(
+            duplicates.band_buckets(signatures[:1]),
+            buckets[:1],
+        ))
+
+
+class DuplicateDetectionTests(TestCase):
+    """Test duplicates are indexed and found"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.beef = Ingredient.objects.create(user=self.user, name='Beef')
+        self.pasta = Ingredient.objects.create(user=self.user, name='Pasta')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.original = create_recipe(
+                self.user, *LASAGNE, [self.beef, self.pasta],
+            )
+            self.copy = create_recipe(
+                self.user, *LASAGNE, [self.pasta, self.beef],
+            )
+            self.other = create_recipe(
+                self.user,
+                'Green salad',
+                'Toss lettuce with lemon and olive oil',
+            )
+
+    def test_new_recipes_indexed(self):
+        """Test creating recipes stores their signatures and bands"""
+        self.assertEqual(RecipeSignature.objects.count(), 3)
+        self.assertEqual(
+            SignatureBand.objects.filter(recipe_id=self.copy.pk).count(),
+            duplicates.BANDS,
+        )
+
+    def test_pairs(self):
+        """Test identical recipes are paired and others left out"""
+        self.assertEqual(
+            duplicates.duplicate_pairs(self.user.pk, 0.7),
+            [(self.original.pk, self.copy.pk, 1.0)],
+        )
+
+    def test_edits_reindex(self):
+        """Test an edited recipe stops matching its old copy"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.copy.title = 'Green salad'
+            self.copy.description = 'Toss lettuce with lemon and olive oil'
+            self.copy.save()
+            self.copy.ingredients.clear()
+
+        self.assertEqual(
+            duplicates.duplicates_of(self.other, 0.7),
+            [(self.copy.pk, 1.0)],
+        )
+        self.assertEqual(duplicates.duplicates_of(self.original, 0.7), [])
+
+    def test_deleted_recipes_dropped(self):
+        """Test soft-deleted recipes are not reported"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.copy.soft_delete()
+
+        self.assertEqual(duplicates.duplicate_pairs(self.user.pk, 0.5), [])
+        self.assertFalse(
+            RecipeSignature.objects.filter(recipe_id=self.copy.pk).exists()
+        )
+
+    def test_unindexed_recipe_checked(self):
+        """Test a recipe missing its signature is indexed when checked"""
+        RecipeSignature.objects.filter(recipe_id=self.copy.pk).delete()
+        SignatureBand.objects.filter(recipe_id=self.copy.pk).delete()
+
+        self.assertEqual(
+            duplicates.duplicates_of(self.copy, 0.7),
+            [(self.original.pk, 1.0)],
+        )
+
+    def test_command(self):
+        """Test the batch command indexes and reports pairs"""
+        RecipeSignature.objects.all().delete()
+        SignatureBand.objects.all().delete()
+        out = StringIO()
+
+        call_command('index_duplicates', '--workers', '1', '--report', '0.9',
+                     stdout=out)
+
+        self.assertIn('Indexed 3 recipes', out.getvalue())
+        self.assertIn(f'{self.original.pk} ~ {self.copy.pk}', out.getvalue())
+
+
+class DuplicateApiTests(TestCase):
+    """Test the duplicate recipe actions"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_pairs(self):
+        """Test pairs of near duplicates are listed"""
+        with self.captureOnCommitCallbacks(execute=True):
+            first = create_recipe(self.user, *LASAGNE)
+            second = create_recipe(self.user, *LASAGNE)
+            create_recipe(self.user, 'Pancakes')
+
+        res = self.client.get(DUPLICATES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [
+            {'recipe': first.pk, 'duplicate': second.pk, 'similarity': 1.0},
+        ])
+
+    def test_duplicates_of_recipe(self):
+        """Test near duplicates of one recipe, excluding other users'"""
+        other = get_user_model().objects.create_user(
+            'other@example.com',
+            'testpass123',
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = create_recipe(self.user, *LASAGNE)
+            copy = create_recipe(self.user, *LASAGNE)
+            create_recipe(other, *LASAGNE)
+
+        res = self.client.get(duplicates_of_url(recipe.pk))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['id'] for row in res.data], [copy.pk])
+        self.assertEqual(res.data[0]['similarity'], 1.0)
+
+    def test_threshold_checked(self):
+        """Test thresholds LSH cannot serve are rejected"""
+        res = self.client.get(DUPLICATES_URL, {'threshold': '0.1'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
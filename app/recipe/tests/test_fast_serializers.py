@@ -0,0 +1,95 @@
+"""Tests for the read-only fast serializers"""
+
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+)
+from recipe import fast_serializers
+from recipe.serializers import (
+    RecipeSerializer,
+    TagSerializer,
+    IngredientSerializer,
+)
+
+
+def render(data):
+    """Render data to JSON bytes"""
+    return JSONRenderer().render(data)
+
+
+class FastSerializerTests(TestCase):
+    """Test fast serializers match the ModelSerializers"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+
+    def test_recipes_match_serializer(self):
+        """Test recipe output is byte-identical to RecipeSerializer"""
+        tag1 = Tag.objects.create(user=self.user, name='Vegan')
+        tag2 = Tag.objects.create(user=self.user, name='Dinner')
+        ing = Ingredient.objects.create(user=self.user, name='Salt')
+        r1 = Recipe.objects.create(
+            user=self.user,
+            title='Curry',
+            time_minutes=20,
+            price=Decimal('5.5'),
+            link='http://example.com/curry',
+        )
+        r1.tags.add(tag1, tag2)
+        r1.ingredients.add(ing)
+        Recipe.objects.create(
+            user=self.user,
+            title='Toast',
+            time_minutes=2,
+            price=Decimal('0.25'),
+        )
+
+        recipes = Recipe.objects.order_by('-id')
+        expected = RecipeSerializer(recipes, many=True).data
+
+        self.assertEqual(
+            render(fast_serializers.serialize_recipes(recipes)),
+            render(expected),
+        )
+
+    def test_names_match_serializer(self):
+        """Test tag and ingredient output matches their serializers"""
+        Tag.objects.create(user=self.user, name='Breakfast')
+        Tag.objects.create(user=self.user, name='Lunch')
+        Ingredient.objects.create(user=self.user, name='Pepper')
+
+        tags = Tag.objects.order_by('-name')
+        ingredients = Ingredient.objects.order_by('-name')
+
+        self.assertEqual(
+            render(fast_serializers.serialize_names(tags)),
+            render(TagSerializer(tags, many=True).data),
+        )
+        self.assertEqual(
+            render(fast_serializers.serialize_names(ingredients)),
+            render(IngredientSerializer(ingredients, many=True).data),
+        )
+
+    def test_recipes_query_count(self):
+        """Test nested tags and ingredients do not query per recipe"""
+        for i in range(5):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title=f'Recipe {i}',
+                time_minutes=i,
+                price=Decimal('1.00'),
+            )
+            recipe.tags.add(Tag.objects.create(user=self.user, name=f'T{i}'))
+
+        with self.assertNumQueries(3):
+            fast_serializers.serialize_recipes(Recipe.objects.all())
@@ -0,0 +1,172 @@
+"""
+Tests for merging duplicate tags and ingredients
+"""
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import events
+from core.dashboard import build_dashboard
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+    RecipeIngredient,
+    UserDashboard,
+    DashboardUsage,
+)
+from recipe.merging import merge_duplicates
+
+
+TAG_MERGE_URL = reverse('recipe:tag-merge-duplicates')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def create_user(email='user@example.com'):
+    return get_user_model().objects.create_user(email, 'testpass123')
+
+
+def create_recipe(user, tags=(), ingredients=()):
+    recipe = Recipe.objects.create(
+        user=user,
+        title='Sample recipe',
+        time_minutes=10,
+        price=Decimal('5.00'),
+    )
+    recipe.tags.add(*tags)
+    recipe.ingredients.add(*ingredients)
+    return recipe
+
+
+class MergeDuplicatesTests(TestCase):
+    """Test merging duplicates"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.salt, self.lower, self.upper = [
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ('Salt', 'salt ', 'SALT')
+        ]
+        self.pepper = Ingredient.objects.create(user=self.user, name='Pepper')
+
+    def test_merge_repoints_recipes(self):
+        """Test recipes keep one row for the surviving ingredient"""
+        both = create_recipe(self.user, ingredients=[self.salt, self.upper])
+        dupes = create_recipe(self.user, ingredients=[self.lower, self.upper])
+        other = create_recipe(self.user, ingredients=[self.pepper])
+        build_dashboard(self.user.pk)
+
+        merged = merge_duplicates(self.user.pk)
+
+        self.assertEqual(merged, 2)
+        self.assertEqual(
+            list(Ingredient.objects.order_by('id')),
+            [self.salt, self.pepper],
+        )
+        for recipe, expected in (
+            (both, [self.salt]),
+            (dupes, [self.salt]),
+            (other, [self.pepper]),
+        ):
+            self.assertEqual(list(recipe.ingredients.all()), expected)
+        self.assertEqual(RecipeIngredient.objects.count(), 3)
+        dashboard = UserDashboard.objects.get(user=self.user)
+        self.assertEqual(dashboard.ingredient_count, 2)
+        usage = DashboardUsage.objects.get(
+            kind='ingredient',
+            item_id=self.salt.id,
+        )
+        self.assertEqual((usage.name, usage.uses), ('Salt', 2))
+
+    def test_merge_announces_and_reindexes(self):
+        """Test the hooks skipped by the raw statements are run"""
+        recipe = create_recipe(self.user, ingredients=[self.lower])
+
+        with patch.object(events.LocalBroker, 'deliver') as deliver:
+            with patch('recipe.merging.index_on_commit') as index:
+                with self.captureOnCommitCallbacks(execute=True):
+                    merge_duplicates(self.user.pk)
+
+        published = [call.args for call in deliver.call_args_list]
+        for event in (
+            {'type': 'ingredient', 'id': self.lower.id, 'action': 'deleted'},
+            {'type': 'ingredient', 'id': self.upper.id, 'action': 'deleted'},
+            {'type': 'recipe', 'id': recipe.id, 'action': 'saved'},
+        ):
+            self.assertIn((self.user.pk, event), published)
+        index.assert_called_once_with(self.user.pk, [recipe.id], 'default')
+
+    def test_merge_is_per_user(self):
+        """Test other users' matching names are left alone"""
+        other = create_user('other@example.com')
+        Ingredient.objects.create(user=other, name='salt')
+
+        merge_duplicates(self.user.pk)
+
+        self.assertEqual(Ingredient.objects.filter(user=other).count(), 1)
+
+    def test_merge_in_batches(self):
+        """Test small batches merge everything"""
+        create_recipe(self.user, ingredients=[self.lower, self.upper])
+
+        merged = merge_duplicates(self.user.pk, batch_size=1)
+
+        self.assertEqual(merged, 2)
+        self.assertEqual(RecipeIngredient.objects.get().ingredient, self.salt)
+
+    def test_command(self):
+        """Test the command merges duplicates for every user"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        Tag.objects.create(user=self.user, name='vegan')
+
+        call_command('merge_duplicates', '--workers', '1', stdout=StringIO())
+
+        self.assertEqual(Ingredient.objects.count(), 2)
+        self.assertEqual(Tag.objects.count(), 1)
+
+
+class MergeDuplicatesApiTests(TestCase):
+    """Test the merge action and normalized matching on write"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_recipe_create_reuses_matching_tag(self):
+        """Test tags differing in case and spacing are not duplicated"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        payload = {
+            'title': 'Curry',
+            'time_minutes': 30,
+            'price': Decimal('7.50'),
+            'tags': [{'name': ' VEGAN'}, {'name': 'vegan '}],
+        }
+
+        res = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(list(Tag.objects.all()), [tag])
+        self.assertEqual(res.data['tags'], [{'id': tag.id, 'name': 'Vegan'}])
+
+    def test_merge_action(self):
+        """Test the action merges only the endpoint's model"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        Tag.objects.create(user=self.user, name='vegan')
+        Ingredient.objects.create(user=self.user, name='Salt')
+        Ingredient.objects.create(user=self.user, name='salt')
+
+        res = self.client.post(TAG_MERGE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {'merged': 1})
+        self.assertEqual(Tag.objects.count(), 1)
+        self.assertEqual(Ingredient.objects.count(), 2)
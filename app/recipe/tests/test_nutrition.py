@@ -0,0 +1,301 @@
+"""
+Tests for recipe nutrition totals
+"""
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import jobs
+from core.models import (
+    Recipe,
+    Ingredient,
+    IngredientNutrition,
+    NutrientProfile,
+    RecipeNutrition,
+)
+from recipe import nutrition
+from recipe.merging import merge_duplicates
+
+
+NUTRITION_URL = reverse('recipe:recipe-nutrition')
+CATALOG_URL = reverse('recipe:nutrient-catalog')
+
+
+def detail_url(recipe_id):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def ingredient_nutrition_url(ingredient_id):
+    return reverse('recipe:ingredient-nutrition', args=[ingredient_id])
+
+
+def create_recipe(user, ingredients=(), **params):
+    defaults = {
+        'title': 'Sample recipe',
+        'time_minutes': 10,
+        'price': Decimal('5.00'),
+    }
+    defaults.update(params)
+    recipe = Recipe.objects.create(user=user, **defaults)
+    recipe.ingredients.add(*ingredients)
+    return recipe
+
+
+def totals(recipe):
+    row = RecipeNutrition.objects.filter(recipe_id=recipe.pk).first()
+    return row and (row.energy_kcal, row.protein_g)
+
+
+class NutritionTests(TestCase):
+    """Test totals are computed and kept current"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.rice = Ingredient.objects.create(user=self.user, name='Rice')
+        self.beans = Ingredient.objects.create(user=self.user, name='Beans')
+        self.salt = Ingredient.objects.create(user=self.user, name='Salt')
+        for ingredient, kcal, protein in (
+            (self.rice, 200, 4),
+            (self.beans, 150, 9.5),
+        ):
+            IngredientNutrition.objects.create(
+                ingredient=ingredient,
+                user=self.user,
+                energy_kcal=kcal,
+                protein_g=protein,
+            )
+
+    def test_compute_sums_ingredient_profiles(self):
+        """Test totals add up the profiles of each recipe's ingredients"""
+        both = create_recipe(self.user, [self.rice, self.beans, self.salt])
+        rice = create_recipe(self.user, [self.rice])
+        empty = create_recipe(self.user)
+
+        ids, values = nutrition.compute(self.user.pk)
+
+        by_id = dict(zip(ids.tolist(), values.tolist()))
+        self.assertEqual(by_id[both.pk][:2], [350, 13.5])
+        self.assertEqual(by_id[rice.pk][:2], [200, 4])
+        self.assertEqual(by_id[empty.pk], [0] * len(nutrition.NUTRIENTS))
+
+    def test_updated_when_ingredients_change(self):
+        """Test adding and removing ingredients recomputes the recipe"""
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = create_recipe(self.user, [self.rice])
+        self.assertEqual(totals(recipe), (200, 4))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.ingredients.add(self.beans)
+        self.assertEqual(totals(recipe), (350, 13.5))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.beans.recipe_set.clear()
+        self.assertEqual(totals(recipe), (200, 4))
+
+    def test_rolled_back_change_not_recomputed(self):
+        """Test a rolled back change does not recompute at a later commit"""
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = create_recipe(self.user, [self.rice])
+        try:
+            with transaction.atomic():
+                recipe.ingredients.add(self.beans)
+                raise ValueError
+        except ValueError:
+            pass
+
+        with patch.object(nutrition, 'recompute') as recompute:
+            with self.captureOnCommitCallbacks(execute=True):
+                other = create_recipe(self.user, [self.beans])
+
+        recompute.assert_called_once_with(self.user.pk, {other.pk}, 'default')
+
+    def test_updated_when_profile_changes(self):
+        """Test changing an ingredient's profile recomputes its recipes"""
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = create_recipe(self.user, [self.rice, self.salt])
+            IngredientNutrition.objects.create(
+                ingredient=self.salt,
+                user=self.user,
+                energy_kcal=1,
+            )
+        self.assertEqual(totals(recipe), (201, 4))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rice.nutrition.delete()
+        self.assertEqual(totals(recipe), (1, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.salt.delete()
+        self.assertEqual(totals(recipe), (0, 0))
+
+    def test_catalog_changes_copied(self):
+        """Test editing a catalog entry updates ingredients linked to it"""
+        oats = NutrientProfile.objects.create(name='Oats', energy_kcal=380)
+        ingredient = Ingredient.objects.create(user=self.user, name='Oats')
+        IngredientNutrition.objects.create(
+            ingredient=ingredient,
+            user=self.user,
+            profile=oats,
+            energy_kcal=380,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = create_recipe(self.user, [ingredient])
+
+        oats.energy_kcal = 370
+        oats.save()
+        jobs.run_until_empty()
+
+        ingredient.nutrition.refresh_from_db()
+        self.assertEqual(ingredient.nutrition.energy_kcal, 370)
+        self.assertEqual(totals(recipe), (370, 0))
+
+    def test_merge_keeps_profile(self):
+        """Test a merged ingredient's profile moves to the one kept"""
+        plain = Ingredient.objects.create(user=self.user, name='Corn')
+        duplicate = Ingredient.objects.create(user=self.user, name='corn ')
+        IngredientNutrition.objects.create(
+            ingredient=duplicate,
+            user=self.user,
+            energy_kcal=90,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = create_recipe(self.user, [duplicate])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            merge_duplicates(self.user.pk, models=[Ingredient])
+
+        self.assertEqual(
+            IngredientNutrition.objects.get(ingredient=plain).energy_kcal,
+            90,
+        )
+        self.assertEqual(totals(recipe), (90, 0))
+
+    def test_rebuild(self):
+        """Test the rebuild fills in totals and skips unchanged rows"""
+        recipe = create_recipe(self.user, [self.rice])
+        RecipeNutrition.objects.all().delete()
+
+        self.assertEqual(
+            nutrition.rebuild_nutrition([self.user.pk], workers=1),
+            1,
+        )
+        self.assertEqual(totals(recipe), (200, 4))
+        self.assertEqual(
+            nutrition.rebuild_nutrition([self.user.pk], workers=1),
+            0,
+        )
+
+
+class NutritionApiTests(TestCase):
+    """Test the nutrition endpoints"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.ingredient = Ingredient.objects.create(
+            user=self.user,
+            name='Lentils',
+        )
+
+    def test_set_ingredient_nutrition_from_catalog(self):
+        """Test values left out are copied from the catalog entry"""
+        entry = NutrientProfile.objects.create(
+            name='Lentils',
+            energy_kcal=116,
+            protein_g=9,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = create_recipe(self.user, [self.ingredient])
+            res = self.client.put(
+                ingredient_nutrition_url(self.ingredient.pk),
+                {'catalog': entry.pk, 'protein_g': 8},
+                format='json',
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['energy_kcal'], 116)
+        self.assertEqual(res.data['protein_g'], 8)
+        self.assertEqual(res.data['catalog'], entry.pk)
+        res = self.client.get(detail_url(recipe.pk))
+        self.assertEqual(res.data['nutrition']['energy_kcal'], 116)
+
+    def test_negative_values_rejected(self):
+        """Test nutrients cannot be negative"""
+        res = self.client.put(
+            ingredient_nutrition_url(self.ingredient.pk),
+            {'fat_g': -1},
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_other_users_ingredient_not_found(self):
+        """Test other users' ingredients cannot be given nutrients"""
+        other = get_user_model().objects.create_user(
+            'other@example.com',
+            'testpass123',
+        )
+        ingredient = Ingredient.objects.create(user=other, name='Peas')
+
+        res = self.client.put(
+            ingredient_nutrition_url(ingredient.pk),
+            {'fat_g': 1},
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(IngredientNutrition.objects.exists())
+
+    def test_bulk_totals(self):
+        """Test totals of many recipes, filtered like the recipe list"""
+        IngredientNutrition.objects.create(
+            ingredient=self.ingredient,
+            user=self.user,
+            fiber_g=8,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            cheap = create_recipe(self.user, [self.ingredient])
+            dear = create_recipe(
+                self.user,
+                [self.ingredient],
+                price=Decimal('20.00'),
+            )
+
+        res = self.client.get(NUTRITION_URL, {'max_price': '10'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['recipe'] for row in res.data], [cheap.pk])
+        self.assertEqual(res.data[0]['fiber_g'], 8)
+
+        res = self.client.get(NUTRITION_URL, {'recipes': f'{dear.pk}'})
+        self.assertEqual([row['recipe'] for row in res.data], [dear.pk])
+
+    def test_detail_without_totals(self):
+        """Test recipes never computed have no nutrition"""
+        recipe = create_recipe(self.user)
+
+        res = self.client.get(detail_url(recipe.pk))
+
+        self.assertIsNone(res.data['nutrition'])
+
+    def test_catalog_search(self):
+        """Test the catalog is searched by name prefix"""
+        NutrientProfile.objects.create(name='Lentils, red')
+        NutrientProfile.objects.create(name='Rice')
+
+        res = self.client.get(CATALOG_URL, {'search': 'lent'})
+
+        self.assertEqual([row['name'] for row in res.data], ['Lentils, red'])
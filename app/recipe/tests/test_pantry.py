@@ -0,0 +1,157 @@
+"""
+Tests for pantry matching
+"""
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    Recipe,
+    Ingredient,
+)
+from recipe.pantry import PantryIndex
+
+
+PANTRY_URL = reverse('recipe:recipe-pantry')
+
+
+def create_recipe(user, ingredients, **params):
+    defaults = {
+        'title': 'Sample recipe',
+        'time_minutes': 10,
+        'price': Decimal('5.00'),
+    }
+    defaults.update(params)
+    recipe = Recipe.objects.create(user=user, **defaults)
+    recipe.ingredients.add(*ingredients)
+    return recipe
+
+
+def pantry_params(ingredients, **params):
+    params['ingredients'] = ','.join(str(i.id) for i in ingredients)
+    return params
+
+
+class PantryIndexTests(TestCase):
+    """Test the inverted ingredient index"""
+
+    def test_match(self):
+        """Test recipes rank by missing count, then coverage"""
+        index = PantryIndex(
+            [1, 1, 2, 2, 2, 3, 3, 3, 3, 4],
+            [10, 11, 10, 11, 12, 10, 12, 13, 14, 15],
+        )
+
+        self.assertEqual(
+            index.match([10, 11, 99], max_missing=2),
+            [(1, 1.0, 0), (2, 2 / 3, 1)],
+        )
+        self.assertEqual(
+            index.match([10, 12], max_missing=2),
+            [(2, 2 / 3, 1), (1, 0.5, 1), (3, 0.5, 2)],
+        )
+        self.assertEqual(index.match([10, 12], max_missing=1, limit=1),
+                         [(2, 2 / 3, 1)])
+        self.assertEqual(index.match([]), [])
+
+
+class PantryApiTests(TestCase):
+    """Test the pantry action"""
+
+    def setUp(self):
+        caches['throttle'].clear()
+        self.addCleanup(caches['throttle'].clear)
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.rice, self.beans, self.lime = [
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ('Rice', 'Beans', 'Lime')
+        ]
+
+    def test_pantry(self):
+        """Test full and partial matches with what is missing"""
+        full = create_recipe(self.user, [self.rice, self.beans])
+        partial = create_recipe(self.user, [self.rice, self.lime])
+        create_recipe(self.user, [self.lime])
+
+        res = self.client.get(
+            PANTRY_URL,
+            pantry_params([self.rice, self.beans]),
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['id'] for row in res.data],
+                         [full.id, partial.id])
+        self.assertEqual(res.data[0]['missing_count'], 0)
+        self.assertEqual(res.data[1]['coverage'], 0.5)
+        self.assertEqual(
+            res.data[1]['missing_ingredients'],
+            [{'id': self.lime.id, 'name': 'Lime'}],
+        )
+
+        res = self.client.get(
+            PANTRY_URL,
+            pantry_params([self.rice, self.beans], max_missing=0),
+        )
+        self.assertEqual([row['id'] for row in res.data], [full.id])
+
+    def test_index_rebuilt_after_change(self):
+        """Test the index picks up ingredients added later"""
+        recipe = create_recipe(self.user, [self.rice])
+        params = pantry_params([self.rice], max_missing=0)
+        self.client.get(PANTRY_URL, params)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.ingredients.add(self.lime)
+        res = self.client.get(PANTRY_URL, params)
+
+        self.assertEqual(res.data, [])
+
+    def test_index_kept_after_other_changes(self):
+        """Test edits leaving ingredients alone keep the index"""
+        recipe = create_recipe(self.user, [self.rice])
+        params = pantry_params([self.rice])
+        self.client.get(PANTRY_URL, params)
+
+        recipe.title = 'Rice bowl'
+        recipe.save()
+        recipe.tags.create(user=self.user, name='Quick')
+        with patch.object(PantryIndex, 'from_database') as rebuild:
+            self.client.get(PANTRY_URL, params)
+        self.assertFalse(rebuild.called)
+
+        for change in (
+            lambda: self.beans.recipe_set.add(recipe),
+            lambda: Ingredient.objects.filter(pk=self.lime.pk).delete(),
+            lambda: recipe.delete(),
+        ):
+            with patch.object(
+                PantryIndex,
+                'from_database',
+                wraps=PantryIndex.from_database,
+            ) as rebuild:
+                change()
+                self.client.get(PANTRY_URL, params)
+            self.assertTrue(rebuild.called)
+
+    def test_invalid_params(self):
+        """Test the pantry and bounds are validated"""
+        for params in (
+            {},
+            {'ingredients': 'a,b'},
+            pantry_params([self.rice], max_missing=-1),
+            pantry_params([self.rice], limit=0),
+        ):
+            res = self.client.get(PANTRY_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
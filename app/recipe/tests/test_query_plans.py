@@ -0,0 +1,93 @@
+"""
+Tests that the list endpoints' queries are served by indexes
+"""
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from core import benchmark, partitioning
+from recipe import fast_serializers, views
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Requires PostgreSQL')
+class QueryPlanTests(TestCase):
+    """Test hot queries never fall back to sequential scans or sorts
+
+    Sequential scans and sorts are priced out of the planner's reach, so
+    one still showing up in a plan means no index can serve the query.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = benchmark.create_user()
+        benchmark.seed_recipes(cls.user, 2000)
+        for _ in range(3):
+            benchmark.seed_recipes(benchmark.create_user(), 500)
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_sort = off')
+
+    def _queryset(self, viewset, params=None):
+        request = Request(APIRequestFactory().get('/', params or {}))
+        request.user = self.user
+        view = viewset(request=request, action='list', kwargs={})
+        return view.filter_queryset(view.get_queryset())
+
+    def hot_queries(self):
+        """Return the querysets the list endpoints run, by name"""
+        tag = self.user.tag_set.order_by('id').first()
+        ingredient = self.user.ingredient_set.order_by('id').first()
+        recipes = {
+            'recipes': {},
+            'recipes by tag': {'tags': f'{tag.pk}'},
+            'recipes by ingredient': {'ingredients': f'{ingredient.pk}'},
+        }
+        queries = {
+            name: self._queryset(views.RecipeViewSet, params).values(
+                *fast_serializers.RECIPE_FIELDS,
+            )
+            for name, params in recipes.items()
+        }
+        for name, viewset in (
+            ('tags', views.TagViewSet),
+            ('ingredients', views.IngredientViewSet),
+        ):
+            for params in ({}, {'assigned_only': '1'}):
+                queries[f'{name} {params}'] = self._queryset(
+                    viewset,
+                    params,
+                ).values('id', 'name')
+        return queries
+
+    def assertServedByIndexes(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        for name, queryset in self.hot_queries().items():
+            with self.subTest(query=name):
+                plan = benchmark.explain_plan(queryset)
+                self.assertEqual(
+                    benchmark.fallback_nodes(plan),
+                    [],
+                    f'{name}: {plan}',
+                )
+
+    def test_hot_queries_use_indexes(self):
+        """Test list queries read indexes in the order they return"""
+        self.assertServedByIndexes()
+
+    def test_partitioned_tables_use_indexes(self):
+        """Test the indexes still serve the queries once partitioned"""
+        partitioning.partition_tables(
+            connection,
+            partitions=4,
+            batch_size=1000,
+            log=lambda message: None,
+        )
+
+        self.assertServedByIndexes()
@@ -1,12 +1,14 @@
 """Tests for recipe APIs"""
 import tempfile
+import json
 import os
 
 from PIL import Image
 from decimal import Decimal
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 
 from rest_framework import status
@@ -24,6 +26,7 @@ from recipe.serializers import (
 )
 
 RECIPES_URL = reverse('recipe:recipe-list')
+RECIPE_STATS_URL = reverse('recipe:recipe-stats')
 
 def image_upload_url(recipe_id):
     """Create and return an image upload URL."""
@@ -84,6 +87,21 @@ class PrivateRecipeAPITests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data, serializer.data)
 
+    @override_settings(JSON_STREAM_THRESHOLD=2)
+    def test_retrieve_recipes_streamed(self):
+        """Test large recipe lists are rendered incrementally"""
+        create_recipe(user=self.user)
+        create_recipe(user=self.user)
+
+        res = self.client.get(RECIPES_URL)
+
+        recipes = Recipe.objects.all().order_by('-id')
+        serializer = RecipeSerializer(recipes, many=True)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        content = b''.join(res.streaming_content)
+        self.assertEqual(json.loads(content), serializer.data)
+
     def test_recipe_list_limited_to_user(self):
         """Test list of recipes is limited to authenticated user"""
         other_user = create_user(email='other@example.com', password='password123',)
@@ -288,6 +306,32 @@ class PrivateRecipeAPITests(TestCase):
             exists = ingredients.filter(name=ingredient['name'], user=self.user)
             self.assertTrue(exists)
 
+    def test_create_recipe_with_repeated_ingredient_names(self):
+        """Test names spelled differently share one ingredient"""
+        lemon = Ingredient.objects.create(name='Lemon', user=self.user)
+        payload = {
+            'title': 'Lemonade',
+            'time_minutes': 5,
+            'price': Decimal('1.50'),
+            'ingredients': [
+                {'name': 'lemon '},
+                {'name': 'LEMON'},
+                {'name': 'Sugar'},
+                {'name': 'sugar'},
+            ],
+        }
+
+        res = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(recipe.ingredients.count(), 2)
+        self.assertIn(lemon, recipe.ingredients.all())
+        self.assertEqual(
+            Ingredient.objects.filter(user=self.user).count(),
+            2,
+        )
+
     def test_update_recipe_with_new_ingredient(self):
         """Test adding an ingredient to existing recipe"""
         recipe = create_recipe(user = self.user)
@@ -347,6 +391,84 @@ class PrivateRecipeAPITests(TestCase):
         self.assertIn(s2.data, res.data)
         self.assertNotIn(s3.data, res.data)
 
+    def test_filter_by_price_and_time(self):
+        """Test filtering recipes by price and time ranges"""
+        r1 = create_recipe(
+            user=self.user, price=Decimal('4.00'), time_minutes=20,
+        )
+        r2 = create_recipe(
+            user=self.user, price=Decimal('12.00'), time_minutes=20,
+        )
+        r3 = create_recipe(
+            user=self.user, price=Decimal('4.00'), time_minutes=45,
+        )
+
+        params = {'max_price': '10', 'max_time': '30'}
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn(RecipeSerializer(r1).data, res.data)
+        self.assertNotIn(RecipeSerializer(r2).data, res.data)
+        self.assertNotIn(RecipeSerializer(r3).data, res.data)
+
+        params = {'min_price': '5', 'min_time': '10'}
+        res = self.client.get(RECIPES_URL, params)
+        self.assertEqual([r['id'] for r in res.data], [r2.id])
+
+    def test_filter_by_invalid_range(self):
+        """Test invalid range values return a bad request"""
+        res = self.client.get(RECIPES_URL, {'max_price': 'cheap'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('max_price', res.data)
+
+    def test_recipe_stats(self):
+        """Test recipe statistics are computed in one query"""
+        create_recipe(user=self.user, price=Decimal('4.00'), time_minutes=10)
+        create_recipe(user=self.user, price=Decimal('8.00'), time_minutes=40)
+        create_recipe(user=self.user, price=Decimal('60.00'), time_minutes=200)
+        other_user = create_user(email='other@example.com', password='pass123')
+        create_recipe(user=other_user, price=Decimal('1.00'))
+
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPE_STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['count'], 3)
+        price = res.data['price']
+        self.assertEqual(price['min'], '4.00')
+        self.assertEqual(price['max'], '60.00')
+        self.assertEqual(price['avg'], '24.00')
+        self.assertEqual(
+            [bucket['count'] for bucket in price['histogram']],
+            [1, 1, 0, 0, 1],
+        )
+        time_minutes = res.data['time_minutes']
+        self.assertEqual(time_minutes['min'], 10)
+        self.assertEqual(time_minutes['max'], 200)
+        self.assertEqual(
+            [bucket['count'] for bucket in time_minutes['histogram']],
+            [1, 0, 1, 0, 1],
+        )
+
+    def test_recipe_stats_filtered(self):
+        """Test statistics respect the recipe filters"""
+        create_recipe(user=self.user, price=Decimal('4.00'))
+        create_recipe(user=self.user, price=Decimal('40.00'))
+
+        res = self.client.get(RECIPE_STATS_URL, {'max_price': '10'})
+
+        self.assertEqual(res.data['count'], 1)
+        self.assertEqual(res.data['price']['max'], '4.00')
+
+    def test_recipe_stats_empty(self):
+        """Test statistics with no recipes"""
+        res = self.client.get(RECIPE_STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['count'], 0)
+        self.assertIsNone(res.data['price']['avg'])
+
 class ImageUploadTests(TestCase):
     """Tests for the image upload API"""
 
@@ -387,3 +509,66 @@ class ImageUploadTests(TestCase):
         res = self.client.post(url, payload, format='multipart')
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
+
+@override_settings(MEDIA_ACCEL_PREFIX='/protected-media/')
+class ImageVariantTests(TestCase):
+    """Tests for the resized image API"""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media = override_settings(MEDIA_ROOT=media_root.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.client = APIClient()
+        self.user = create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(user=self.user)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (300, 200)).save(image_file, format='JPEG')
+            image_file.seek(0)
+            self.client.post(
+                image_upload_url(self.recipe.id),
+                {'image': image_file},
+                format='multipart',
+            )
+        self.url = reverse('recipe:recipe-image', args=[self.recipe.id])
+
+    def test_variant_handed_to_proxy(self):
+        """Test a resized variant is made once and sent by the proxy"""
+        res = self.client.get(self.url, {'width': 128, 'type': 'webp'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'image/webp')
+        path = res['X-Accel-Redirect'][len('/protected-media/'):]
+        with Image.open(os.path.join(settings.MEDIA_ROOT, path)) as image:
+            self.assertEqual(image.size, (128, 85))
+
+        again = self.client.get(self.url, {'width': 128, 'type': 'webp'})
+        self.assertEqual(again['X-Accel-Redirect'], res['X-Accel-Redirect'])
+
+    def test_params_outside_allow_list_rejected(self):
+        """Test sizes, types and qualities must be allowed ones"""
+        for params in [
+            {'width': 100},
+            {'width': 128, 'type': 'gif'},
+            {'width': 128, 'quality': 100},
+            {},
+        ]:
+            res = self.client.get(self.url, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_other_users_recipe_not_found(self):
+        """Test variants of other users' recipes are not found"""
+        self.client.force_authenticate(create_user(
+            email='other@example.com',
+            password='testpass123',
+        ))
+
+        res = self.client.get(self.url, {'width': 128})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
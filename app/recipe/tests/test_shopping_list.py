@@ -0,0 +1,147 @@
+"""
+Tests for the shopping list action
+"""
+import json
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    Recipe,
+    Ingredient,
+)
+
+
+SHOPPING_LIST_URL = reverse('recipe:recipe-shopping-list')
+
+
+def create_recipe(user, ingredients):
+    recipe = Recipe.objects.create(
+        user=user,
+        title='Sample recipe',
+        time_minutes=10,
+        price=Decimal('5.00'),
+    )
+    recipe.ingredients.add(*ingredients)
+    return recipe
+
+
+class ShoppingListApiTests(TestCase):
+    """Test merging ingredients across recipes"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.rice, self.beans, self.lime = [
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ('Rice', 'Beans', 'Lime')
+        ]
+        self.bowl = create_recipe(self.user, [self.rice, self.beans])
+        self.salad = create_recipe(self.user, [self.beans, self.lime])
+
+    def expected(self):
+        return [
+            {
+                'id': self.beans.id,
+                'name': 'Beans',
+                'count': 3,
+                'recipes': [self.bowl.id, self.salad.id],
+            },
+            {
+                'id': self.lime.id,
+                'name': 'Lime',
+                'count': 1,
+                'recipes': [self.salad.id],
+            },
+            {
+                'id': self.rice.id,
+                'name': 'Rice',
+                'count': 2,
+                'recipes': [self.bowl.id],
+            },
+        ]
+
+    def test_get_shopping_list(self):
+        """Test a plan given as query parameter, with a repeated recipe"""
+        ids = f'{self.bowl.id},{self.salad.id},{self.bowl.id}'
+
+        with self.assertNumQueries(1):
+            res = self.client.get(SHOPPING_LIST_URL, {'recipes': ids})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json(), self.expected())
+
+    def test_post_shopping_list(self):
+        """Test a plan posted as a JSON list"""
+        payload = {'recipes': [self.bowl.id, self.salad.id, self.bowl.id]}
+
+        res = self.client.post(SHOPPING_LIST_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json(), self.expected())
+
+    @override_settings(JSON_STREAM_THRESHOLD=2)
+    def test_large_plan_streams(self):
+        """Test large plans are streamed"""
+        payload = {'recipes': [self.bowl.id, self.salad.id, self.bowl.id]}
+
+        res = self.client.post(SHOPPING_LIST_URL, payload, format='json')
+
+        self.assertTrue(res.streaming)
+        content = b''.join(res.streaming_content)
+        self.assertEqual(json.loads(content), self.expected())
+
+    def test_other_users_recipes_ignored(self):
+        """Test recipes of other users are left out"""
+        other = get_user_model().objects.create_user(
+            'other@example.com',
+            'testpass123',
+        )
+        recipe = create_recipe(
+            other,
+            [Ingredient.objects.create(user=other, name='Salt')],
+        )
+
+        res = self.client.get(SHOPPING_LIST_URL, {'recipes': recipe.id})
+
+        self.assertEqual(res.json(), [])
+
+    def test_invalid_plan(self):
+        """Test missing or malformed plans are rejected"""
+        res = self.client.get(SHOPPING_LIST_URL, {'recipes': '1,x'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            res.json(),
+            self.client.post(SHOPPING_LIST_URL, {'recipes': [1, 'x']},
+                             format='json').json(),
+        )
+
+        res = self.client.get(SHOPPING_LIST_URL)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.post(SHOPPING_LIST_URL, {'recipes': []},
+                               format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_plan_size_limited(self):
+        """Test plans given either way share one size limit"""
+        ids = [self.bowl.id] * 10001
+
+        res = self.client.get(
+            SHOPPING_LIST_URL,
+            {'recipes': ','.join(map(str, ids))},
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.post(SHOPPING_LIST_URL, {'recipes': ids},
+                               format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,176 @@
+"""
+Tests for similar-recipe recommendations
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+)
+from core import sync
+from recipe import similarity
+
+
+def similar_url(recipe_id):
+    return reverse('recipe:recipe-similar', args=[recipe_id])
+
+
+def create_recipe(user, tags=(), ingredients=(), **params):
+    defaults = {
+        'title': 'Sample recipe',
+        'time_minutes': 10,
+        'price': Decimal('5.00'),
+    }
+    defaults.update(params)
+    recipe = Recipe.objects.create(user=user, **defaults)
+    recipe.tags.add(*tags)
+    recipe.ingredients.add(*ingredients)
+    return recipe
+
+
+class SimilarityIndexTests(TestCase):
+    """Test the in-memory similarity index"""
+
+    def test_jaccard_and_cosine(self):
+        """Test scores against sets computed by hand"""
+        index = similarity.SimilarityIndex(
+            [1, 1, 1, 2, 2, 3, 3, 3, 3, 4],
+            [10, 11, 12, 10, 11, 10, 11, 12, 13, 99],
+        )
+
+        self.assertEqual(
+            index.similar(1, k=5),
+            [(3, 0.75), (2, 2 / 3)],
+        )
+        cosine = dict(index.similar(1, k=5, metric='cosine'))
+        self.assertAlmostEqual(cosine[2], 2 / (3 * 2) ** 0.5)
+        self.assertEqual(index.similar(1, k=1), [(3, 0.75)])
+        self.assertEqual(index.similar(404), [])
+        with self.assertRaises(ValueError):
+            index.similar(1, metric='euclid')
+
+    def test_overlay_and_compact(self):
+        """Test updates are reflected before and after compaction"""
+        original = similarity.SimilarityIndex(
+            [1, 1, 2, 3],
+            [10, 11, 10, 12],
+        )
+
+        index = original.updated([3, 5], [(3, 10), (3, 11), (5, 11)])
+        index = index.updated([2], [], version=7)
+        expected = [(3, 1.0), (5, 0.5)]
+        self.assertEqual(index.similar(1), expected)
+        self.assertEqual(index.version, 7)
+        # Readers of the original never see the changes.
+        self.assertEqual(original.overlay, {})
+        self.assertEqual(original.similar(1), [(2, 0.5)])
+
+        index = index.compacted()
+        self.assertEqual(index.overlay, {})
+        self.assertEqual(index.similar(1), expected)
+
+
+class SimilarRecipesApiTests(TestCase):
+    """Test the similar recipes action"""
+
+    def setUp(self):
+        self.addCleanup(similarity._indexes.clear)
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.tags = [
+            Tag.objects.create(user=self.user, name=f'Tag {i}')
+            for i in range(3)
+        ]
+        self.salt = Ingredient.objects.create(user=self.user, name='Salt')
+
+    def test_similar_recipes(self):
+        """Test recipes are ranked by shared tags and ingredients"""
+        recipe = create_recipe(self.user, self.tags, [self.salt])
+        close = create_recipe(self.user, self.tags[:2], [self.salt])
+        far = create_recipe(self.user, self.tags[2:])
+        create_recipe(self.user)
+
+        res = self.client.get(similar_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['id'] for row in res.data], [close.id, far.id])
+        self.assertEqual(res.data[0]['score'], 0.75)
+        self.assertEqual(len(res.data[0]['tags']), 2)
+
+    def test_index_follows_changes(self):
+        """Test m2m changes after the index is built are picked up"""
+        recipe = create_recipe(self.user, self.tags)
+        other = create_recipe(self.user, self.tags[:1])
+        self.client.get(similar_url(recipe.id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other.tags.add(*self.tags[1:])
+        res = self.client.get(similar_url(recipe.id))
+        self.assertEqual(res.data[0]['score'], 1.0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tags[0].recipe_set.clear()
+        res = self.client.get(similar_url(recipe.id))
+        self.assertEqual(res.data[0]['score'], 1.0)
+        self.assertEqual(
+            similarity.get_index(self.user.id).items_of(other.id),
+            similarity.get_index(self.user.id).items_of(recipe.id),
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        res = self.client.get(similar_url(recipe.id))
+        self.assertEqual(res.data, [])
+
+    def test_index_follows_writes_without_signals(self):
+        """Test changes made by other processes' raw writes are picked up"""
+        recipe = create_recipe(self.user, self.tags)
+        other = create_recipe(self.user, self.tags[:1])
+        gone = create_recipe(self.user, self.tags)
+        self.client.get(similar_url(recipe.id))
+
+        # As the merge command and reaper do: skip signals, then touch.
+        Recipe.tags.through.objects.bulk_create([
+            Recipe.tags.through(recipe=other, tag=tag, user=self.user)
+            for tag in self.tags[1:]
+        ])
+        sync.touch(Recipe, self.user.id, [other.id])
+        gone.soft_delete()
+
+        res = self.client.get(similar_url(recipe.id))
+        self.assertEqual(
+            [(row['id'], row['score']) for row in res.data],
+            [(other.id, 1.0)],
+        )
+
+    def test_other_users_recipe_not_found(self):
+        """Test the action only serves the user's own recipes"""
+        other = get_user_model().objects.create_user(
+            'other@example.com',
+            'testpass123',
+        )
+        recipe = create_recipe(other)
+
+        res = self.client.get(similar_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_invalid_params(self):
+        """Test k and metric are validated"""
+        recipe = create_recipe(self.user, self.tags)
+
+        for params in ({'k': 0}, {'k': 'x'}, {'metric': 'euclid'}):
+            res = self.client.get(similar_url(recipe.id), params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
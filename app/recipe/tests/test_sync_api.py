@@ -0,0 +1,244 @@
+"""
+Tests for the incremental sync API
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import sync
+from core.models import Recipe, Tag, Ingredient, Tombstone
+from recipe.merging import merge_duplicates
+
+
+SYNC_URL = reverse('recipe:sync')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def recipe_url(recipe_id):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def tag_url(tag_id):
+    return reverse('recipe:tag-detail', args=[tag_id])
+
+
+def create_recipe(user, **params):
+    defaults = {
+        'title': 'Sample recipe',
+        'time_minutes': 10,
+        'price': Decimal('5.00'),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class PublicSyncApiTests(TestCase):
+    """Test unauthenticated API requests"""
+
+    def test_auth_required(self):
+        """Test auth is required to sync"""
+        res = APIClient().get(SYNC_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateSyncApiTests(TestCase):
+    """Test authenticated API requests"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def sync(self, since=0, **params):
+        res = self.client.get(SYNC_URL, {'since': since, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def test_first_sync_returns_everything(self):
+        """Test syncing from zero returns the user's rows only"""
+        recipe = create_recipe(self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe.tags.add(tag, through_defaults={'user': self.user})
+        Ingredient.objects.create(user=self.user, name='Salt')
+        other = get_user_model().objects.create_user(
+            'other@example.com',
+            'testpass123',
+        )
+        create_recipe(other)
+
+        data = self.sync()
+
+        self.assertEqual([r['id'] for r in data['recipes']], [recipe.id])
+        self.assertEqual(data['recipes'][0]['tags'][0]['name'], 'Vegan')
+        self.assertEqual([t['id'] for t in data['tags']], [tag.id])
+        self.assertEqual(len(data['ingredients']), 1)
+        self.assertFalse(data['has_more'])
+        self.assertEqual(self.sync(data['cursor'])['recipes'], [])
+
+    def test_sync_returns_changes_since_cursor(self):
+        """Test only rows changed after the cursor are returned"""
+        create_recipe(self.user, title='Old')
+        changed = create_recipe(self.user, title='Changed')
+        cursor = self.sync()['cursor']
+
+        self.client.patch(
+            recipe_url(changed.id),
+            {'title': 'Renamed', 'tags': [{'name': 'New'}]},
+            format='json',
+        )
+        data = self.sync(cursor)
+
+        self.assertEqual(
+            [r['title'] for r in data['recipes']],
+            ['Renamed'],
+        )
+        self.assertEqual([t['name'] for t in data['tags']], ['New'])
+        self.assertGreater(data['cursor'], cursor)
+
+    def test_deletes_leave_tombstones(self):
+        """Test deleted recipes and tags are reported as deleted"""
+        recipe = create_recipe(self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe.tags.add(tag, through_defaults={'user': self.user})
+        other = create_recipe(self.user, title='Other')
+        other.tags.add(tag, through_defaults={'user': self.user})
+        cursor = self.sync()['cursor']
+
+        self.client.delete(recipe_url(recipe.id))
+        self.client.delete(tag_url(tag.id))
+        data = self.sync(cursor)
+
+        self.assertCountEqual(data['deleted'], [
+            {'type': 'recipe', 'id': recipe.id},
+            {'type': 'tag', 'id': tag.id},
+        ])
+        # The recipe still using the tag lost it, so it is sent again.
+        self.assertEqual([r['id'] for r in data['recipes']], [other.id])
+        self.assertEqual(data['recipes'][0]['tags'], [])
+
+    def test_pagination(self):
+        """Test paging through a large delta sees every change once"""
+        for i in range(7):
+            Tag.objects.create(user=self.user, name=f'Tag {i}')
+
+        seen, cursor, pages = [], 0, 0
+        while True:
+            data = self.sync(cursor, limit=3)
+            seen += [tag['id'] for tag in data['tags']]
+            cursor = data['cursor']
+            pages += 1
+            if not data['has_more']:
+                break
+
+        self.assertEqual(pages, 3)
+        self.assertCountEqual(
+            seen,
+            Tag.objects.filter(user=self.user).values_list('id', flat=True),
+        )
+
+    def test_invalid_params(self):
+        """Test a negative cursor or oversized page is rejected"""
+        res = self.client.get(SYNC_URL, {'since': -1})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(SYNC_URL, {'limit': 100000})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_compacted_cursor_must_resync(self):
+        """Test cursors older than compacted tombstones are refused"""
+        recipe = create_recipe(self.user)
+        cursor = self.sync()['cursor']
+        recipe.soft_delete()
+        Tombstone.objects.update(
+            deleted_at=timezone.now() - timedelta(days=60),
+        )
+
+        self.assertEqual(sync.compact_tombstones(retention=86400), 1)
+
+        res = self.client.get(SYNC_URL, {'since': cursor})
+        self.assertEqual(res.status_code, status.HTTP_410_GONE)
+        self.assertEqual(self.sync()['recipes'], [])
+
+    def test_merge_reports_removed_duplicates(self):
+        """Test merging duplicates tombstones them and resends recipes"""
+        kept = Tag.objects.create(user=self.user, name='Vegan')
+        duplicate = Tag.objects.create(user=self.user, name='vegan')
+        recipe = create_recipe(self.user)
+        recipe.tags.add(duplicate, through_defaults={'user': self.user})
+        cursor = self.sync()['cursor']
+
+        merge_duplicates(self.user.pk)
+        data = self.sync(cursor)
+
+        self.assertEqual(
+            data['deleted'],
+            [{'type': 'tag', 'id': duplicate.id}],
+        )
+        self.assertEqual(data['recipes'][0]['tags'][0]['id'], kept.id)
+
+
+class AutocommitStampTests(TransactionTestCase):
+    """Test stamping outside a transaction keeps numbers in commit order"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+
+    def assert_writes_in_one_transaction(self, func):
+        writes = []
+
+        def observe(execute, sql, params, many, context):
+            if sql.lstrip().split()[0].upper() in ('UPDATE', 'INSERT'):
+                writes.append((sql, connection.in_atomic_block))
+            return execute(sql, params, many, context)
+
+        self.assertFalse(connection.in_atomic_block)
+        with connection.execute_wrapper(observe):
+            func()
+
+        self.assertTrue(writes)
+        for sql, in_transaction in writes:
+            self.assertTrue(in_transaction, sql)
+
+    def test_touch_in_autocommit(self):
+        """Test the number is reserved and stamped in one transaction"""
+        recipe = create_recipe(self.user)
+
+        self.assert_writes_in_one_transaction(
+            lambda: sync.touch(Recipe, self.user.pk, [recipe.pk]),
+        )
+
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.sync_seq, sync.next_seq(self.user.pk) - 1)
+
+    def test_record_deletes_in_autocommit(self):
+        """Test tombstones are written with their number's lock held"""
+        self.assert_writes_in_one_transaction(
+            lambda: sync.record_deletes(Tag, self.user.pk, [1, 2]),
+        )
+
+        self.assertEqual(Tombstone.objects.filter(user=self.user).count(), 2)
+
+    def test_save_in_autocommit(self):
+        """Test a plain save numbers and writes its row in one transaction"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        tag.name = 'Plant based'
+
+        self.assert_writes_in_one_transaction(tag.save)
+
+        tag.refresh_from_db()
+        self.assertEqual(tag.sync_seq, sync.next_seq(self.user.pk) - 1)
@@ -18,5 +18,17 @@ router.register('ingredients', views.IngredientViewSet)
 app_name = 'recipe'
 
 urlpatterns = [
+    path('dashboard/', views.DashboardView.as_view(), name='dashboard'),
+    path('sync/', views.SyncView.as_view(), name='sync'),
+    path(
+        'events/ticket/',
+        views.StreamTicketView.as_view(),
+        name='events-ticket',
+    ),
+    path(
+        'nutrient-catalog/',
+        views.NutrientCatalogView.as_view(),
+        name='nutrient-catalog',
+    ),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -1,8 +1,10 @@
 """
 Views for the recipe APIs
 """
+from decimal import Decimal
 
 from rest_framework import (
+    generics,
     viewsets,
     mixins,
     status,
@@ -13,18 +15,62 @@ from drf_spectacular.utils import (
     OpenApiParameter,
     OpenApiTypes,
 )
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.http import Http404
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 
+from core import events, images, jobs, sync
+from core.authentication import TokenAuthentication
+from core.dashboard import get_dashboard
+from core.db_router import ReplicaReadMixin
+from core.prepared import register
+from core.views import media_response
+from core.renderers import (
+    FastJSONRenderer,
+    streaming_json_response,
+)
 from core.models import (
+    NUTRIENTS,
     Recipe,
     Tag,
     Ingredient,
+    RecipeTag,
+    RecipeIngredient,
+    NutrientProfile,
+    IngredientNutrition,
+    RecipeNutrition,
 )
 from recipe import serializers
+from recipe import fast_serializers
+from recipe.duplicates import duplicate_pairs, duplicates_of
+from recipe.merging import merge_duplicates
+from recipe.pantry import get_index as get_pantry_index
+from recipe.shopping import shopping_list
+from recipe.similarity import METRICS, similar_recipes
+from recipe.stats import recipe_stats
+
 
+register('recipe_list', 'Rows of the per-user recipe list')
+register('tag_list', 'Per-user tag list')
+register('ingredient_list', 'Per-user ingredient list')
+
+def list_response(request, data, size=None):
+    """
+    Return a list response, streaming very large JSON payloads. Pass an
+    estimated size when data is an iterator rather than a list.
+    """
+    renderer = getattr(request, 'accepted_renderer', None)
+    if size is None:
+        size = len(data)
+    if (isinstance(renderer, FastJSONRenderer)
+            and size >= settings.JSON_STREAM_THRESHOLD):
+        return streaming_json_response(data)
+    return Response(list(data))
 
 
 @extend_schema_view(
@@ -36,9 +82,14 @@ from recipe import serializers
                 description = 'Filter by items assigned to recipe'
             )
         ]
-    )
+    ),
+    merge_duplicates=extend_schema(
+        request=None,
+        responses=serializers.MergeResultSerializer,
+    ),
 )
-class BaseViewSet(mixins.DestroyModelMixin,
+class BaseViewSet(ReplicaReadMixin,
+                  mixins.DestroyModelMixin,
                   mixins.UpdateModelMixin,
                   mixins.ListModelMixin,
                   viewsets.GenericViewSet):
@@ -53,52 +104,397 @@ class BaseViewSet(mixins.DestroyModelMixin,
         )
         queryset = self.queryset
         if assigned_only:
-            queryset = queryset.filter(recipe__isnull = False)
+            # A semi-join keeps one row per item, so no DISTINCT and sort.
+            model = queryset.model
+            queryset = queryset.filter(Exists(
+                model.recipe_set.through.objects.filter(**{
+                    model._meta.model_name: OuterRef('pk'),
+                }),
+            ))
+
+        return queryset.filter(user=self.request.user).order_by('-name')
+
+    def list(self, request, *args, **kwargs):
+        """List objects using the read-only fast serializer"""
+        if self.paginator is not None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        return list_response(
+            request,
+            fast_serializers.serialize_names(
+                queryset,
+                statement=f'{self.queryset.model._meta.model_name}_list',
+            ),
+        )
+
+    @action(methods=['POST'], detail=False, url_path='merge-duplicates')
+    def merge_duplicates(self, request):
+        """Merge items whose names differ only in case or spacing"""
+        merged = merge_duplicates(
+            request.user.pk,
+            models=[self.queryset.model],
+        )
+        return Response({'merged': merged})
+
+
+RECIPE_FILTER_PARAMETERS = [
+    OpenApiParameter(
+        'tags',
+        OpenApiTypes.STR,
+        description='Comma separated list of tag IDs to filter',
+    ),
+    OpenApiParameter(
+        'ingredients',
+        OpenApiTypes.STR,
+        description='Comma separated list of ingredient IDs to filter',
+    ),
+    OpenApiParameter(
+        'min_price',
+        OpenApiTypes.DECIMAL,
+        description='Only recipes costing at least this much',
+    ),
+    OpenApiParameter(
+        'max_price',
+        OpenApiTypes.DECIMAL,
+        description='Only recipes costing at most this much',
+    ),
+    OpenApiParameter(
+        'min_time',
+        OpenApiTypes.INT,
+        description='Only recipes taking at least this many minutes',
+    ),
+    OpenApiParameter(
+        'max_time',
+        OpenApiTypes.INT,
+        description='Only recipes taking at most this many minutes',
+    ),
+]
+
+DUPLICATE_PARAMETERS = [
+    OpenApiParameter(
+        'threshold',
+        OpenApiTypes.FLOAT,
+        description='Least estimated similarity, from 0.5 to 1',
+    ),
+    OpenApiParameter(
+        'limit',
+        OpenApiTypes.INT,
+        description='Most results to return (max 1000)',
+    ),
+]
 
-        return queryset.filter(user=self.request.user).order_by('-name').distinct()
 
 @extend_schema_view(
-    list=extend_schema(
-        parameters = [
+    list=extend_schema(parameters=RECIPE_FILTER_PARAMETERS),
+    stats=extend_schema(
+        parameters=RECIPE_FILTER_PARAMETERS,
+        responses=OpenApiTypes.OBJECT,
+    ),
+    similar=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'k',
+                OpenApiTypes.INT,
+                description='Number of recipes to return (max 50)',
+            ),
             OpenApiParameter(
-                'tags',
+                'metric',
                 OpenApiTypes.STR,
-                description='Comma separated list of tag IDs to filter',
+                enum=list(METRICS),
+                description='Similarity measure, jaccard by default',
             ),
+        ],
+        responses=serializers.SimilarRecipeSerializer(many=True),
+    ),
+    pantry=extend_schema(
+        parameters=[
             OpenApiParameter(
                 'ingredients',
                 OpenApiTypes.STR,
-                description='Comma separated list of ingredient IDs to filter',
-            )
-        ]
-    )
+                required=True,
+                description='Comma separated list of ingredient IDs on hand',
+            ),
+            OpenApiParameter(
+                'max_missing',
+                OpenApiTypes.INT,
+                description='Most ingredients a recipe may lack (default 2)',
+            ),
+            OpenApiParameter(
+                'limit',
+                OpenApiTypes.INT,
+                description='Number of recipes to return (max 500)',
+            ),
+        ],
+        responses=serializers.PantryRecipeSerializer(many=True),
+    ),
+    image=extend_schema(
+        parameters=[serializers.ImageVariantSerializer],
+        responses={(200, 'image/*'): OpenApiTypes.BINARY},
+    ),
+    shopping_list=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'recipes',
+                OpenApiTypes.STR,
+                description='Comma separated list of recipe IDs (GET only)',
+            ),
+        ],
+        request=serializers.ShoppingListRequestSerializer,
+        responses=serializers.ShoppingListItemSerializer(many=True),
+    ),
+    duplicates=extend_schema(
+        parameters=DUPLICATE_PARAMETERS,
+        responses=serializers.DuplicatePairSerializer(many=True),
+    ),
+    duplicates_of=extend_schema(
+        operation_id='recipe_recipes_duplicates_of_list',
+        parameters=DUPLICATE_PARAMETERS,
+        responses=serializers.DuplicateRecipeSerializer(many=True),
+    ),
+    nutrition=extend_schema(
+        parameters=RECIPE_FILTER_PARAMETERS + [
+            OpenApiParameter(
+                'recipes',
+                OpenApiTypes.STR,
+                description='Comma separated list of recipe IDs',
+            ),
+        ],
+        responses=serializers.RecipeNutritionRowSerializer(many=True),
+    ),
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """Viewset for manage recipe APIs"""
     serializer_class = serializers.RecipeDetailSerializer
     queryset = Recipe.objects.all()
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
+    throttle_scope = 'recipes'
+    throttle_cost_params = ['tags', 'ingredients']
+
+    def get_throttle_cost(self, request):
+        """Charge filtered requests one extra token per filter"""
+        return 1 + sum(
+            1 for param in self.throttle_cost_params
+            if request.query_params.get(param)
+        )
 
     def _params_to_ints(self, qs):
         """Convert a list of strings to integers"""
         return [int(str_id) for str_id in qs.split(',')]
 
+    def _param_to_number(self, name, convert):
+        """Convert a query parameter to a number, or None when missing"""
+        value = self.request.query_params.get(name)
+        if not value:
+            return None
+        try:
+            return convert(value)
+        except (ValueError, ArithmeticError):
+            raise ValidationError({name: 'A valid number is required.'})
+
+    def _bounded_param(self, name, default, low, high):
+        """Convert an integer query parameter checked against bounds"""
+        value = self._param_to_number(name, int)
+        if value is None:
+            return default
+        if not low <= value <= high:
+            raise ValidationError(
+                {name: f'Must be between {low} and {high}.'}
+            )
+        return value
+
     def get_queryset(self):
         """Retrieve recipes for authenticated user"""
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
         queryset = self.queryset
+        ranges = [
+            ('price__gte', self._param_to_number('min_price', Decimal)),
+            ('price__lte', self._param_to_number('max_price', Decimal)),
+            ('time_minutes__gte', self._param_to_number('min_time', int)),
+            ('time_minutes__lte', self._param_to_number('max_time', int)),
+        ]
+        for lookup, value in ranges:
+            if value is not None:
+                queryset = queryset.filter(**{lookup: value})
+
+        # Semi-joins rather than joins keep one row per recipe, so the
+        # list needs no DISTINCT and can be read in index order.
         if tags:
             tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
+            queryset = queryset.filter(id__in=RecipeTag.objects.filter(
+                user=self.request.user,
+                tag_id__in=tag_ids,
+            ).values('recipe_id'))
 
         if ingredients:
             ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+            queryset = queryset.filter(id__in=RecipeIngredient.objects.filter(
+                user=self.request.user,
+                ingredient_id__in=ingredient_ids,
+            ).values('recipe_id'))
 
-        return queryset.filter(user=self.request.user).order_by('-id').distinct()
+        return queryset.filter(user=self.request.user).order_by('-id')
 
+    def list(self, request, *args, **kwargs):
+        """List recipes using the read-only fast serializer"""
+        if self.paginator is not None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        return list_response(
+            request,
+            fast_serializers.serialize_recipes(
+                queryset,
+                statement='recipe_list',
+            ),
+        )
+
+    @action(methods=['GET'], detail=False)
+    def stats(self, request):
+        """Return price and time statistics for the filtered recipes"""
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(recipe_stats(queryset))
+
+    @action(methods=['GET'], detail=True)
+    def similar(self, request, pk=None):
+        """Return the recipes sharing the most tags and ingredients"""
+        recipe = self.get_object()
+        k = self._bounded_param('k', 10, 1, 50)
+        metric = request.query_params.get('metric', 'jaccard')
+        if metric not in METRICS:
+            raise ValidationError({'metric': f'Must be one of {METRICS}.'})
+
+        scores = dict(similar_recipes(recipe, k, metric))
+        rows = fast_serializers.serialize_recipes(
+            Recipe.objects.filter(user=request.user, id__in=scores),
+        )
+        for row in rows:
+            row['score'] = round(scores[row['id']], 4)
+        rows.sort(key=lambda row: (-row['score'], row['id']))
+        return Response(rows)
+
+    def _duplicate_params(self):
+        """Return the threshold and limit of a duplicates request"""
+        threshold = self._param_to_number('threshold', float)
+        if threshold is None:
+            threshold = settings.DUPLICATE_THRESHOLD
+        elif not 0.5 <= threshold <= 1:
+            raise ValidationError({'threshold': 'Must be between 0.5 and 1.'})
+        return threshold, self._bounded_param('limit', 100, 1, 1000)
+
+    @action(methods=['GET'], detail=False)
+    def duplicates(self, request):
+        """Return pairs of the user's recipes that are near duplicates"""
+        threshold, limit = self._duplicate_params()
+        pairs = duplicate_pairs(request.user.pk, threshold, limit)
+        return list_response(request, [
+            {
+                'recipe': recipe_id,
+                'duplicate': duplicate_id,
+                'similarity': round(score, 4),
+            }
+            for recipe_id, duplicate_id, score in pairs
+        ])
+
+    @action(
+        methods=['GET'],
+        detail=True,
+        url_path='duplicates',
+        url_name='duplicates-of',
+    )
+    def duplicates_of(self, request, pk=None):
+        """Return the recipes that are near duplicates of this one"""
+        recipe = self.get_object()
+        threshold, limit = self._duplicate_params()
+        scores = dict(duplicates_of(recipe, threshold, limit))
+        rows = fast_serializers.serialize_recipes(
+            Recipe.objects.filter(user=request.user, id__in=scores),
+        )
+        for row in rows:
+            row['similarity'] = round(scores[row['id']], 4)
+        rows.sort(key=lambda row: (-row['similarity'], row['id']))
+        return Response(rows)
+
+    @action(methods=['GET'], detail=False)
+    def pantry(self, request):
+        """Return recipes that can be made from the given ingredients"""
+        ingredients = request.query_params.get('ingredients')
+        try:
+            pantry = set(self._params_to_ints(ingredients or ''))
+        except ValueError:
+            raise ValidationError(
+                {'ingredients': 'A comma separated list of IDs is required.'}
+            )
+        max_missing = self._bounded_param('max_missing', 2, 0, 20)
+        limit = self._bounded_param('limit', 50, 1, 500)
+
+        matches = get_pantry_index(request.user.pk).match(
+            pantry,
+            max_missing,
+            limit,
+        )
+        rows = {
+            row['id']: row
+            for row in fast_serializers.serialize_recipes(
+                Recipe.objects.filter(
+                    user=request.user,
+                    id__in=[recipe_id for recipe_id, _, _ in matches],
+                )
+            )
+        }
+        results = []
+        for recipe_id, coverage, missing in matches:
+            row = rows.get(recipe_id)
+            if row is None:
+                continue
+            row['coverage'] = round(coverage, 4)
+            row['missing_count'] = missing
+            row['missing_ingredients'] = [
+                ingredient for ingredient in row['ingredients']
+                if ingredient['id'] not in pantry
+            ]
+            results.append(row)
+        return list_response(request, results)
+
+    @action(methods=['GET', 'POST'], detail=False, url_path='shopping-list')
+    def shopping_list(self, request):
+        """Merge the ingredients of many recipes into one list"""
+        data = request.data
+        if request.method == 'GET':
+            # The query's IDs get the same checks and errors as a body's.
+            recipes = request.query_params.get('recipes')
+            data = {} if recipes is None else {
+                'recipes': recipes.split(',') if recipes else [],
+            }
+        serializer = serializers.ShoppingListRequestSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+
+        return list_response(
+            request,
+            shopping_list(request.user, recipe_ids),
+            size=len(recipe_ids),
+        )
+
+    @action(methods=['GET'], detail=False)
+    def nutrition(self, request):
+        """Return the nutrient totals of the filtered recipes"""
+        queryset = self.filter_queryset(self.get_queryset())
+        recipes = request.query_params.get('recipes')
+        if recipes:
+            try:
+                queryset = queryset.filter(
+                    id__in=self._params_to_ints(recipes),
+                )
+            except ValueError:
+                raise ValidationError(
+                    {'recipes': 'A comma separated list of IDs is required.'}
+                )
+        rows = RecipeNutrition.objects.filter(
+            user=request.user,
+            recipe_id__in=queryset.values('id'),
+        ).order_by('-recipe_id').values('recipe', *NUTRIENTS)
+        return list_response(request, list(rows))
 
     def get_serializer_class(self):
         """Return the serializer class for request"""
@@ -112,7 +508,16 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-    @action(methods=['POST'], detail=True, url_path='upload-image')
+    def perform_destroy(self, instance):
+        """Hide the recipe at once and let the reaper remove it"""
+        instance.soft_delete()
+
+    @action(
+        methods=['POST'],
+        detail=True,
+        url_path='upload-image',
+        throttle_scope='upload-image',
+    )
 
     def upload_image(self, request, pk=None):
         """Upload an image to recipe"""
@@ -120,15 +525,41 @@ class RecipeViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(recipe, data = request.data)
 
         if serializer.is_valid():
-            serializer.save()
+            previous = recipe.image.name
+            with transaction.atomic():
+                serializer.save()
+                if previous and previous != recipe.image.name:
+                    # Removing the replaced file can wait for a worker.
+                    jobs.enqueue('remove_files', {'names': [previous]})
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(methods=['GET'], detail=True, url_path='image')
+    def image(self, request, pk=None):
+        """Return the recipe image resized to an allowed variant"""
+        recipe = self.get_object()
+        if not recipe.image:
+            raise Http404
+        params = serializers.ImageVariantSerializer(
+            data=request.query_params,
+        )
+        params.is_valid(raise_exception=True)
+        fmt = params.validated_data['type']
+        path = images.variant(
+            recipe.image,
+            width=params.validated_data.get('width'),
+            height=params.validated_data.get('height'),
+            fmt=fmt,
+            quality=params.validated_data['quality'],
+        )
+        return media_response(path, images.CONTENT_TYPES[fmt])
+
 
 class TagViewSet(BaseViewSet):
     """Viewset for handling tag APIs"""
     serializer_class = serializers.TagSerializer
     queryset = Tag.objects.all()
+    throttle_scope = 'tags'
 
 
 
@@ -136,3 +567,136 @@ class IngredientViewSet(BaseViewSet):
     """Viewset for handling requests to Ingredient API"""
     serializer_class = serializers.IngredientSerializer
     queryset = Ingredient.objects.all()
+    throttle_scope = 'ingredients'
+
+    @extend_schema(
+        methods=['GET', 'PUT'],
+        request=serializers.IngredientNutritionSerializer,
+        responses=serializers.IngredientNutritionSerializer,
+    )
+    @extend_schema(methods=['DELETE'], responses={204: None})
+    @action(methods=['GET', 'PUT', 'DELETE'], detail=True)
+    def nutrition(self, request, pk=None):
+        """Read, set or remove the nutrients of an ingredient"""
+        ingredient = self.get_object()
+        profile = IngredientNutrition.objects.filter(
+            ingredient=ingredient,
+        ).first()
+        if request.method == 'GET':
+            if profile is None:
+                raise Http404
+            return Response(
+                serializers.IngredientNutritionSerializer(profile).data,
+            )
+        if request.method == 'DELETE':
+            if profile is None:
+                raise Http404
+            with transaction.atomic():
+                profile.delete()
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        serializer = serializers.IngredientNutritionSerializer(
+            profile,
+            data=request.data,
+        )
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            serializer.save(ingredient=ingredient, user=request.user)
+        return Response(serializer.data)
+
+
+@extend_schema(
+    parameters=[
+        OpenApiParameter(
+            'search',
+            OpenApiTypes.STR,
+            description='Only entries whose name starts with this',
+        ),
+    ],
+)
+class NutrientCatalogView(generics.ListAPIView):
+    """List entries of the shared nutrient catalog"""
+    serializer_class = serializers.NutrientProfileSerializer
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = NutrientProfile.objects.order_by('name')
+        search = self.request.query_params.get('search')
+        if search:
+            queryset = queryset.filter(name__istartswith=search)
+        return queryset[:settings.NUTRIENT_CATALOG_PAGE_SIZE]
+
+
+class DashboardView(generics.RetrieveAPIView):
+    """Serve the authenticated user's dashboard summary"""
+    serializer_class = serializers.DashboardSerializer
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get_object(self):
+        """Retrieve the dashboard row, building it on first use"""
+        return get_dashboard(self.request.user.pk)
+
+
+@extend_schema(
+    parameters=[
+        OpenApiParameter(
+            'since',
+            OpenApiTypes.INT,
+            description='Cursor returned by the previous sync, 0 for all',
+        ),
+        OpenApiParameter(
+            'limit',
+            OpenApiTypes.INT,
+            description='Most changes to return',
+        ),
+    ],
+)
+class SyncView(generics.GenericAPIView):
+    """Serve the user's recipe, tag and ingredient changes since a cursor"""
+    serializer_class = serializers.SyncSerializer
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        query = serializers.SyncQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        try:
+            page = sync.changes(
+                request.user.pk,
+                query.validated_data['since'],
+                query.validated_data['limit'],
+            )
+        except sync.ResyncRequired as error:
+            return Response(
+                {
+                    'detail': 'Cursor is too old, sync from scratch.',
+                    'horizon': error.args[0],
+                },
+                status=status.HTTP_410_GONE,
+            )
+        return Response(self.get_serializer(page).data)
+
+
+class StreamTicketView(generics.GenericAPIView):
+    """Issue a single-use ticket opening the user's event stream
+
+    Browsers' EventSource cannot send the Authorization header, so the
+    ticket goes in the stream URL's `ticket` query parameter instead of
+    the API token.
+    """
+    serializer_class = serializers.StreamTicketSerializer
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        request=None,
+        responses={201: serializers.StreamTicketSerializer},
+    )
+    def post(self, request):
+        ticket = events.issue_ticket(request.user)
+        return Response(
+            self.get_serializer(ticket).data,
+            status=status.HTTP_201_CREATED,
+        )
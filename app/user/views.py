@@ -2,9 +2,11 @@
 Views for the User API
 """
 
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, permissions
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
+
+from core.authentication import TokenAuthentication
 from user.serializers import (
     UserSerializer,
     AuthTokenSerializer,
@@ -21,12 +23,16 @@ class CreateTokenView(ObtainAuthToken):
     renderer_class = api_settings.DEFAULT_RENDERER_CLASSES
 
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+class ManageUserView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = UserSerializer
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [TokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
         """Retrieve and return the authenticated user"""
         return self.request.user
 
+    def perform_destroy(self, instance):
+        """Lock the account at once and let the reaper remove its data"""
+        instance.soft_delete()
+
@@ -5,6 +5,53 @@ server {
         alias /vol/static;
     }
 
+    # Uploaded media is only sent through /api/media/, which checks access.
+    location /static/media/ {
+        return 404;
+    }
+
+    # Files the app allowed with X-Accel-Redirect, sent straight from disk.
+    location /protected-media/ {
+        internal;
+        alias      /vol/static/media/;
+        sendfile   on;
+        tcp_nopush on;
+    }
+
+    # collectstatic output, with .gz copies served instead of compressing
+    # on the fly. Content-hashed names never change, so browsers keep them
+    # for a year.
+    #
+    # collectstatic also writes .br copies, but this image's nginx is built
+    # without the ngx_brotli module, so they are not served. To serve them,
+    # build the image with the module, load it at the top of nginx.conf
+    # (load_module modules/ngx_http_brotli_static_module.so) and add
+    # `brotli_static on;` below.
+    location /static/static/ {
+        root                     /vol;
+        gzip_static              on;
+        gzip_vary                on;
+        sendfile                 on;
+        tcp_nopush               on;
+        open_file_cache          max=2000 inactive=10m;
+        open_file_cache_valid    2m;
+        open_file_cache_min_uses 1;
+        open_file_cache_errors   on;
+        add_header               Cache-Control "public, max-age=3600";
+
+        location ~ "\.[0-9a-f]{12}\.[^/.]+$" {
+            add_header Cache-Control "public, max-age=31536000, immutable";
+        }
+    }
+
+    location = /api/recipe/events/ {
+        proxy_pass           http://${EVENTS_HOST}:${EVENTS_PORT};
+        proxy_http_version   1.1;
+        proxy_set_header     Connection "";
+        proxy_buffering      off;
+        proxy_read_timeout   1h;
+    }
+
     location / {
         uwsgi_pass           ${APP_HOST}:${APP_PORT};
         include              /etc/nginx/uwsgi_params;
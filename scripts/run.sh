@@ -3,4 +3,9 @@ set -e
 python manage.py wait_for_db
 python manage.py collectstatic --noinput
 python manage.py migrate
-uwsgi --socket :9000 --workers 4 --master --enable-threads --module app.wsgi
\ No newline at end of file
+# The master loads and preloads the app once (app/wsgi.py) and forks warm
+# workers from it, also when it respawns one. --py-call-osafterfork runs
+# Python's after-fork hooks in each worker, e.g. reseeding random.
+uwsgi --socket :9000 --workers 4 --master --enable-threads --module app.wsgi \
+  --need-app --py-call-osafterfork \
+  --cache2 name=throttle,items=20000,blocksize=1024 --locks 1